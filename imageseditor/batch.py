@@ -0,0 +1,178 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import loader
+import resample
+import smart_crop
+from save_queue import DEFAULT_ENCODER_OPTIONS, merge_alpha, write_atomic
+
+# Bulk processing without the GUI.
+#
+#   python batch.py photos/ --out web/ --resize 1600                 # longest side 1600
+#   python batch.py a.jpg b.png --out out/ --resize 800x --format webp
+#   python batch.py photos/ --out thumbs/ --resize 25% --method lanczos --linear
+#   python batch.py photos/ --out thumbs/ --smart-crop 1:1,16:9,4:5 --resize 400
+#
+# Every image goes through the selected steps in order and is written
+# atomically (temp file + rename) into --out. --smart-crop writes one output
+# per aspect ratio (name_16x9.jpg, ...), all cut from one saliency map.
+# EXIF orientation is applied on load. When every output is a reduction,
+# JPEGs are decoded at 1/2, 1/4 or 1/8 scale (still at least the target
+# size) unless --full-decode is given. Transparent PNG/WebP/TIFF inputs keep
+# their alpha plane through crop and resize when the output format has one. Images are processed on a
+# thread pool; OpenCV releases the GIL while decoding, resampling and encoding.
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif', '.webp')
+
+
+def collect(inputs):
+    # Image files named directly or found (non-recursively) in folders
+    files = []
+    for p in inputs:
+        if os.path.isdir(p):
+            files += [os.path.join(p, f) for f in sorted(os.listdir(p)) if f.lower().endswith(IMAGE_EXTS)]
+        else:
+            files.append(p)
+    return files
+
+
+def build_steps(args, alpha=False):
+    # Each step maps a BGR image (or, with alpha=True, an alpha plane) and
+    # the output size from target_size() to a new image. Alpha is coverage,
+    # so it is never resampled in linear light.
+    steps = []
+    if args.resize:
+        linear = args.linear and not alpha
+        steps.append(lambda img, size: resample.resize(img, size, args.method, linear))
+    return steps
+
+
+def target_size(shape, aspect, args):
+    # (w, h) that --resize gives the crop of an image of full-resolution
+    # shape, or None without --resize. Sizes are resolved against the full
+    # image, so percentages mean the same with a reduced decode.
+    if not args.resize:
+        return None
+    h, w = shape[:2]
+    cw, ch = smart_crop.window_size((h, w), aspect, args.zoom) if aspect else (w, h)
+    return resample.size_for((ch, cw), resample.parse_size(args.resize))
+
+
+def build_crops(args):
+    # (tag, aspect) per output; tag is appended to the file name
+    if not args.smart_crop:
+        return [('', None)]
+    aspects = [a.strip() for a in args.smart_crop.split(',') if a.strip()]
+    for a in aspects:
+        smart_crop.parse_aspect(a)
+    return [('_' + a.replace(':', 'x'), a) for a in aspects]
+
+
+def output_path(path, args, tag=''):
+    name, ext = os.path.splitext(os.path.basename(path))
+    ext = '.' + args.format.lstrip('.') if args.format else ext
+    return os.path.join(args.out, name + tag + args.suffix + ext)
+
+
+def full_shape(path):
+    # (h, w) of the upright image at full resolution, from the header
+    w, h, orient = loader.header(path)
+    w, h = loader.oriented_size(w, h, orient)
+    return h, w
+
+
+def decode_reduction(path, crops, args):
+    # Largest JPEG decode factor that leaves every output at least its target size
+    if not args.resize or args.full_decode or not loader.can_reduce(path):
+        return 1
+    h, w = full_shape(path)
+    reduce = 8
+    for _, aspect in crops:
+        cw, ch = smart_crop.window_size((h, w), aspect, args.zoom) if aspect else (w, h)
+        reduce = min(reduce, loader.reduction((cw, ch), target_size((h, w), aspect, args)))
+    return reduce
+
+
+def process(path, steps, crops, args, options):
+    # [(out path, shape)] for each crop of one image
+    reduce = decode_reduction(path, crops, args)
+    raw, raw_alpha, stack = loader.read_alpha(path, reduce)
+    if raw is None:
+        raise ValueError("cannot decode image")
+    src = stack.apply(raw)
+    shape = full_shape(path) if reduce > 1 else src.shape
+    src_alpha = stack.apply(raw_alpha) if raw_alpha is not None else None
+    alpha_steps = build_steps(args, alpha=True)
+    # Saliency is computed once here and reused for every aspect ratio
+    sal = smart_crop.SaliencyMap(smart_crop.saliency(src), src.shape) if crops[0][1] else None
+    results = []
+    for tag, aspect in crops:
+        img, alpha = src, src_alpha
+        if aspect:
+            x0, y0, x1, y1 = sal.box(aspect, args.zoom)
+            img = src[y0:y1, x0:x1]
+            alpha = alpha[y0:y1, x0:x1] if alpha is not None else None
+        size = target_size(shape, aspect, args)
+        for step in steps:
+            img = step(img, size)
+        out = output_path(path, args, tag)
+        if alpha is not None:
+            for step in alpha_steps:
+                alpha = step(alpha, size)
+            img = merge_alpha(img, alpha, os.path.splitext(out)[1])
+        write_atomic(out, img, options)
+        results.append((out, img.shape))
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch-process images.")
+    ap.add_argument('inputs', nargs='+', help="image files and/or folders")
+    ap.add_argument('--out', required=True, help="output folder (created if missing)")
+    ap.add_argument('--resize', help="WxH, Wx, xH, longest side (e.g. 1600) or percentage (e.g. 50%%)")
+    ap.add_argument('--method', choices=resample.METHODS, default=resample.DEFAULT_METHOD)
+    ap.add_argument('--linear', action='store_true', help="resample in linear light")
+    ap.add_argument('--smart-crop', help="content-aware crop to each comma-separated aspect ratio (e.g. 1:1,16:9)")
+    ap.add_argument('--zoom', type=float, default=1.0, help="smart crop window size relative to the largest that fits, in (0, 1]")
+    ap.add_argument('--full-decode', action='store_true', help="always decode JPEGs at full resolution")
+    ap.add_argument('--format', help="output extension (default: keep the input's)")
+    ap.add_argument('--quality', type=int, help="JPEG/WebP quality")
+    ap.add_argument('--suffix', default='', help="appended to output file names")
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    args = ap.parse_args(argv)
+    if not 0 < args.zoom <= 1:
+        ap.error("--zoom must be in (0, 1]")
+
+    files = collect(args.inputs)
+    if not files:
+        ap.error("no images found")
+    os.makedirs(args.out, exist_ok=True)
+    options = dict(DEFAULT_ENCODER_OPTIONS)
+    if args.quality:
+        options.update(jpeg_quality=args.quality, webp_quality=args.quality)
+    steps = build_steps(args)
+    try:
+        crops = build_crops(args)
+    except ValueError:
+        ap.error(f"invalid --smart-crop: {args.smart_crop}")
+
+    t0 = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max(1, args.workers)) as pool:
+        jobs = [(p, pool.submit(process, p, steps, crops, args, options)) for p in files]
+        for path, job in jobs:
+            try:
+                for out, shape in job.result():
+                    print(f"{path} -> {out} ({shape[1]}x{shape[0]})")
+            except Exception as e:
+                failed += 1
+                print(f"{path}: {e}", file=sys.stderr)
+    print(f"{len(files) - failed}/{len(files)} images in {time.perf_counter() - t0:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
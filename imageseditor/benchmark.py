@@ -0,0 +1,721 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import pipeline
+import convolution
+import edge_preserving
+import edges
+import palette
+import tone
+from video_io import keep_segments, export_segments
+from recipe import apply_commit
+import transform_stack
+import resample
+import warp
+import smart_crop
+import loader
+import depth
+import hash_index
+import catalog
+import video_probe
+import history
+import view
+
+# Reproducible timings for the editor's hot paths.
+#
+#   python benchmark.py                          # 1, 12 and 50 MP, synthetic + bundled photo
+#   python benchmark.py --sizes 1 --only cartoon # quick subset
+#   python benchmark.py --save-baseline          # store results as the new baseline
+#
+# Every case runs in a fresh process so its peak RSS is not polluted by
+# earlier cases. Results are written as JSON and compared against the
+# baseline file; cases slower than --threshold x baseline are flagged.
+# Baselines depend on the machine and are not committed: record one with
+# --save-baseline before comparing, or the script stops with instructions.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(HERE, 'images')
+BUNDLED = 'road-blue-car-50704.jpg'
+DEFAULT_BASELINE = os.path.join(HERE, 'benchmark_baseline.json')
+DEFAULT_OUT = 'benchmark_results.json'
+DEFAULT_SIZES = (1, 12, 50)
+DISPLAY_SIZE = (1600, 1000)  # Canvas the display case fits into
+VIDEO_FRAMES = 60
+
+# Parameters that switch every pipeline stage on
+BENCH_PARAMS = {
+    'gray': False, 'sepia': True, 'inv': True, 'emboss': True,
+    'blur': 3.0, 'sharpen': 2.0, 'brightness': 1.1, 'contrast': 1.2,
+    'cartoon_bs': 9, 'cartoon_c': 5, 'quant_colors': 8,
+    'unsharp_amount': 1.0, 'unsharp_radius': 3.0,
+    'kernel': [[0, -1, 0], [-1, 5, -1], [0, -1, 0]],
+}
+# Every tone step on: auto levels, curve, gamma, brightness/contrast
+TONE_PARAMS = dict(BENCH_PARAMS, auto_levels=True, gamma=1.4,
+                   tone_curve=[[0, 0], [64, 48], [192, 216], [255, 255]])
+# Longest side of the reduced-decode load case (a typical web size)
+RESIZE_SIDE = 1600
+# Output scales of the resize cases, relative to the input, so every input
+# size exercises a real reduction (a fixed side would be a no-op at 1 MP)
+RESIZE_SCALES = (0.5, 0.25)
+# Small-angle straighten for the warp cases
+WARP_COMMIT = {'op': 'straighten', 'angle': 3.5, 'crop': True}
+# Large-radius blur for the convolution engine cases
+CONV_SIGMA = 10.0
+# phase2 slider defaults: block, C, bilateral d, sigmaColor, sigmaSpace
+PHASE2_CARTOON = (9, 2, 9, 200, 200)
+# Large-radius cartoon smoothing, where the fast engines matter
+SMOOTH_D = 15
+
+
+# --- Inputs ---
+def dims(mp):
+    # 3:2 frame with roughly mp megapixels
+    w = int(round((mp * 1e6 * 1.5) ** 0.5))
+    return w, int(round(w / 1.5))
+
+
+def synthetic(w, h, seed=0):
+    # Smooth colour fields with hard-edged shapes and sensor-like noise, so
+    # edge-aware filters and encoders see photo-like content.
+    rng = np.random.default_rng(seed)
+    low = rng.integers(0, 256, (max(2, h // 64), max(2, w // 64), 3), dtype=np.uint8)
+    img = cv2.resize(low, (w, h), interpolation=cv2.INTER_CUBIC)
+    for _ in range(40):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        r = int(rng.integers(max(2, w // 100), max(3, w // 12)))
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        if rng.random() < 0.5:
+            cv2.circle(img, (x, y), r, color, -1)
+        else:
+            cv2.rectangle(img, (x, y), (x + r, y + r // 2), color, -1)
+    noise = rng.normal(0, 4, (h, w, 1)).astype(np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def bundled(name, w, h):
+    img = cv2.imread(os.path.join(IMAGES_DIR, name), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Cannot load bundled image {name}")
+    interp = cv2.INTER_AREA if w * h < img.shape[0] * img.shape[1] else cv2.INTER_CUBIC
+    return cv2.resize(img, (w, h), interpolation=interp)
+
+
+def load_source(source, mp):
+    w, h = dims(mp)
+    if source == 'synthetic':
+        return synthetic(w, h)
+    return bundled(source, w, h)
+
+
+# --- Cases ---
+# Each factory gets the input image and a scratch directory and returns the
+# zero-argument callable that is timed. Setup work stays in the factory.
+# A factory may instead return (callable, check); check(output) returns
+# extra fields for the result, e.g. quality against a reference.
+CASES = {}
+
+
+def case(name, max_mp=None):
+    def register(factory):
+        CASES[name] = (factory, max_mp)
+        return factory
+    return register
+
+
+def _stage_case(stage_name, stage):
+    # Cold cost: stage caches are dropped before every run
+    def factory(img, tmp):
+        return lambda: (pipeline.clear_caches(), stage(img, BENCH_PARAMS))[1]
+    case('pipeline.' + stage_name)(factory)
+
+
+for _name, _stage in pipeline.STAGES:
+    _stage_case(_name, _stage)
+
+
+@case('pipeline.render')
+def _render(img, tmp):
+    return lambda: (pipeline.clear_caches(), pipeline.render(img, BENCH_PARAMS))[1]
+
+
+@case('pipeline.render16')
+def _render16(img, tmp):
+    # Same render on a 16-bit working buffer (high bit depth mode)
+    img16 = depth.from_u8(img, np.uint16)
+    return lambda: (pipeline.clear_caches(), pipeline.render(img16, BENCH_PARAMS))[1]
+
+
+@case('phase2.cartoonify')
+def _phase2_cartoonify(img, tmp):
+    return lambda: (pipeline.clear_caches(), pipeline.cartoonify(img, *PHASE2_CARTOON))[1]
+
+
+def _smooth_case(engine):
+    @case('smooth.' + engine)
+    def factory(img, tmp):
+        run = lambda: edge_preserving.smooth(img, engine, SMOOTH_D, 200, 200)
+        if engine == 'bilateral':
+            return run
+        ref = edge_preserving.bilateral(img, SMOOTH_D, 200, 200)
+        return run, lambda out: {'psnr_db': round(edge_preserving.psnr(out, ref), 2)}
+
+
+for _engine in edge_preserving.ENGINES:
+    _smooth_case(_engine)
+
+
+@case('cartoon.scrub_c')
+def _scrub_c(img, tmp):
+    # Cartoon stage while only "Cartoon C" moves: mask and smoothing are cached
+    cs = iter(range(10**9))
+    return lambda: pipeline.stage_cartoon(img, dict(BENCH_PARAMS, cartoon_c=2 + next(cs) % 20))
+
+
+@case('edges.adaptive_cv2')
+def _edges_cv2(img, tmp):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return lambda: cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 25, 5)
+
+
+@case('edges.mask_cached')
+def _edges_cached(img, tmp):
+    # Warm frame cache, as while scrubbing "Cartoon C"
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    cs = iter(range(10**9))
+    return lambda: edges.edge_mask(gray, 25, 2 + next(cs) % 20)
+
+
+@case('conv.gaussian_filter2d')
+def _conv_direct(img, tmp):
+    k = convolution.gaussian_kernel(CONV_SIGMA)
+    return lambda: convolution.convolve(img, k, force='filter2D')
+
+
+@case('conv.gaussian_separable')
+def _conv_separable(img, tmp):
+    k = convolution.gaussian_kernel(CONV_SIGMA)
+    return lambda: convolution.convolve(img, k)
+
+
+@case('conv.custom31')
+def _conv_custom(img, tmp):
+    # Non-separable 31x31 kernel (a ring), filtered through OpenCV's DFT path
+    yy, xx = np.mgrid[-15:16, -15:16]
+    ring = ((np.hypot(yy, xx) - 12) ** 2 < 4).astype(np.float32)
+    k = ring / ring.sum()
+    return lambda: convolution.convolve(img, k)
+
+
+@case('palette.kmeans')
+def _palette_kmeans(img, tmp):
+    return lambda: palette.kmeans_palette(img, 8)
+
+
+@case('palette.quantize')
+def _palette_quantize(img, tmp):
+    pal = palette.kmeans_palette(img, 8)
+    return lambda: palette.quantize(img, pal)
+
+
+@case('palette.kmeans_full', max_mp=2)
+def _palette_full(img, tmp):
+    # Reference: k-means over every pixel on each render
+    px = img.reshape(-1, 3).astype(np.float32)
+    crit = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    return lambda: cv2.kmeans(px, 8, None, crit, 1, cv2.KMEANS_PP_CENTERS)
+
+
+@case('tone.convert_scale_abs')
+def _tone_convert(img, tmp):
+    # Previous brightness/contrast stage
+    return lambda: cv2.convertScaleAbs(img, alpha=1.2, beta=25)
+
+
+@case('tone.float_clip')
+def _tone_float(img, tmp):
+    # Previous media editor brightness/contrast (float64 copy of the image)
+    return lambda: np.clip(img * 1.2 + 0.1 * 128, 0, 255).astype(np.uint8)
+
+
+@case('tone.lut')
+def _tone_lut(img, tmp):
+    # Levels, curve, gamma and brightness/contrast in one table, histogram cached
+    return lambda: pipeline.stage_tone(img, TONE_PARAMS)
+
+
+@case('tone.lut16')
+def _tone_lut16(img, tmp):
+    img16 = depth.from_u8(img, np.uint16)
+    return lambda: pipeline.stage_tone(img16, TONE_PARAMS)
+
+
+@case('tone.histogram')
+def _tone_histogram(img, tmp):
+    return lambda: (tone.clear_cache(), tone.histogram(img))[1]
+
+
+@case('tone.live_histogram')
+def _tone_live(img, tmp):
+    # Histogram panel input: the display-sized RGB buffer
+    h, w = img.shape[:2]
+    scale = min(DISPLAY_SIZE[0] / w, DISPLAY_SIZE[1] / h)
+    disp = cv2.cvtColor(cv2.resize(img, (int(w * scale), int(h * scale))), cv2.COLOR_BGR2RGB)
+    return lambda: tone.live_histogram(disp)
+
+
+def _geometry_commits(img):
+    # Rotate, flip, rotate, then keep the central 80%
+    h, w = img.shape[:2]
+    return [{'op': 'rotate', 'code': cv2.ROTATE_90_CLOCKWISE}, {'op': 'flip', 'axis': 'h'},
+            {'op': 'rotate', 'code': cv2.ROTATE_90_CLOCKWISE},
+            {'op': 'crop', 'box': [w // 10, h // 10, w - w // 10, h - h // 10]}]
+
+
+@case('geometry.sequential')
+def _geometry_sequential(img, tmp):
+    # One full pass per commit, as before the transform stack
+    commits = _geometry_commits(img)
+    def run():
+        out = img
+        for c in commits:
+            out = apply_commit(out, c)
+        return np.ascontiguousarray(out)
+    return run
+
+
+@case('geometry.composed')
+def _geometry_composed(img, tmp):
+    commits = _geometry_commits(img)
+    return lambda: transform_stack.replay(img, commits, apply_commit)[1].apply(img)
+
+
+def _resize_size(img, scale):
+    h, w = img.shape[:2]
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def _resize_case(method, scale, linear=False):
+    @case(f"resize.{method}{'_linear' if linear else ''}_{round(scale * 100)}")
+    def factory(img, tmp):
+        size = _resize_size(img, scale)
+        ref = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        run = lambda: resample.resize(img, size, method, linear)
+        return run, lambda out: {'psnr_db': round(edge_preserving.psnr(out, ref), 2)}
+
+
+def _resize_direct_case(scale):
+    @case(f"resize.cubic_direct_{round(scale * 100)}")
+    def factory(img, tmp):
+        # One bicubic step without the halvings, for comparison (aliases)
+        size = _resize_size(img, scale)
+        ref = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        return (lambda: cv2.resize(img, size, interpolation=cv2.INTER_CUBIC),
+                lambda out: {'psnr_db': round(edge_preserving.psnr(out, ref), 2)})
+
+
+for _scale in RESIZE_SCALES:
+    for _method in resample.METHODS:
+        _resize_case(_method, _scale)
+    _resize_case('area', _scale, linear=True)
+    _resize_direct_case(_scale)
+
+
+# Full-resolution straighten: one warpPerspective call vs the tiled, threaded
+# remap (cold builds the tile maps, warm reuses them as repeated exports do)
+@case('warp.warpPerspective')
+def _warp_perspective(img, tmp):
+    m, size = warp.matrix(WARP_COMMIT, img.shape)
+    return lambda: cv2.warpPerspective(img, m, size, flags=cv2.INTER_CUBIC)
+
+
+@case('warp.remap_cold')
+def _warp_remap_cold(img, tmp):
+    m, size = warp.matrix(WARP_COMMIT, img.shape)
+    ref = cv2.warpPerspective(img, m, size, flags=cv2.INTER_CUBIC)
+
+    def run():
+        warp.clear_cache()
+        return warp.warp(img, m, size)
+    return run, lambda out: {'psnr_db': round(edge_preserving.psnr(out, ref), 2)}
+
+
+@case('warp.remap_warm', max_mp=8)
+def _warp_remap_warm(img, tmp):
+    # Tile maps are only cached up to warp.MAP_CACHE_BYTES (about 8 MP)
+    m, size = warp.matrix(WARP_COMMIT, img.shape)
+    warp.warp(img, m, size)
+    return lambda: warp.warp(img, m, size)
+
+
+@case('warp.preview')
+def _warp_preview(img, tmp):
+    # Canvas-sized proxy, as while dragging the Straighten slider
+    m, size = warp.matrix(WARP_COMMIT, img.shape)
+    s = min(1.0, 1200 / max(img.shape[:2]))
+    proxy = cv2.resize(img, (int(img.shape[1] * s), int(img.shape[0] * s)), interpolation=cv2.INTER_AREA)
+    return lambda: warp.preview(proxy, m, size, s)
+
+
+@case('smart_crop.analyze')
+def _smart_crop_analyze(img, tmp):
+    return lambda: smart_crop.SaliencyMap(smart_crop.saliency(img), img.shape)
+
+
+@case('smart_crop.boxes')
+def _smart_crop_boxes(img, tmp):
+    # Every preset aspect ratio from one saliency map
+    sal = smart_crop.SaliencyMap(smart_crop.saliency(img), img.shape)
+    return lambda: [sal.box(a) for a in smart_crop.ASPECTS]
+
+
+@case('hash_index.hash')
+def _hash_index_hash(img, tmp):
+    # One file's dHash + pHash, as decoded while scanning a folder
+    path = os.path.join(tmp, 'bench.jpg')
+    cv2.imwrite(path, img)
+    return lambda: hash_index.hash_file(path)
+
+
+@case('hash_index.groups')
+def _hash_index_groups(img, tmp):
+    # Near-duplicate groups in a 100k-image folder: random hashes plus 10k
+    # copies with up to 7 bits flipped (independent of the input image)
+    rng = np.random.default_rng(0)
+    d = rng.integers(0, 1 << 64, 100_000, dtype=np.uint64)
+    flips = np.zeros(10_000, np.uint64)
+    for _ in range(7):
+        flips |= np.uint64(1) << rng.integers(0, 64, 10_000).astype(np.uint64)
+    d[-10_000:] = d[:10_000] ^ flips
+    hashes = {str(i): (int(h), int(h)) for i, h in enumerate(d)}
+    return lambda: hash_index.groups(hashes)
+
+
+@case('catalog.query')
+def _catalog_query(img, tmp):
+    # Filter + sort over a 100k-file catalog, as on each keystroke in the
+    # file list filter (independent of the input image)
+    rng = np.random.default_rng(0)
+    n = 100_000
+    con = catalog.connect(tmp)
+    with con:
+        con.executemany(f'INSERT OR REPLACE INTO media VALUES ({", ".join("?" * len(catalog.FIELDS))})', [
+            (f'img_{i:06d}.jpg', 'image', 'jpg', int(w), int(h), int(s), float(i), f'2020-01-{i % 28 + 1:02d}',
+             None, None, None, None, None)
+            for i, (w, h, s) in enumerate(zip(rng.integers(640, 8000, n), rng.integers(480, 6000, n),
+                                              rng.integers(10_000, 20_000_000, n)))])
+    con.close()
+    return lambda: catalog.query(tmp, 'image', 'img_01 width>=3000', 'Date taken', True)
+
+
+@case('display')
+def _display(img, tmp):
+    # The editors' display(): view.fit_size + view.render, then a PIL image.
+    # The Tk PhotoImage conversion is included when a display is available.
+    photo = _photo_factory()
+
+    def run():
+        pil = Image.fromarray(view.render(img, view.fit_size(img.shape, *DISPLAY_SIZE)))
+        if photo:
+            photo(pil)
+    return run
+
+
+def _photo_factory():
+    try:
+        import tkinter as tk
+        from PIL import ImageTk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception:
+        return None
+    return lambda pil: ImageTk.PhotoImage(pil, master=root)
+
+
+@case('push_history')
+def _push_history(img, tmp):
+    # phase1/media editor history keeps a full copy per step, LIMIT deep
+    entries, index = [], [-1]
+
+    def run():
+        index[0] = history.push(entries, index[0], img.copy())
+    return run
+
+
+def _io_cases(ext):
+    @case('io.imwrite' + ext)
+    def _write(img, tmp):
+        path = os.path.join(tmp, 'bench' + ext)
+        return lambda: cv2.imwrite(path, img)
+
+    @case('io.imread' + ext)
+    def _read(img, tmp):
+        path = os.path.join(tmp, 'bench' + ext)
+        cv2.imwrite(path, img)
+        return lambda: cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+for _ext in ('.jpg', '.png'):
+    _io_cases(_ext)
+
+
+# Browsing a JPEG: full decode vs the smallest libjpeg scale that still
+# covers a 1600px preview
+@case('io.load_full.jpg')
+def _load_full(img, tmp):
+    path = os.path.join(tmp, 'bench.jpg')
+    cv2.imwrite(path, img)
+    return lambda: loader.load(path)
+
+
+@case('io.load_reduced.jpg')
+def _load_reduced(img, tmp):
+    path = os.path.join(tmp, 'bench.jpg')
+    cv2.imwrite(path, img)
+    return lambda: loader.load(path, max_side=RESIZE_SIDE)
+
+
+def _video(img, tmp):
+    # Short clip built from shifted copies of the input frame
+    path = os.path.join(tmp, 'bench_src.mp4')
+    h, w = img.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (w, h))
+    for i in range(VIDEO_FRAMES):
+        writer.write(np.roll(img, i * 8, axis=1))
+    writer.release()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("Cannot open benchmark video")
+    return cap, os.path.join(tmp, 'bench_out.mp4')
+
+
+@case('video.trim', max_mp=2)
+def _video_trim(img, tmp):
+    cap, out = _video(img, tmp)
+    return lambda: export_segments(cap, out, [(VIDEO_FRAMES // 4, VIDEO_FRAMES * 3 // 4)])
+
+
+@case('video.cut', max_mp=2)
+def _video_cut(img, tmp):
+    cap, out = _video(img, tmp)
+    cuts = [{'start': 10, 'end': 19}, {'start': 35, 'end': 44}]
+    return lambda: export_segments(cap, out, keep_segments(VIDEO_FRAMES, cuts))
+
+
+# Listing a video folder: container header parse vs opening a VideoCapture
+@case('video.probe_header', max_mp=2)
+def _video_probe_header(img, tmp):
+    cap, _ = _video(img, tmp)
+    cap.release()
+    path = os.path.join(tmp, 'bench_src.mp4')
+    return lambda: video_probe.header(path)
+
+
+@case('video.probe_cv2', max_mp=2)
+def _video_probe_cv2(img, tmp):
+    cap, _ = _video(img, tmp)
+    cap.release()
+    path = os.path.join(tmp, 'bench_src.mp4')
+    return lambda: video_probe.probe_cv2(path)
+
+
+# --- Measurement ---
+def _rss_mb():
+    # Current resident set size; falls back to the peak where /proc is missing
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _reset_peak():
+    # Linux lets a process reset its high-water mark, so the input image and
+    # case setup do not count towards the measured peak
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def run_case(name, source, mp, repeat, warmup):
+    # Runs in its own process
+    factory, _ = CASES[name]
+    img = load_source(source, mp)
+    with tempfile.TemporaryDirectory(prefix='imgbench_') as tmp:
+        fn, check = factory(img, tmp), None
+        if isinstance(fn, tuple):
+            fn, check = fn
+        _reset_peak()
+        base = _rss_mb()
+        for _ in range(warmup):
+            fn()
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        peak = _peak_rss_mb()
+        extra = check(out) if check else {}
+    return dict({
+        'case': name,
+        'source': source,
+        'size_mp': mp,
+        'shape': list(img.shape),
+        'repeat': repeat,
+        'median_ms': round(float(np.median(samples)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'peak_rss_mb': round(peak, 1),
+        'input_rss_mb': round(base, 1),
+    }, **extra)
+
+
+def key(r):
+    return r['case'], r['source'], r['size_mp']
+
+
+def compare(results, baseline):
+    # Returns (result, baseline entry, ratio) for every case present in both
+    base = {key(r): r for r in baseline.get('results', [])}
+    rows = []
+    for r in results:
+        b = base.get(key(r))
+        if b and b['median_ms'] > 0:
+            rows.append((r, b, r['median_ms'] / b['median_ms']))
+    return rows
+
+
+def meta():
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'cv2_threads': cv2.getNumThreads(),
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the image editor's filters and I/O paths")
+    p.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                   help="comma separated megapixel sizes (default: 1,12,50)")
+    p.add_argument('--sources', default='synthetic,' + BUNDLED,
+                   help="comma separated inputs: 'synthetic', a file in images/, or 'all'")
+    p.add_argument('--only', default='', help="run only cases whose name contains one of these (comma separated)")
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--warmup', type=int, default=1)
+    p.add_argument('--out', default=DEFAULT_OUT, help="where to write the JSON results")
+    p.add_argument('--baseline', default=DEFAULT_BASELINE)
+    p.add_argument('--save-baseline', action='store_true', help="also write the results to --baseline")
+    p.add_argument('--threshold', type=float, default=1.25,
+                   help="flag cases whose median is this many times the baseline")
+    p.add_argument('--list', action='store_true', help="list case names and exit")
+    return p.parse_args(argv)
+
+
+def select(args):
+    sizes = [float(s) if '.' in s else int(s) for s in args.sizes.split(',') if s]
+    if args.sources == 'all':
+        exts = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+        sources = ['synthetic'] + sorted(f for f in os.listdir(IMAGES_DIR) if f.lower().endswith(exts))
+    else:
+        sources = [s for s in args.sources.split(',') if s]
+    wanted = [w for w in args.only.split(',') if w]
+    names = [n for n in CASES if not wanted or any(w in n for w in wanted)]
+    jobs = []
+    for mp in sizes:
+        for source in sources:
+            for name in names:
+                max_mp = CASES[name][1]
+                if max_mp is None or mp <= max_mp:
+                    jobs.append((name, source, mp))
+    return jobs
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        print('\n'.join(CASES))
+        return 0
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        # Baselines are machine-specific, so none is committed; without one
+        # there is nothing to flag regressions against
+        print(f"No baseline at {args.baseline}.\n"
+              f"Record one on this machine first:  python benchmark.py --save-baseline\n"
+              f"(or point --baseline at an existing results file)", file=sys.stderr)
+        return 2
+    jobs = select(args)
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    print(f"{'case':<26}{'source':<28}{'MP':>5}{'median ms':>12}{'p95 ms':>10}{'peak MB':>10}")
+    for name, source, mp in jobs:
+        # One process per case: fresh peak RSS, no allocator reuse between cases
+        with ctx.Pool(1) as pool:
+            try:
+                r = pool.apply(run_case, (name, source, mp, args.repeat, args.warmup))
+            except Exception as e:
+                print(f"{name:<26}{source[:27]:<28}{mp:>5}  failed: {e}")
+                continue
+        results.append(r)
+        psnr = f"{r['psnr_db']:>8.2f} dB" if 'psnr_db' in r else ''
+        print(f"{name:<26}{source[:27]:<28}{mp:>5}{r['median_ms']:>12.2f}{r['p95_ms']:>10.2f}{r['peak_rss_mb']:>10.1f}{psnr}")
+
+    report = {'meta': meta(), 'results': results}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nResults written to {args.out}")
+
+    regressions = 0
+    if not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline)
+        if rows:
+            print(f"\nAgainst baseline {args.baseline} ({baseline.get('meta', {}).get('date', '?')}):")
+            for r, b, ratio in rows:
+                flag = '  REGRESSION' if ratio > args.threshold else ''
+                regressions += bool(flag)
+                print(f"{r['case']:<26}{r['source'][:27]:<28}{r['size_mp']:>5}"
+                      f"{b['median_ms']:>12.2f} -> {r['median_ms']:.2f} ms  x{ratio:.2f}{flag}")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
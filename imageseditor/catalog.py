@@ -0,0 +1,259 @@
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import hash_index
+import loader
+import video_probe
+
+# Media catalog of a browsed folder: one row per image or video with its
+# dimensions, format, file size, mtime, EXIF date taken, video duration/fps/
+# codec and thumbnail hash (the dHash from hash_index). Rows live in the
+# folder's database (hash_index.DB_NAME) and are refreshed incrementally: a
+# scan only probes files whose size or mtime changed, reading image headers
+# with PIL and video container headers with video_probe (no decoder either
+# way), on a thread pool. The file lists then sort and filter with a single
+# indexed query.
+#
+#   catalog.scan(folder)                                   # background thread
+#   catalog.query(folder, 'image', 'width>=3000 car', 'Date taken', descending=True)
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v')
+WORKERS = hash_index.WORKERS
+
+EXIF_IFD = 0x8769
+EXIF_DATE_TAKEN = 0x9003     # DateTimeOriginal
+EXIF_DATE = 0x0132           # DateTime, when the original date is missing
+
+FIELDS = ('name', 'kind', 'format', 'width', 'height', 'size', 'mtime', 'taken',
+          'duration', 'fps', 'frames', 'thash', 'codec')
+TEXT_FIELDS = ('name', 'kind', 'format', 'taken', 'codec')
+
+# Sort menu label -> ORDER BY expression. Similarity has none: it orders
+# by near-duplicate group (hash_index), then name, with unmatched files last.
+SORTS = {
+    'Name': 'name COLLATE NOCASE',
+    'Date taken': 'taken',
+    'Modified': 'mtime',
+    'File size': 'size',
+    'Pixels': 'width * height',
+    'Format': 'format',
+    'Duration': 'duration',
+    'Frame rate': 'fps',
+    'Codec': 'codec',
+    'Similarity': None,
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS media (
+    name TEXT PRIMARY KEY,
+    kind TEXT,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    size INTEGER,
+    mtime REAL,
+    taken TEXT,
+    duration REAL,
+    fps REAL,
+    frames INTEGER,
+    thash INTEGER,
+    codec TEXT
+);
+CREATE INDEX IF NOT EXISTS media_taken ON media (taken);
+CREATE INDEX IF NOT EXISTS media_mtime ON media (mtime);
+CREATE INDEX IF NOT EXISTS media_size ON media (size);
+'''
+
+# "field<op>value" filter terms; anything else matches the file name
+_TERM = re.compile(r'^(\w+)(<=|>=|!=|=|<|>)(.+)$')
+
+
+def kind_of(name):
+    name = name.lower()
+    if name.endswith(hash_index.IMAGE_EXTS):
+        return 'image'
+    if name.endswith(VIDEO_EXTS):
+        return 'video'
+    return None
+
+
+def list_files(folder, kind=None):
+    # Sorted media file names in folder, optionally of one kind
+    return sorted(f for f in os.listdir(folder) if kind_of(f) and (kind is None or kind_of(f) == kind))
+
+
+def connect(folder):
+    con = sqlite3.connect(os.path.join(folder, hash_index.DB_NAME))
+    con.executescript(SCHEMA)
+    if 'codec' not in {r[1] for r in con.execute('PRAGMA table_info(media)')}:
+        # Catalogs from before video_probe: add the column and re-probe videos
+        with con:
+            con.execute('ALTER TABLE media ADD COLUMN codec TEXT')
+            con.execute("DELETE FROM media WHERE kind = 'video'")
+    return con
+
+
+# --- Probing ---
+def _exif_date(exif):
+    # "YYYY:MM:DD HH:MM:SS" -> "YYYY-MM-DD HH:MM:SS" so dates sort as text
+    try:
+        value = exif.get_ifd(EXIF_IFD).get(EXIF_DATE_TAKEN) or exif.get(EXIF_DATE)
+    except Exception:
+        return None
+    if not value:
+        return None
+    value = str(value).strip('\x00 ')
+    return value.replace(':', '-', 2) if re.match(r'^\d{4}:\d\d:\d\d', value) else value
+
+
+def probe_image(path):
+    # {width, height, taken} from the header; width/height as displayed
+    with Image.open(path) as im:
+        exif = im.getexif()
+        orient = exif.get(loader.EXIF_ORIENTATION, 1)
+        w, h = loader.oriented_size(im.size[0], im.size[1], orient)
+        return {'width': w, 'height': h, 'taken': _exif_date(exif)}
+
+
+def probe(folder, name, size, mtime):
+    # Catalog row for one file; unreadable files keep their name/size/mtime
+    kind = kind_of(name)
+    row = dict.fromkeys(FIELDS)
+    row.update(name=name, kind=kind, format=os.path.splitext(name)[1][1:].lower(), size=size, mtime=mtime)
+    try:
+        row.update(probe_image(os.path.join(folder, name)) if kind == 'image'
+                   else video_probe.probe(os.path.join(folder, name)))
+    except Exception:
+        pass
+    return row
+
+
+# --- Scanning ---
+def scan(folder, workers=WORKERS, progress=None, hashes=True):
+    # Bring the catalog of folder up to date and return how many files were
+    # (re)probed. progress(done, total) is called from the calling thread,
+    # first while thumbnails are hashed, then while files are probed.
+    names = list_files(folder)
+    con = connect(folder)
+    try:
+        known = {r[0]: r[1:] for r in con.execute('SELECT name, size, mtime, thash FROM media')}
+        todo = []
+        for name in names:
+            st = os.stat(os.path.join(folder, name))
+            if known.get(name, (None, None))[:2] != (st.st_size, st.st_mtime):
+                todo.append((name, st.st_size, st.st_mtime))
+        # Thumbnail hashes come from the hash index, which is incremental too
+        thashes = {}
+        if hashes and any(kind_of(n) == 'image' for n in names):
+            thashes = {n: hash_index.signed(d) for n, (d, _) in hash_index.scan(folder, workers, progress).items()}
+        rows = []
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            for i, row in enumerate(pool.map(lambda t: probe(folder, *t), todo)):
+                rows.append(row)
+                if progress is not None:
+                    progress(i + 1, len(todo))
+        # Files hashed after an earlier scan without hashes
+        stale = [(h, n) for n, h in thashes.items() if n in known and known[n][2] != h]
+        for row in rows:
+            row['thash'] = thashes.get(row['name'])
+        with con:
+            con.executemany(f'INSERT OR REPLACE INTO media ({", ".join(FIELDS)}) '
+                            f'VALUES ({", ".join("?" * len(FIELDS))})',
+                            [tuple(r[f] for f in FIELDS) for r in rows])
+            con.executemany('UPDATE media SET thash = ? WHERE name = ?', stale)
+            gone = set(known) - set(names)
+            con.executemany('DELETE FROM media WHERE name = ?', [(n,) for n in gone])
+    finally:
+        con.close()
+    return len(todo)
+
+
+# --- Queries ---
+def _value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def name_terms(text):
+    # Filter terms that match file names rather than catalog fields
+    return [t for t in str(text or '').split()
+            if not (_TERM.match(t) and _TERM.match(t).group(1).lower() in FIELDS)]
+
+
+def parse_filter(text):
+    # (SQL condition, parameters) for a filter such as "car width>=3000
+    # format=jpg taken>=2024". Terms are ANDed; a term that is not
+    # field<op>value matches file names containing it.
+    conds, params = [], []
+    for term in str(text or '').split():
+        m = _TERM.match(term)
+        if m and m.group(1).lower() in FIELDS:
+            field, op, value = m.group(1).lower(), m.group(2), m.group(3)
+            conds.append(f'{field} {op} ?')
+            if field in ('format', 'kind', 'codec'):
+                value = value.lower().lstrip('.')
+            params.append(value if field in TEXT_FIELDS else _value(value))
+        else:
+            conds.append("name LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', term) + '%')
+    return ' AND '.join(conds) or '1', params
+
+
+def query(folder, kind=None, text='', sort='Name', descending=False):
+    # Catalog rows (dicts) of folder matching the filter text, sorted by a
+    # SORTS label; files not catalogued yet are left out
+    where, params = parse_filter(text)
+    if kind:
+        where += ' AND kind = ?'
+        params.append(kind)
+    order = SORTS.get(sort) or SORTS['Name']
+    con = connect(folder)
+    try:
+        cur = con.execute(f'SELECT {", ".join(FIELDS)} FROM media WHERE {where} '
+                          f'ORDER BY {order} {"DESC" if descending else "ASC"}, name', params)
+        rows = [dict(zip(FIELDS, r)) for r in cur]
+    finally:
+        con.close()
+    if sort == 'Similarity':
+        # Rows are in name order (reversed when descending), so a stable
+        # sort by group keeps names ordered within each group
+        ids = hash_index.group_ids(folder)
+        rows.sort(key=lambda r: ids.get(r['name'], len(ids)), reverse=descending)
+    return rows
+
+
+def describe(row):
+    # One-line summary for status bars
+    parts = []
+    if row.get('width'):
+        parts.append(f"{row['width']}x{row['height']}")
+    if row.get('duration') and row.get('fps'):
+        parts.append(f"{row['duration']:.1f}s @ {row['fps']:.2f} fps")
+    if row.get('codec'):
+        parts.append(row['codec'])
+    if row.get('format'):
+        parts.append(row['format'].upper())
+    if row.get('size') is not None:
+        parts.append(f"{row['size'] / 1e6:.1f} MB")
+    if row.get('taken'):
+        parts.append(f"taken {row['taken']}")
+    return ' | '.join(parts)
+
+
+def brief(row):
+    # Short video summary shown beside the name in video lists
+    parts = []
+    if row.get('width'):
+        parts.append(f"{row['width']}x{row['height']}")
+    if row.get('duration'):
+        m, s = divmod(int(round(row['duration'])), 60)
+        parts.append(f"{m}:{s:02d}")
+    if row.get('fps'):
+        parts.append(f"{row['fps']:.2f}".rstrip('0').rstrip('.') + " fps")
+    if row.get('codec'):
+        parts.append(row['codec'])
+    return ', '.join(parts)
@@ -0,0 +1,141 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+import catalog
+
+# Sort/filter controls for a file Listbox, backed by the folder catalog.
+# set_folder() lists the files by name at once, updates the catalog on a
+# background thread and re-lists from it when the scan finishes; after that
+# every sort or filter change is one SQLite query. With details=True (video
+# lists) each entry also shows size, duration, fps and codec from the catalog,
+# so select handlers read the file name with name(index).
+
+FILTER_HELP = "name text, or field<op>value: width>=3000 format=jpg taken>=2024 duration<10"
+
+
+class CatalogBar(ttk.Frame):
+    def __init__(self, parent, listbox, kind=None, on_ready=None, details=False):
+        super().__init__(parent)
+        self.listbox = listbox
+        self.kind = kind
+        self.details = details
+        self.on_ready = on_ready    # Called once the folder is catalogued
+        self.folder = None
+        self.ready = False      # Catalog of self.folder is up to date
+        self.names = []         # Plain listing shown until it is
+        self.shown = []         # File name of each Listbox entry
+        self.rows = {}          # name -> catalog row of the listed files
+        self.groups = None      # Near-duplicate groups to restrict the list to
+
+        row = ttk.Frame(self)
+        row.pack(fill="x")
+        ttk.Label(row, text="Sort").pack(side="left")
+        self.sort_var = tk.StringVar(value='Name')
+        ttk.OptionMenu(row, self.sort_var, 'Name', *catalog.SORTS,
+                       command=lambda _: self.refresh()).pack(side="left", fill="x", expand=True)
+        self.desc_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(row, text="Desc", variable=self.desc_var, command=self.refresh).pack(side="left")
+
+        self.filter_var = tk.StringVar()
+        entry = ttk.Entry(self, textvariable=self.filter_var)
+        entry.pack(fill="x", pady=2)
+        entry.bind('<KeyRelease>', lambda e: self.refresh())
+
+        self.info = ttk.Label(self, text=FILTER_HELP, wraplength=280, foreground="#555555")
+        self.info.pack(fill="x")
+        listbox.bind('<<ListboxSelect>>', self.describe_selection, add='+')
+
+    def set_folder(self, folder):
+        self.folder = folder
+        self.ready = False
+        self.groups = None
+        self.rows = {}
+        self.names = catalog.list_files(folder, self.kind)
+        self.refresh()
+        self.scan()
+
+    def set_groups(self, groups):
+        self.groups = groups
+        self.refresh()
+
+    def scan(self):
+        # Update the catalog on a worker thread; results are polled from the
+        # Tk thread and ignored if the folder changed meanwhile
+        folder = self.folder
+        results = queue.Queue()
+
+        def work():
+            try:
+                catalog.scan(folder, progress=lambda i, n: results.put(('progress', i, n)),
+                             hashes=self.kind != 'video')
+                results.put(('done',))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            if self.folder != folder:
+                return
+            try:
+                while True:
+                    msg = results.get_nowait()
+                    if msg[0] == 'progress':
+                        self.info.config(text=f"Cataloguing {msg[1]}/{msg[2]}…")
+                    elif msg[0] == 'error':
+                        self.info.config(text=f"Catalog unavailable: {msg[1]}")
+                        return
+                    else:
+                        self.ready = True
+                        self.refresh()
+                        if self.on_ready:
+                            self.on_ready(folder)
+                        return
+            except queue.Empty:
+                self.after(100, poll)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(100, poll)
+
+    def refresh(self):
+        if not self.folder:
+            return
+        text = self.filter_var.get()
+        if self.ready:
+            self.rows = {r['name']: r for r in catalog.query(
+                self.folder, self.kind, text, self.sort_var.get(), self.desc_var.get())}
+            names = list(self.rows)
+        else:
+            # Field terms have to wait for the catalog
+            terms = [t.lower() for t in catalog.name_terms(text)]
+            names = [n for n in self.names if all(t in n.lower() for t in terms)]
+        shade = {}
+        if self.groups is not None:
+            for i, group in enumerate(self.groups):
+                for n in group:
+                    shade[n] = i
+            # Stable sort: the chosen order holds within each group
+            names = sorted((n for n in names if n in shade), key=shade.get)
+        self.shown = names
+        self.listbox.delete(0, tk.END)
+        for n in names:
+            summary = catalog.brief(self.rows[n]) if self.details and n in self.rows else ''
+            self.listbox.insert(tk.END, f"{n}  —  {summary}" if summary else n)
+            if self.groups is not None:
+                self.listbox.itemconfig(tk.END, background='#e4ecf7' if shade[n] % 2 else '#ffffff')
+        total = len(self.names)
+        if self.groups is not None:
+            self.info.config(text=f"{len(names)} files in {len(self.groups)} duplicate groups")
+        else:
+            self.info.config(text=f"{len(names)} of {total} files" + ("" if self.ready else " (cataloguing…)"))
+
+    def name(self, index):
+        return self.shown[index]
+
+    def selected_row(self):
+        sel = self.listbox.curselection()
+        return self.rows.get(self.shown[sel[0]]) if sel else None
+
+    def describe_selection(self, event=None):
+        row = self.selected_row()
+        if row:
+            self.info.config(text=catalog.describe(row))
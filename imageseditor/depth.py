@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+# Bit depth of working buffers. 8-bit images stay uint8 everywhere. In high
+# bit depth mode 16-bit PNG/TIFF scans are kept as uint16 from load to save,
+# and float images (32-bit TIFF, EXR, HDR) are clipped to [0, 1] and stored as
+# uint16, which most cv2 filters handle natively. Stages that only exist for
+# 8-bit data (cartoon edges, palette quantisation, Lab saliency) run on an
+# 8-bit copy via via_u8(). Only the display-size buffer is quantised to 8 bits.
+
+HIGH_BIT_EXTS = ('.png', '.tif', '.tiff')    # Formats that store uint16
+
+# uint8 -> uint16 spreading 0..255 onto 0..65535
+_U8_TO_U16 = (np.arange(256, dtype=np.uint32) * 257).astype(np.uint16)
+
+
+def peak(dtype):
+    # Largest code value (white) of an integer working dtype
+    return 255 if np.dtype(dtype) == np.uint8 else 65535
+
+
+def is_high(img):
+    return img is not None and img.dtype != np.uint8
+
+
+def to_work(img):
+    # Working buffer for a decoded image: uint8 and uint16 pass through
+    if img.dtype in (np.uint8, np.uint16):
+        return img
+    if np.issubdtype(img.dtype, np.floating):
+        return np.clip(img * 65535.0 + 0.5, 0, 65535).astype(np.uint16)
+    return cv2.normalize(img, None, 0, 65535, cv2.NORM_MINMAX, cv2.CV_16U)
+
+
+def to_u8(img):
+    # Rounded 8-bit copy (img itself when it is already uint8)
+    if img.dtype == np.uint8:
+        return img
+    return cv2.convertScaleAbs(img, alpha=255.0 / 65535.0)
+
+
+def from_u8(img, dtype):
+    # 8-bit result back to the working dtype
+    if np.dtype(dtype) == np.uint8:
+        return img
+    return cv2.LUT(img, _U8_TO_U16)
+
+
+def via_u8(fn, img, *args):
+    # Run an 8-bit-only operation on img of any working depth
+    if img.dtype == np.uint8:
+        return fn(img, *args)
+    return from_u8(fn(to_u8(img), *args), img.dtype)
+
+
+def scale_color(color, dtype):
+    # 0..255 colour (annotations) in the working dtype's range
+    if np.dtype(dtype) == np.uint8:
+        return tuple(color)
+    return tuple(int(c) * 257 for c in color)
+
+
+def for_format(img, ext):
+    # Buffer to encode: formats without 16-bit support get an 8-bit copy
+    if img.dtype != np.uint8 and ext.lower() not in HIGH_BIT_EXTS:
+        return to_u8(img)
+    return img
+
+
+def nbytes(*arrays):
+    # Memory held by arrays, counting each underlying buffer once
+    seen, total = set(), 0
+    for a in arrays:
+        if a is None or not isinstance(a, np.ndarray):
+            continue
+        base = a
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        if id(base) not in seen:
+            seen.add(id(base))
+            total += base.nbytes
+    return total
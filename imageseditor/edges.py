@@ -0,0 +1,53 @@
+import zlib
+import cv2
+import numpy as np
+from lru import LRU
+
+# Cartoon edge mask: the ADAPTIVE_THRESH_MEAN_C / THRESH_BINARY result of
+# cv2.adaptiveThreshold, split into grayscale conversion, local mean and
+# comparison so the first two can be cached per frame. Moving "Cartoon C"
+# re-runs only the comparison; moving "Cartoon BS" adds one box filter,
+# whose running-sum cost does not depend on the block size.
+
+CACHE_FRAMES = 2    # Frames kept
+CACHE_BLOCKS = 4    # Local means kept per frame
+
+
+def frame_key(img):
+    # Content key: two independent checksums plus the shape
+    data = np.ascontiguousarray(img).data
+    return img.shape, zlib.crc32(data), zlib.adler32(data)
+
+
+def local_mean(gray, block):
+    # Rounded block x block mean with replicated borders, as adaptiveThreshold computes it
+    return cv2.boxFilter(gray, -1, (block, block), normalize=True,
+                         borderType=cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED)
+
+
+class FrameEdges:
+    # Grayscale copy of one frame plus its local means by block size
+    def __init__(self, img):
+        self.gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        self.means = LRU(CACHE_BLOCKS)
+
+    def mask(self, block, c):
+        # 255 where gray - mean > -ceil(c), exactly like cv2.adaptiveThreshold
+        block = max(3, int(block) | 1)
+        mean = self.means.get(block, lambda: local_mean(self.gray, block))
+        diff = cv2.subtract(self.gray, mean, dtype=cv2.CV_16S)
+        return cv2.compare(diff, -int(np.ceil(c)), cv2.CMP_GT)
+
+
+_frames = LRU(CACHE_FRAMES)
+
+
+def clear_cache():
+    _frames.clear()
+
+
+def edge_mask(img, block, c, key=None):
+    # Cartoon edge mask for a BGR (or grayscale) frame; pass key when the
+    # caller already computed frame_key(img)
+    key = key or frame_key(img)
+    return _frames.get(key, lambda: FrameEdges(img)).mask(block, c)
@@ -0,0 +1,17 @@
+# Undo history shared by the editors: a list of entries and the index of the
+# current one. Pushing drops any redo entries past the index and keeps at most
+# LIMIT entries. What an entry holds is up to the editor (a copy of the image,
+# or arrays plus a recipe snapshot).
+#
+#   self.history_index = history.push(self.history, self.history_index, img.copy())
+
+LIMIT = 20
+
+
+def push(entries, index, entry, limit=LIMIT):
+    # Append entry after entries[index], in place; returns the new index
+    del entries[index + 1:]
+    entries.append(entry)
+    if len(entries) > limit:
+        del entries[:len(entries) - limit]
+    return len(entries) - 1
@@ -4,6 +4,12 @@ from tkinter import ttk, filedialog, messagebox, simpledialog, colorchooser
 import cv2
 import numpy as np
 from PIL import Image, ImageTk
+import watermark
+import edge_preserving
+import convolution
+import resample
+import history
+import view
 
 class ImageToolkitExtended(tk.Tk):
     def __init__(self):
@@ -34,6 +40,8 @@ class ImageToolkitExtended(tk.Tk):
         self.wm_text = tk.StringVar()
         self.wm_pos = tk.StringVar(value="bottom-right")
         self.wm_opacity = tk.DoubleVar(value=0.5)
+        self.wm_tile = tk.BooleanVar()
+        self.wm_logo = None
 
         self.create_ui()
 
@@ -75,6 +83,9 @@ class ImageToolkitExtended(tk.Tk):
         ttk.Label(self.ctrl_frame, text="Cartoon bs").grid(row=0, column=nc()); self.bs_scale = ttk.Scale(self.ctrl_frame, from_=3, to=31, orient="horizontal", command=lambda e:self.apply_pipeline()); self.bs_scale.grid(row=0, column=nc())
         ttk.Label(self.ctrl_frame, text="Cartoon C").grid(row=0, column=nc());  self.c_scale = ttk.Scale(self.ctrl_frame, from_=1, to=50, orient="horizontal", command=lambda e:self.apply_pipeline()); self.c_scale.grid(row=0, column=nc())
         self.emboss_var = tk.BooleanVar(); ttk.Checkbutton(self.ctrl_frame, text="Emboss", variable=self.emboss_var, command=self.apply_pipeline).grid(row=0, column=nc(), padx=2)
+        self.engine_var = tk.StringVar(value=edge_preserving.DEFAULT_ENGINE)
+        ttk.OptionMenu(self.ctrl_frame, self.engine_var, self.engine_var.get(), *edge_preserving.ENGINES, command=lambda e:self.apply_pipeline()).grid(row=0, column=nc(), padx=2)
+        ttk.Label(self.ctrl_frame, text="Quality").grid(row=0, column=nc()); self.quality_scale = ttk.Scale(self.ctrl_frame, from_=0.25, to=1, orient="horizontal", command=lambda e:self.apply_pipeline()); self.quality_scale.set(edge_preserving.DEFAULT_QUALITY); self.quality_scale.grid(row=0, column=nc())
 
         # Annotation
         ttk.Button(self.ctrl_frame, text="Pen", command=lambda:self.set_mode('pen')).grid(row=1, column=nc(), padx=2)
@@ -89,6 +100,10 @@ class ImageToolkitExtended(tk.Tk):
         ttk.Button(self.ctrl_frame, text="Crop Mode", command=self.enable_crop_mode).grid(row=1, column=nc(), padx=2)
         ttk.Button(self.ctrl_frame, text="Apply Crop", command=self.apply_crop).grid(row=1, column=nc(), padx=2)
         ttk.Button(self.ctrl_frame, text="Canvas Resize", command=self.canvas_resize).grid(row=1, column=nc(), padx=2)
+        self.resize_method = tk.StringVar(value=resample.DEFAULT_METHOD)
+        ttk.OptionMenu(self.ctrl_frame, self.resize_method, self.resize_method.get(), *resample.METHODS).grid(row=1, column=nc(), padx=2)
+        self.resize_linear = tk.BooleanVar(); ttk.Checkbutton(self.ctrl_frame, text="Linear", variable=self.resize_linear).grid(row=1, column=nc(), padx=2)
+        ttk.Button(self.ctrl_frame, text="Resize", command=self.resize_image).grid(row=1, column=nc(), padx=2)
 
         # Transform
         ttk.Button(self.ctrl_frame, text="Rot L", command=lambda:self.transform(cv2.ROTATE_90_COUNTERCLOCKWISE)).grid(row=1, column=nc(), padx=2)
@@ -104,9 +119,11 @@ class ImageToolkitExtended(tk.Tk):
         # Watermark
         ttk.Label(self.ctrl_frame, text="Watermark").grid(row=2, column=0, padx=2)
         ttk.Entry(self.ctrl_frame, textvariable=self.wm_text).grid(row=2, column=1, padx=2)
-        ttk.OptionMenu(self.ctrl_frame, self.wm_pos, self.wm_pos.get(), *["top-left","top-right","bottom-left","bottom-right","center"]).grid(row=2, column=2, padx=2)
+        ttk.OptionMenu(self.ctrl_frame, self.wm_pos, self.wm_pos.get(), *watermark.POSITIONS).grid(row=2, column=2, padx=2)
         ttk.Scale(self.ctrl_frame, from_=0.0, to=1.0, orient="horizontal", variable=self.wm_opacity).grid(row=2, column=3, padx=2)
-        ttk.Button(self.ctrl_frame, text="Apply WM", command=self.apply_watermark).grid(row=2, column=4, padx=2)
+        ttk.Button(self.ctrl_frame, text="Logo…", command=self.choose_logo).grid(row=2, column=4, padx=2)
+        ttk.Checkbutton(self.ctrl_frame, text="Tile", variable=self.wm_tile).grid(row=2, column=5, padx=2)
+        ttk.Button(self.ctrl_frame, text="Apply WM", command=self.apply_watermark).grid(row=2, column=6, padx=2)
 
         # Image canvas
         self.canvas = tk.Canvas(self, bg="black", cursor="cross")
@@ -155,16 +172,14 @@ class ImageToolkitExtended(tk.Tk):
             img = cv2.GaussianBlur(img, (0,0), b)
         s = self.sharp_scale.get()
         if s>0:
-            kern = np.array([[-1,-1,-1],[-1,9+s,-1],[-1,-1,-1]])
-            img = cv2.filter2D(img, -1, kern)
+            img = convolution.convolve(img, convolution.sharpen_kernel(s))
         block = int(self.bs_scale.get())|1; c = int(self.c_scale.get())
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         edges = cv2.adaptiveThreshold(gray,255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, block, c)
-        color = cv2.bilateralFilter(img, block, 200, 200)
+        color = edge_preserving.smooth(img, self.engine_var.get(), block, 200, 200, self.quality_scale.get())
         img = cv2.bitwise_and(color, color, mask=edges)
         if self.emboss_var.get():
-            k = np.array([[-2,-1,0],[-1,1,1],[0,1,2]])
-            img = cv2.filter2D(img, -1, k)
+            img = convolution.convolve(img, convolution.EMBOSS_KERNEL)
         alpha = self.contrast_scale.get(); beta = (self.bright_scale.get()-1)*255
         img = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
         self.current_img = img
@@ -280,13 +295,22 @@ class ImageToolkitExtended(tk.Tk):
         self.push_history(canvas)
         self.apply_pipeline()
 
+    def resize_image(self):
+        # Scale with the selected method; the height starts at the aspect-preserving value
+        if self.orig_img is None: return
+        ih, iw = self.orig_img.shape[:2]
+        new_w = simpledialog.askinteger("Resize","New width:",minvalue=1,initialvalue=iw)
+        if not new_w: return
+        new_h = simpledialog.askinteger("Resize","New height:",minvalue=1,
+                                        initialvalue=resample.target_size((ih, iw), width=new_w)[1])
+        if not new_h: return
+        resized = resample.resize(self.orig_img, (new_w, new_h), self.resize_method.get(), self.resize_linear.get())
+        self.orig_img = resized
+        self.push_history(resized)
+        self.apply_pipeline()
+
     def push_history(self, img):
-        self.history = self.history[:self.history_index+1]
-        self.history.append(img.copy())
-        self.history_index = len(self.history)-1
-        if len(self.history)>20:
-            self.history.pop(0)
-            self.history_index -= 1
+        self.history_index = history.push(self.history, self.history_index, img.copy())
 
     def undo(self):
         if self.history_index>0:
@@ -301,11 +325,8 @@ class ImageToolkitExtended(tk.Tk):
             self.apply_pipeline()
 
     def display(self, img):
-        ih, iw = img.shape[:2]
         cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
-        scale = min(cw/iw, ch/ih)
-        disp = cv2.resize(img, (int(iw*scale), int(ih*scale)))
-        disp = cv2.cvtColor(disp, cv2.COLOR_BGR2RGB)
+        disp = view.render(img, view.fit_size(img.shape, cw, ch))
         self.photo = ImageTk.PhotoImage(Image.fromarray(disp))
         self.canvas.delete("all")
         self.canvas.create_image(cw//2, ch//2, image=self.photo, anchor='center')
@@ -318,31 +339,31 @@ class ImageToolkitExtended(tk.Tk):
         cv2.imwrite(p, self.orig_img)
         messagebox.showinfo("Saved", f"Image saved to {p}")
 
+    def choose_logo(self):
+        p = filedialog.askopenfilename(filetypes=[("PNG","*.png"),("Images","*.png;*.jpg;*.jpeg;*.bmp;*.webp")])
+        self.wm_logo = p or None
+        messagebox.showinfo("Watermark", f"Logo: {os.path.basename(p)}" if p else "Logo cleared")
+
     def apply_watermark(self):
-        if self.orig_img is None or not self.wm_text.get().strip():
-            return messagebox.showwarning("Watermark","Load image and enter text first")
+        text = self.wm_text.get().strip()
+        if self.orig_img is None or not (text or self.wm_logo):
+            return messagebox.showwarning("Watermark","Load image and enter text or choose a logo first")
         img = self.current_img.copy()
-        h, w = img.shape[:2]
-        text = self.wm_text.get()
-        font_scale = w / 800
-        thickness = max(1, int(2 * font_scale))
-        (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-        pos = self.wm_pos.get()
-        margin = 10
-        if pos=="top-left":    x,y = margin, margin+th
-        elif pos=="top-right": x,y = w-tw-margin, margin+th
-        elif pos=="bottom-left":x,y = margin, h-th-margin
-        elif pos=="bottom-right":x,y= w-tw-margin, h-margin
-        else:                  x,y = (w-tw)//2,(h+th)//2
-        overlay = img.copy()
-        cv2.putText(overlay, text, (int(x),int(y)), cv2.FONT_HERSHEY_SIMPLEX,
-                    font_scale, (255,255,255), thickness, cv2.LINE_AA)
-        alpha = self.wm_opacity.get()
-        blended = cv2.addWeighted(overlay, alpha, img, 1-alpha, 0)
-        self.orig_img = blended
-        self.current_img = blended
-        self.push_history(blended)
-        self.display(blended)
+        w = img.shape[1]
+        pos, alpha, tiled = self.wm_pos.get(), self.wm_opacity.get(), self.wm_tile.get()
+        try:
+            if self.wm_logo:
+                watermark.apply_logo(img, self.wm_logo, alpha, width=w//5, pos=pos,
+                                     margin=10, tiled=tiled)
+            else:
+                watermark.apply_text(img, text, max(10, int(32*w/800)), (255,255,255), alpha,
+                                     pos=pos, margin=10, tiled=tiled)
+        except (ValueError, OSError):
+            return messagebox.showerror("Watermark","Cannot load logo")
+        self.orig_img = img
+        self.current_img = img
+        self.push_history(img)
+        self.display(img)
 
 if __name__=="__main__":
     ImageToolkitExtended().mainloop()
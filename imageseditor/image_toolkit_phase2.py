@@ -5,6 +5,10 @@ from tkinter import ttk, filedialog, messagebox
 import cv2
 import numpy as np
 from PIL import Image, ImageTk
+import pipeline
+import edge_preserving
+import palette
+import convolution
 
 class ImageToolkit(tk.Tk):
     def __init__(self):
@@ -57,6 +61,16 @@ class ImageToolkit(tk.Tk):
         ttk.Scale(ctrl, from_=1, to=500,   variable=self.color_sigma, command=lambda e: self.update_preview()).pack(fill="x")
         ttk.Label(ctrl, text="Cartoon: Space σ").pack(anchor="w")
         ttk.Scale(ctrl, from_=1, to=500,   variable=self.space_sigma, command=lambda e: self.update_preview()).pack(fill="x")
+        self.engine = tk.StringVar(value=edge_preserving.DEFAULT_ENGINE)
+        self.quality = tk.DoubleVar(value=edge_preserving.DEFAULT_QUALITY)
+        ttk.Label(ctrl, text="Cartoon: Smoothing").pack(anchor="w")
+        ttk.OptionMenu(ctrl, self.engine, self.engine.get(), *edge_preserving.ENGINES,
+                       command=lambda e: self.update_preview()).pack(fill="x")
+        ttk.Label(ctrl, text="Cartoon: Quality").pack(anchor="w")
+        ttk.Scale(ctrl, from_=0.25, to=1.0, variable=self.quality, command=lambda e: self.update_preview()).pack(fill="x")
+        self.colors = tk.IntVar(value=0)
+        ttk.Label(ctrl, text="Cartoon: Colors (0 = off)").pack(anchor="w")
+        ttk.Scale(ctrl, from_=0, to=32, variable=self.colors, command=lambda e: self.update_preview()).pack(fill="x")
 
         # Extra filters
         self.invert_var  = tk.BooleanVar()
@@ -106,32 +120,15 @@ class ImageToolkit(tk.Tk):
             self.update_preview()
 
     def cartoonify(self, img):
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # edges
-        edges = cv2.adaptiveThreshold(
-            gray, 255,
-            cv2.ADAPTIVE_THRESH_MEAN_C,
-            cv2.THRESH_BINARY,
-            self.block_size.get() | 1,
-            self.c_param.get()
-        )
-        # color
-        color = cv2.bilateralFilter(
-            img,
-            d=self.k_size.get()|1,
-            sigmaColor=self.color_sigma.get(),
-            sigmaSpace=self.space_sigma.get()
-        )
-        return cv2.bitwise_and(color, color, mask=edges)
+        return pipeline.cartoonify(img, self.block_size.get(), self.c_param.get(), self.k_size.get(),
+                                   self.color_sigma.get(), self.space_sigma.get(),
+                                   self.engine.get(), self.quality.get())
 
     def apply_extra_filters(self, img):
         if self.invert_var.get():
             img = cv2.bitwise_not(img)
         if self.emboss_var.get():
-            kernel = np.array([[ -2, -1, 0],
-                               [ -1,  1, 1],
-                               [  0,  1, 2]], dtype=np.float32)
-            img = cv2.filter2D(img, -1, kernel)
+            img = convolution.convolve(img, convolution.EMBOSS_KERNEL)
         return img
 
     def apply_retouch(self, img):
@@ -158,6 +155,10 @@ class ImageToolkit(tk.Tk):
 
         # cartoon & extras
         img = self.cartoonify(img)
+        k = self.colors.get()
+        if k >= 2:
+            # palette comes from the loaded image and is cached across slider moves
+            img = palette.quantize(img, palette.palette_for(self.orig_img, k))
         img = self.apply_extra_filters(img)
 
         # retouch
@@ -1,11 +1,89 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog, colorchooser
 import cv2
 import numpy as np
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from PIL import Image, ImageTk
 import json
 from datetime import datetime
+import watermark
+from save_queue import SaveQueue, DEFAULT_ENCODER_OPTIONS, merge_alpha
+from recipe import Recipe, apply_commit, apply_commit_alpha, draw_annotation
+import pipeline
+from tiled_buffer import TiledImage
+import transform_stack
+from transform_stack import TransformStack
+from profiler import StageProfiler
+import edge_preserving
+import palette
+import convolution
+import tone
+import lru
+import resample
+import warp
+import smart_crop
+import loader
+import depth
+import hash_index
+import history
+import view
+from catalog_view import CatalogBar
+
+# Images above this many pixels are edited through a disk-backed tiled buffer
+LARGE_IMAGE_PIXELS = 100_000_000
+# Longest side of the in-RAM proxy shown and filtered interactively for large images
+PROXY_MAX_SIDE = 2048
+# JPEGs above this many pixels show a reduced-resolution decode while the full one loads
+QUICK_PREVIEW_PIXELS = 16_000_000
+
+# Filter toggles: (label, var name)
+TOGGLES = [
+    ("Grayscale", "gray"),
+    ("Sepia", "sepia"),
+    ("Invert", "inv"),
+    ("Emboss", "emboss"),
+]
+
+# Auto tone toggles: (label, var name)
+TONE_TOGGLES = [
+    ("Auto Levels", "auto_levels"),
+    ("Auto Contrast", "auto_contrast"),
+]
+
+# Curves dialog: canvas side in pixels and the identity curve
+CURVE_SIZE = 256
+IDENTITY_CURVE = [[0, 0], [255, 255]]
+
+# Rendered outputs kept for instant preset switching and A/B toggling
+RENDER_CACHE_SIZE = 4
+# Recipe keys measured from the current image; presets leave them out
+IMAGE_PARAMS = ('quant_palette', 'tone_levels')
+
+# Before/after compare layouts
+COMPARE_MODES = ("split", "side-by-side")
+
+# Live histogram panel: plot size, line colours (R, G, B, luma) and the
+# shortest gap between recomputations while sliders move
+HIST_W, HIST_H = 256, 120
+HIST_COLORS = ("#e04040", "#40b040", "#4060e0", "#d0d0d0")
+HIST_INTERVAL_MS = 60
+
+# Adjustment sliders: (label, var name, min, max, resolution, default)
+SLIDERS = [
+    ("Blur", "blur", 0, 15, 1, 0),
+    ("Sharpen", "sharpen", 0, 5, 1, 0),
+    ("Unsharp", "unsharp_amount", 0, 3, 0.1, 0),
+    ("USM Radius", "unsharp_radius", 0.5, 50, 0.5, 3),
+    ("Brightness", "brightness", 0.2, 2, 0.01, 1),
+    ("Contrast", "contrast", 0.2, 3, 0.01, 1),
+    ("Gamma", "gamma", 0.2, 3, 0.01, 1),
+    ("Cartoon BS", "cartoon_bs", 3, 51, 2, 7),
+    ("Cartoon C", "cartoon_c", 1, 50, 1, 9),
+    ("Smooth Q", "cartoon_quality", 0.25, 1, 0.05, edge_preserving.DEFAULT_QUALITY),
+    ("Colors", "quant_colors", 0, 32, 1, 0),
+]
 
 class ImageToolkitExtended(tk.Tk):
     def __init__(self):
@@ -19,6 +97,14 @@ class ImageToolkitExtended(tk.Tk):
         self.orig_img = None      # Original loaded image (cv2)
         self.current_img = None   # Current working image (cv2)
         self.filename = None       # Current filename
+        self.source_path = None    # Decoded original the recipe applies to
+        self.recipe = Recipe()     # Non-destructive edits (params, commits, annotations)
+        self.large = None          # TiledImage at full resolution for large images
+        self.base_img = None       # Image the geometry applies to (decoded original or last canvas resize)
+        self.geometry = None       # Rotate/flip/crop since base_img (or the TiledImage), as one TransformStack
+        self.base_alpha = None     # Alpha plane of base_img (transparent PNG/WebP/TIFF), else None
+        self.orig_alpha = None     # base_alpha with the geometry applied; recombined at export
+        self.view_scale = 1.0      # orig_img size relative to full resolution
 
         # History for undo/redo
         self.history = []
@@ -34,24 +120,52 @@ class ImageToolkitExtended(tk.Tk):
         self.brush_color = (255, 0, 0)  # default red in BGR
         self.brush_size = 5
         self.last_pt = None
+        self.stroke = None  # Image-space points of the stroke being drawn
 
         # Watermark state
         self.wm_text = "Watermark"
         self.wm_color = (255, 255, 255)
-        self.wm_pos = (10, 10)
+        self.wm_logo = None       # Optional PNG logo path (used instead of text)
         self.wm_font_size = 30
         self.wm_opacity = 0.7
 
+        # User convolution kernel (list of rows) or None
+        self.custom_kernel = None
+        # Tone curve control points ([x, y] in 0..255) or None
+        self.tone_curve = None
+
+        # Pipeline outputs by (source image, params) for presets and A/B
+        self.render_cache = lru.LRU(RENDER_CACHE_SIZE)
+        self.ab_params = None     # Parameters the A/B button switches back to
+
+        # Compare view: display-size original as (source image, size, PhotoImage)
+        self.compare_base = None
+        self.split_photo = None   # Split view composed from the before/after photos
+        self.split_frac = 0.5     # Split position as a fraction of the image width
+        # Last display buffer as (image, size, 8-bit RGB); repeat redraws of the
+        # same image skip the resize and, for 16-bit images, the quantisation
+        self.disp_cache = None
+
         # Settings
         self.settings = {
             'recent_folders': [],
-            'default_save_format': 'png'
+            'default_save_format': 'png',
+            'encoder': dict(DEFAULT_ENCODER_OPTIONS),
+            'presets': {},
+            'high_bit_depth': False
         }
         self.load_settings()
 
+        # Per-stage timings for the pipeline and display paths
+        self.profiler = StageProfiler()
+
         self.create_ui()
         self.setup_shortcuts()
 
+        # Background writer so saves never block the Tk thread
+        self.save_queue = SaveQueue(self, self.on_save_done)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def create_ui(self):
         # Configure style
         style = ttk.Style()
@@ -80,6 +194,16 @@ class ImageToolkitExtended(tk.Tk):
                                    command=self.load_recent_folder)
         recent_menu.pack(fill="x", pady=2)
         
+        # 16-bit/float files keep full precision when on (applies to the next image opened)
+        self.high_bit_var = tk.BooleanVar(value=self.settings['high_bit_depth'])
+        ttk.Checkbutton(file_frame, text="High bit depth (16-bit working buffers)", variable=self.high_bit_var,
+                        command=lambda: self.settings.update(high_bit_depth=self.high_bit_var.get())).pack(anchor="w")
+
+        # Near-duplicates only, one shaded block per group (hashed in the background)
+        self.dupes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Group duplicates", variable=self.dupes_var,
+                        command=self.toggle_duplicates).pack(anchor="w")
+        
         # File list with scrollbar
         file_list_frame = ttk.Frame(file_frame)
         file_list_frame.pack(fill="both", expand=True)
@@ -94,6 +218,10 @@ class ImageToolkitExtended(tk.Tk):
         self.file_list.bind('<<ListboxSelect>>', self.on_select)
         self.file_list.bind('<Double-1>', lambda e: self.on_select(e))
 
+        # Sort and filter by catalog fields (size, date taken, format, ...)
+        self.catalog_bar = CatalogBar(file_frame, self.file_list, 'image', on_ready=self.on_catalog_ready)
+        self.catalog_bar.pack(fill="x", pady=2, before=file_list_frame)
+
         # — Filters & adjustments —
         ff = ttk.LabelFrame(left, text="Filters & Adjustments")
         ff.pack(fill="x", pady=5)
@@ -102,25 +230,13 @@ class ImageToolkitExtended(tk.Tk):
         filter_frame = ttk.Frame(ff)
         filter_frame.pack(fill="x", pady=2)
         
-        self.gray_var = tk.BooleanVar()
-        self.sepia_var = tk.BooleanVar()
-        self.inv_var = tk.BooleanVar()
-        self.emboss_var = tk.BooleanVar()
-        
-        ttk.Checkbutton(filter_frame, text="Grayscale", variable=self.gray_var, command=self.apply_pipeline).pack(side="left", padx=2)
-        ttk.Checkbutton(filter_frame, text="Sepia", variable=self.sepia_var, command=self.apply_pipeline).pack(side="left", padx=2)
-        ttk.Checkbutton(filter_frame, text="Invert", variable=self.inv_var, command=self.apply_pipeline).pack(side="left", padx=2)
-        ttk.Checkbutton(filter_frame, text="Emboss", variable=self.emboss_var, command=self.apply_pipeline).pack(side="left", padx=2)
+        for lbl, var_name in TOGGLES:
+            var = tk.BooleanVar()
+            setattr(self, var_name + "_var", var)
+            ttk.Checkbutton(filter_frame, text=lbl, variable=var, command=self.apply_pipeline).pack(side="left", padx=2)
 
         # Sliders for adjustments
-        for lbl, var_name, mn, mx, res, default in [
-            ("Blur", "blur", 0, 15, 1, 0),
-            ("Sharpen", "sharpen", 0, 5, 1, 0),
-            ("Brightness", "brightness", 0.2, 2, 0.01, 1),
-            ("Contrast", "contrast", 0.2, 3, 0.01, 1),
-            ("Cartoon BS", "cartoon_bs", 3, 51, 2, 7),
-            ("Cartoon C", "cartoon_c", 1, 50, 1, 9),
-        ]:
+        for lbl, var_name, mn, mx, res, default in SLIDERS:
             frame = ttk.Frame(ff)
             frame.pack(fill="x", pady=2)
             
@@ -136,6 +252,40 @@ class ImageToolkitExtended(tk.Tk):
             value_label.pack(side="left")
             setattr(self, var_name + "_label", value_label)
 
+        # Smoothing engine used by the cartoon effect; Smooth Q trades fidelity for speed
+        engine_frame = ttk.Frame(ff)
+        engine_frame.pack(fill="x", pady=2)
+        ttk.Label(engine_frame, text="Smoothing", width=10).pack(side="left")
+        self.cartoon_engine_var = tk.StringVar(value=edge_preserving.DEFAULT_ENGINE)
+        ttk.OptionMenu(engine_frame, self.cartoon_engine_var, self.cartoon_engine_var.get(), *edge_preserving.ENGINES,
+                       command=lambda e: self.apply_pipeline()).pack(side="left", fill="x", expand=True, padx=5)
+
+        # Auto levels / contrast and the curves editor; all tone steps share one lookup table
+        tone_frame = ttk.Frame(ff)
+        tone_frame.pack(fill="x", pady=2)
+        for lbl, var_name in TONE_TOGGLES:
+            var = tk.BooleanVar()
+            setattr(self, var_name + "_var", var)
+            ttk.Checkbutton(tone_frame, text=lbl, variable=var, command=self.apply_pipeline).pack(side="left", padx=2)
+        ttk.Button(tone_frame, text="Curves…", command=self.edit_curve).pack(side="left", fill="x", expand=True, padx=2)
+
+        kernel_frame = ttk.Frame(ff)
+        kernel_frame.pack(fill="x", pady=2)
+        ttk.Button(kernel_frame, text="Custom Kernel…", command=self.prompt_kernel).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(kernel_frame, text="Clear Kernel", command=self.clear_kernel).pack(side="left", fill="x", expand=True, padx=2)
+
+        # Named presets from the settings file; A/B swaps with the previous look
+        preset_frame = ttk.Frame(ff)
+        preset_frame.pack(fill="x", pady=2)
+        ttk.Label(preset_frame, text="Preset", width=10).pack(side="left")
+        self.preset_var = tk.StringVar()
+        self.preset_menu = ttk.OptionMenu(preset_frame, self.preset_var, "")
+        self.preset_menu.pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(preset_frame, text="Save…", width=6, command=self.save_preset).pack(side="left", padx=1)
+        ttk.Button(preset_frame, text="Del", width=4, command=self.delete_preset).pack(side="left", padx=1)
+        ttk.Button(preset_frame, text="A/B", width=4, command=self.toggle_ab).pack(side="left", padx=1)
+        self.refresh_presets()
+
         # — Annotation & Crop & Resize —
         af = ttk.LabelFrame(left, text="Tools")
         af.pack(fill="x", pady=5)
@@ -173,7 +323,16 @@ class ImageToolkitExtended(tk.Tk):
         
         ttk.Button(action_frame, text="Apply Crop", command=self.apply_crop).pack(side="left", fill="x", expand=True, padx=2)
         ttk.Button(action_frame, text="Canvas Resize", command=self.canvas_resize).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(action_frame, text="Resize…", command=self.prompt_resize).pack(side="left", fill="x", expand=True, padx=2)
         ttk.Button(action_frame, text="Reset", command=self.reset_image).pack(side="left", fill="x", expand=True, padx=2)
+        
+        warp_frame = ttk.Frame(af)
+        warp_frame.pack(fill="x", pady=2)
+        ttk.Button(warp_frame, text="Straighten…", command=self.prompt_straighten).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(warp_frame, text="Perspective…", command=self.prompt_perspective).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(warp_frame, text="Auto Crop", command=self.auto_crop).pack(side="left", fill="x", expand=True, padx=2)
+        self.aspect_var = tk.StringVar(value=smart_crop.ASPECTS[0])
+        ttk.OptionMenu(warp_frame, self.aspect_var, self.aspect_var.get(), *smart_crop.ASPECTS).pack(side="left", padx=2)
 
         # — Transform & History & Save —
         tf = ttk.LabelFrame(left, text="Transform / History")
@@ -200,8 +359,29 @@ class ImageToolkitExtended(tk.Tk):
         save_frame = ttk.Frame(tf)
         save_frame.pack(fill="x", pady=2)
         
-        ttk.Button(save_frame, text="Save", command=self.save_image).pack(side="left", fill="x", expand=True, padx=2)
-        ttk.Button(save_frame, text="Save As...", command=self.save_image_as).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(save_frame, text="Save Edits", command=self.save_image).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(save_frame, text="Export...", command=self.save_image_as).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(save_frame, text="Save Options…", command=self.prompt_save_options).pack(side="left", fill="x", expand=True, padx=2)
+
+        # Before/after compare
+        compare_frame = ttk.Frame(tf)
+        compare_frame.pack(fill="x", pady=2)
+        
+        self.compare_var = tk.BooleanVar()
+        ttk.Checkbutton(compare_frame, text="Compare", variable=self.compare_var,
+                        command=self.redisplay).pack(side="left", padx=2)
+        self.compare_mode_var = tk.StringVar(value=COMPARE_MODES[0])
+        ttk.OptionMenu(compare_frame, self.compare_mode_var, self.compare_mode_var.get(), *COMPARE_MODES,
+                       command=lambda e: self.redisplay()).pack(side="left", fill="x", expand=True, padx=2)
+
+        # Profiler toggle and log export
+        profile_frame = ttk.Frame(tf)
+        profile_frame.pack(fill="x", pady=2)
+        
+        self.profile_var = tk.BooleanVar()
+        ttk.Checkbutton(profile_frame, text="Show Timings", variable=self.profile_var,
+                        command=self.toggle_profiler).pack(side="left", padx=2)
+        ttk.Button(profile_frame, text="Export Timings…", command=self.export_profile).pack(side="left", fill="x", expand=True, padx=2)
 
         # — Watermark —
         wm = ttk.LabelFrame(left, text="Watermark / Overlay")
@@ -227,8 +407,37 @@ class ImageToolkitExtended(tk.Tk):
         self.wm_opacity_scale.set(self.wm_opacity)
         self.wm_opacity_scale.pack(fill="x", pady=1)
         
+        wm_logo_frame = ttk.Frame(wm)
+        wm_logo_frame.pack(fill="x", pady=1)
+        ttk.Button(wm_logo_frame, text="Set Logo…", command=self.prompt_wm_logo).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(wm_logo_frame, text="Clear Logo", command=self.clear_wm_logo).pack(side="left", fill="x", expand=True, padx=2)
+        
+        wm_pos_frame = ttk.Frame(wm)
+        wm_pos_frame.pack(fill="x", pady=1)
+        self.wm_pos_var = tk.StringVar(value="bottom-right")
+        ttk.OptionMenu(wm_pos_frame, self.wm_pos_var, self.wm_pos_var.get(), *watermark.POSITIONS).pack(side="left", fill="x", expand=True, padx=2)
+        self.wm_tile_var = tk.BooleanVar()
+        ttk.Checkbutton(wm_pos_frame, text="Tile", variable=self.wm_tile_var).pack(side="left", padx=2)
+        
         ttk.Button(wm, text="Apply WM", command=self.apply_watermark).pack(fill="x", pady=1)
 
+        # — Histogram —
+        hist_panel = ttk.LabelFrame(main_frame, text="Histogram")
+        hist_panel.pack(side="right", fill="y", padx=5, pady=5)
+        
+        self.hist_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(hist_panel, text="Show", variable=self.hist_var,
+                        command=self.toggle_histogram).pack(anchor="w")
+        self.hist_canvas = tk.Canvas(hist_panel, width=HIST_W, height=HIST_H, bg="#202020", highlightthickness=0)
+        self.hist_canvas.pack(pady=2)
+        # One polyline per channel; updates only move their points
+        self.hist_lines = [self.hist_canvas.create_line(0, HIST_H, HIST_W, HIST_H, fill=c) for c in HIST_COLORS]
+        self.hist_stats = ttk.Label(hist_panel, text="", justify="left", font=("Courier", 9))
+        self.hist_stats.pack(anchor="w")
+        self.hist_img = None      # Image the plotted histogram belongs to
+        self.hist_src = None      # [rgb, alpha] display layers waiting to be measured
+        self.hist_job = None      # Pending after() id
+
         # — Canvas —
         self.canvas_frame = ttk.Frame(main_frame)
         self.canvas_frame.pack(side="right", fill="both", expand=True)
@@ -253,6 +462,9 @@ class ImageToolkitExtended(tk.Tk):
         self.bind("<Control-s>", lambda e: self.save_image())
         self.bind("<Control-o>", lambda e: self.choose_folder())
         self.bind("<Control-r>", lambda e: self.reset_image())
+        self.bind("<Control-b>", lambda e: self.toggle_ab())
+        self.bind("<backslash>", lambda e: (self.compare_var.set(not self.compare_var.get()), self.redisplay()))
+        self.bind("<F12>", lambda e: (self.profile_var.set(not self.profile_var.get()), self.toggle_profiler()))
 
     def load_settings(self):
         try:
@@ -275,14 +487,56 @@ class ImageToolkitExtended(tk.Tk):
     def load_recent_folder(self, folder):
         if not folder: return
         self.folder = folder
-        self.file_list.delete(0, tk.END)
         try:
-            for f in sorted(os.listdir(folder)):
-                if f.lower().endswith(('.png','.jpg','.jpeg','.bmp','.tiff','.webp')):
-                    self.file_list.insert(tk.END, f)
+            self.catalog_bar.set_folder(folder)
         except PermissionError:
             messagebox.showerror("Error", f"Cannot access folder: {folder}")
 
+    def on_catalog_ready(self, folder):
+        # Thumbnail hashes are in the database now, so grouping decodes nothing
+        if self.dupes_var.get():
+            self.find_duplicates(folder)
+
+    def toggle_duplicates(self):
+        if not self.dupes_var.get():
+            self.catalog_bar.set_groups(None)
+        elif self.folder and self.catalog_bar.ready:
+            self.find_duplicates(self.folder)
+
+    def find_duplicates(self, folder):
+        # Hash the folder on a worker thread (only new or changed files are
+        # decoded) and poll for progress and the groups from the Tk thread
+        results = queue.Queue()
+
+        def work():
+            try:
+                hashes = hash_index.scan(folder, progress=lambda i, n: results.put(('progress', i, n)))
+                results.put(('done', hash_index.groups(hashes)))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            if self.folder != folder or not self.dupes_var.get():
+                return  # Superseded; the worker finishes and is ignored
+            try:
+                while True:
+                    msg = results.get_nowait()
+                    if msg[0] == 'progress':
+                        self.status_bar.config(text=f"Hashing {msg[1]}/{msg[2]} images…")
+                    elif msg[0] == 'error':
+                        messagebox.showerror("Error", f"Failed to find duplicates: {str(msg[1])}")
+                        return
+                    else:
+                        self.catalog_bar.set_groups(msg[1])
+                        self.status_bar.config(text=f"{len(msg[1])} duplicate groups")
+                        return
+            except queue.Empty:
+                self.after(100, poll)
+
+        self.status_bar.config(text="Looking for duplicates…")
+        threading.Thread(target=work, daemon=True).start()
+        self.after(100, poll)
+
     # --- Folder & Loading ---
     def choose_folder(self):
         fld = filedialog.askdirectory()
@@ -298,92 +552,357 @@ class ImageToolkitExtended(tk.Tk):
         self.filename = self.file_list.get(sel[0])
         path = os.path.join(self.folder, self.filename)
         try:
-            img = cv2.imread(path)
-            if img is None:
-                return messagebox.showerror("Error", "Cannot load image (unsupported format?)")
-            self.orig_img = img
-            self.current_img = img.copy()
+            recipe = Recipe.load(path) or Recipe()
+            # Pixels are decoded as stored; the EXIF orientation starts the
+            # composed geometry, so recipe commits apply to the upright image
+            w, h, orient = loader.header(path)
+            if w * h > self.settings.get('large_image_pixels', LARGE_IMAGE_PIXELS):
+                # Too big for RAM: stream into a memmap and edit a proxy
+                self.status_bar.config(text=f"Loading {w}x{h} image into tiled buffer…")
+                self.update_idletasks()
+                large = TiledImage.open(path)
+                large, geometry = transform_stack.replay(large, recipe.commits, lambda b, c: b.apply_commit(c),
+                                                         loader.orient_stack(large.shape, orient))
+                self.set_large(large, geometry)
+            else:
+                if w * h > QUICK_PREVIEW_PIXELS and loader.can_reduce(path):
+                    self.quick_preview(path, w, h, orient)
+                img, alpha, stack = loader.read_alpha(path, high_bit=self.high_bit_var.get())
+                if img is None:
+                    return messagebox.showerror("Error", "Cannot load image (unsupported format?)")
+                self.large = None
+                self.view_scale = 1.0
+                base, geometry = transform_stack.replay(img, recipe.commits, apply_commit, stack)
+                if alpha is not None:
+                    # Same shapes, so the same stack; only non-composable commits touch alpha pixels
+                    alpha = transform_stack.replay(alpha, recipe.commits, apply_commit_alpha, stack)[0]
+                self.set_geometry(base, geometry, alpha)
+            # Restore saved edits from the sidecar, if any
+            self.source_path = path
+            self.recipe = recipe
+            if self.recipe.params:
+                self.set_params(self.recipe.params)
             self.history.clear()
             self.history_index = -1
-            self.push_history(self.orig_img)
             self.apply_pipeline()
             self.update_status_bar()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
 
+    def quick_preview(self, path, w, h, orient):
+        # Show a 1/2-1/8 scale decode, just big enough for the canvas, while
+        # the full-resolution decode runs
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        ow, oh = loader.oriented_size(w, h, orient)
+        scale = min(1.0, cw / ow, ch / oh)
+        img, stack = loader.read(path, loader.reduction((w, h), (w * scale, h * scale)))
+        if img is None: return
+        disp = cv2.resize(stack.view(img), (max(1, int(ow * scale)), max(1, int(oh * scale))),
+                          interpolation=cv2.INTER_AREA)
+        self.photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(disp, cv2.COLOR_BGR2RGB)))
+        self.canvas.delete("all")
+        self.canvas.create_image(cw // 2, ch // 2, image=self.photo, anchor='center')
+        self.status_bar.config(text=f"Loading {w}x{h} image…")
+        self.update_idletasks()
+
     # --- Pipeline ---
+    def get_params(self):
+        params = {name: getattr(self, f"{name}_var").get() for _, name in TOGGLES}
+        params.update({name: getattr(self, f"{name}_var").get() for _, name, *_ in SLIDERS})
+        params.update({name: getattr(self, f"{name}_var").get() for _, name in TONE_TOGGLES})
+        params['cartoon_engine'] = self.cartoon_engine_var.get()
+        if self.custom_kernel:
+            params['kernel'] = self.custom_kernel
+        if self.tone_curve:
+            params['tone_curve'] = self.tone_curve
+        k = int(params['quant_colors'])
+        if k >= 2 and self.orig_img is not None:
+            # Palette of the working image, cached by its fingerprint so slider
+            # moves reuse it while crops, warps and reloads get a new one
+            params['quant_palette'] = palette.palette_for(depth.to_u8(self.orig_img), k).tolist()
+        return params
+
+    def default_params(self):
+        params = {name: False for _, name in TOGGLES + TONE_TOGGLES}
+        params.update({name: default for _, name, _, _, _, default in SLIDERS})
+        params['cartoon_engine'] = edge_preserving.DEFAULT_ENGINE
+        return params
+
+    def set_params(self, params):
+        for name, value in params.items():
+            var = getattr(self, f"{name}_var", None)
+            if var is None: continue
+            var.set(value)
+            label = getattr(self, f"{name}_label", None)
+            if label is not None:
+                label.config(text=f"{value:.2f}" if isinstance(value, float) else str(value))
+        self.custom_kernel = params.get('kernel')
+        self.tone_curve = params.get('tone_curve')
+
     def slider_changed(self, var_name):
         # Update the label showing the current value
         value = getattr(self, f"{var_name}_var").get()
         getattr(self, f"{var_name}_label").config(text=f"{value:.2f}" if isinstance(value, float) else str(value))
         self.apply_pipeline()
 
-    def apply_pipeline(self):
+    def apply_pipeline(self, push=True, cached=False):
         if self.orig_img is None: return
-        img = self.orig_img.copy()
-
-        # grayscale / sepia / invert
-        if self.gray_var.get():
-            g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            img = cv2.cvtColor(g, cv2.COLOR_GRAY2BGR)
-        if self.sepia_var.get():
-            K = np.array([[0.272, 0.534, 0.131], [0.349, 0.686, 0.168], [0.393, 0.769, 0.189]])
-            img = cv2.transform(img, K)
-        if self.inv_var.get():
-            img = cv2.bitwise_not(img)
-
-        # blur
-        b = self.blur_var.get()
-        if b > 0: 
-            img = cv2.GaussianBlur(img, (0, 0), b)
-
-        # sharpen
-        s = self.sharpen_var.get()
-        if s > 0:
-            kern = np.array([[-1, -1, -1], [-1, 9 + s, -1], [-1, -1, -1]])
-            img = cv2.filter2D(img, -1, kern)
-
-        # cartoon: ensure odd blockSize ≥3
-        bs = int(self.cartoon_bs_var.get())
-        block = bs if bs % 2 == 1 and bs > 1 else bs + 1 if (bs + 1) % 2 == 1 else 3
-        c = int(self.cartoon_c_var.get())
-        
-        # Only apply cartoon effect if either parameter is non-default
-        if bs != 7 or c != 9:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            edges = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, 
-                                         cv2.THRESH_BINARY, block, c)
-            color = cv2.bilateralFilter(img, block, 200, 200)
-            img = cv2.bitwise_and(color, color, mask=edges)
-
-        # emboss
-        if self.emboss_var.get():
-            k = np.array([[-2, -1, 0], [-1, 1, 1], [0, 1, 2]])
-            img = cv2.filter2D(img, -1, k)
-
-        # brightness / contrast
-        alpha = self.contrast_var.get()
-        beta = int((self.brightness_var.get() - 1) * 255)
-        img = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+        params = self.get_params()
+        prof = self.profiler
+        prof.begin()
+        render = lambda: pipeline.render_levels(self.orig_img, pipeline.scale_params(params, self.view_scale),
+                                                prof if prof.enabled else None)
+        if cached:
+            # Entries hold the source image, so its id cannot be reused while cached;
+            # annotations are drawn on a copy and the cached output stays clean
+            key = (id(self.orig_img), json.dumps(params, sort_keys=True))
+            img, levels = self.render_cache.get(key, lambda: (self.orig_img, render()))[1]
+            img = img.copy()
+        else:
+            img, levels = render()
+        if levels is not None:
+            # Auto levels measured on the tone stage input, kept for the
+            # full-resolution render
+            params['tone_levels'] = levels
+
+        # annotations sit on top of the filtered image
+        self.recipe.params = params
+        prof.run("annotations", self.recipe.draw, img, self.view_scale)
 
         self.current_img = img
-        self.push_history(img)
+        if push:
+            prof.run("push_history", self.push_history)
         self.display(img)
 
+    # --- Presets ---
+    def apply_params(self, params):
+        # Set every control first, then render once. Tk variables do not fire
+        # their widgets' commands when set from code, so nothing renders early.
+        current = self.get_params()
+        self.set_params(dict(self.default_params(), **params))
+        if self.orig_img is not None:
+            self.ab_params = current
+            self.apply_pipeline(cached=True)
+
+    def preset_params(self):
+        return {k: v for k, v in self.get_params().items() if k not in IMAGE_PARAMS}
+
+    def refresh_presets(self):
+        menu = self.preset_menu['menu']
+        menu.delete(0, 'end')
+        for name in sorted(self.settings['presets']):
+            menu.add_command(label=name, command=lambda n=name: self.apply_preset(n))
+
+    def apply_preset(self, name):
+        self.preset_var.set(name)
+        self.apply_params(self.settings['presets'][name])
+        self.status_bar.config(text=f"Preset: {name}")
+
+    def save_preset(self):
+        name = simpledialog.askstring("Save Preset", "Preset name:", initialvalue=self.preset_var.get(), parent=self)
+        if not name: return
+        self.settings['presets'][name] = self.preset_params()
+        self.save_settings()
+        self.refresh_presets()
+        self.preset_var.set(name)
+
+    def delete_preset(self):
+        name = self.preset_var.get()
+        if name not in self.settings['presets']: return
+        if not messagebox.askyesno("Delete Preset", f"Delete preset '{name}'?"): return
+        del self.settings['presets'][name]
+        self.save_settings()
+        self.refresh_presets()
+        self.preset_var.set("")
+
+    def toggle_ab(self):
+        # Swap with the look before the last preset or A/B switch; both
+        # renders are cached, so toggling back and forth does not re-filter
+        if self.ab_params is None or self.orig_img is None: return
+        params = self.ab_params
+        self.apply_params({k: v for k, v in params.items() if k not in IMAGE_PARAMS})
+        self.status_bar.config(text="A/B: switched look")
+
     # --- Transform ---
     def transform(self, op):
-        if self.current_img is None: return
-        img = self.current_img.copy()
+        if self.orig_img is None: return
         if op == 'hflip': 
-            img = cv2.flip(img, 1)
+            c = {'op': 'flip', 'axis': 'h'}
         elif op == 'vflip': 
-            img = cv2.flip(img, 0)
+            c = {'op': 'flip', 'axis': 'v'}
         else: 
-            img = cv2.rotate(img, op)
-        self.orig_img = img
-        self.push_history(img)
+            c = {'op': 'rotate', 'code': op}
+        self.commit(c)
+
+    def commit(self, c):
+        # Geometric edits apply to the unfiltered original and are recorded
+        # in the recipe so they can be replayed from the source file. Rotate,
+        # flip and crop only update the composed geometry, which is applied
+        # to the base in one pass; the tiled buffer is not touched until export.
+        self.recipe.commit(c, self.work_shape())
+        base = self.large if self.large is not None else self.base_img
+        geometry = self.geometry.push(c)
+        alpha = self.base_alpha
+        if geometry is None:
+            # Canvas resize adds pixels: materialize once and start a new stack
+            base = self.geometry.apply(base)
+            base = base.apply_commit(c) if self.large is not None else apply_commit(base, c)
+            if alpha is not None:
+                alpha = apply_commit_alpha(self.orig_alpha, c)
+            geometry = TransformStack(base.shape)
+        if self.large is not None:
+            self.set_large(base, geometry)
+        else:
+            self.set_geometry(base, geometry, alpha)
         self.apply_pipeline()
 
+    def set_geometry(self, base, geometry, alpha=None):
+        # alpha follows the colour image through the same geometry
+        self.base_img = base
+        self.geometry = geometry
+        self.orig_img = geometry.apply(base)
+        self.base_alpha = alpha
+        self.orig_alpha = geometry.apply(alpha) if alpha is not None else None
+
+    # --- Custom kernel ---
+    def prompt_kernel(self):
+        current = "; ".join(" ".join(f"{v:g}" for v in row) for row in self.custom_kernel or [])
+        text = simpledialog.askstring("Custom Kernel",
+                                      "Rows separated by ';', values by spaces\n(e.g. 0 -1 0; -1 5 -1; 0 -1 0).\n"
+                                      "Kernels are normalised to sum 1 unless they sum to 0.",
+                                      initialvalue=current or "0 -1 0; -1 5 -1; 0 -1 0", parent=self)
+        if not text: return
+        try:
+            k = convolution.parse_kernel(text)
+        except ValueError as e:
+            return messagebox.showerror("Error", f"Invalid kernel: {str(e)}")
+        self.custom_kernel = k.tolist()
+        self.status_bar.config(text=f"Custom kernel {k.shape[1]}x{k.shape[0]} ({convolution.method(k)})")
+        self.apply_pipeline()
+
+    def clear_kernel(self):
+        self.custom_kernel = None
+        self.apply_pipeline()
+
+    # --- Curves ---
+    def edit_curve(self):
+        # Click to add a point, drag to move it, right-click to remove it.
+        # The preview re-renders while dragging; history is pushed on release.
+        dlg = tk.Toplevel(self)
+        dlg.title("Curves")
+        dlg.transient(self)
+        n = CURVE_SIZE
+        cv = tk.Canvas(dlg, width=n, height=n, bg="white", highlightthickness=0)
+        cv.pack(padx=5, pady=5)
+        points = [list(p) for p in self.tone_curve or IDENTITY_CURVE]
+        drag = {'i': None}
+
+        if self.current_img is not None:
+            # Luminance histogram of the current image behind the curve
+            hist = tone.histogram(self.current_img).sum(0)
+            hist = hist / max(hist.max(), 1) * (n - 1)
+            for x, h in enumerate(hist):
+                cv.create_line(x, n, x, n - h, fill="#dddddd")
+
+        def to_canvas(p):
+            return p[0] * (n - 1) / 255, (255 - p[1]) * (n - 1) / 255
+
+        def redraw():
+            cv.delete("curve")
+            ys = tone.curve(tone.RAMP, points)
+            coords = [c for x, y in enumerate(ys) for c in to_canvas((x, y))]
+            cv.create_line(*coords, fill="black", tags="curve")
+            for p in points:
+                x, y = to_canvas(p)
+                cv.create_oval(x - 4, y - 4, x + 4, y + 4, outline="red", tags="curve")
+
+        def from_event(ev):
+            x = min(255, max(0, round(ev.x * 255 / (n - 1))))
+            y = min(255, max(0, round(255 - ev.y * 255 / (n - 1))))
+            return x, y
+
+        def nearest(ev):
+            for i, p in enumerate(points):
+                x, y = to_canvas(p)
+                if abs(x - ev.x) <= 6 and abs(y - ev.y) <= 6:
+                    return i
+            return None
+
+        def update(push=False):
+            points.sort()
+            self.tone_curve = None if points == IDENTITY_CURVE else [list(p) for p in points]
+            redraw()
+            self.apply_pipeline(push=push)
+
+        def press(ev):
+            i = nearest(ev)
+            if i is None:
+                points.append(list(from_event(ev)))
+                update()
+                i = nearest(ev)
+            drag['i'] = i
+
+        def move(ev):
+            i = drag['i']
+            if i is None: return
+            x, y = from_event(ev)
+            # End points only move vertically; inner points stay between their neighbours
+            if i == 0 or i == len(points) - 1:
+                x = points[i][0]
+            else:
+                x = min(max(x, points[i - 1][0] + 1), points[i + 1][0] - 1)
+            points[i] = [x, y]
+            update()
+
+        def release(ev):
+            if drag['i'] is not None:
+                drag['i'] = None
+                update(push=True)
+
+        def remove(ev):
+            i = nearest(ev)
+            if i is not None and 0 < i < len(points) - 1:
+                points.pop(i)
+                update(push=True)
+
+        def reset():
+            points[:] = [list(p) for p in IDENTITY_CURVE]
+            update(push=True)
+
+        cv.bind("<ButtonPress-1>", press)
+        cv.bind("<B1-Motion>", move)
+        cv.bind("<ButtonRelease-1>", release)
+        cv.bind("<ButtonPress-3>", remove)
+        btns = ttk.Frame(dlg)
+        btns.pack(fill="x", padx=5, pady=5)
+        ttk.Button(btns, text="Reset Curve", command=reset).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(btns, text="Close", command=dlg.destroy).pack(side="left", fill="x", expand=True, padx=2)
+        redraw()
+
+    # --- Large images ---
+    def set_large(self, large, geometry=None):
+        # Interactive work happens on a proxy read from the buffer's pyramid,
+        # with the pending geometry applied to the proxy only. The pyramid
+        # level is picked so a crop still gets about PROXY_MAX_SIDE pixels.
+        geometry = geometry or TransformStack(large.shape)
+        self.large = large
+        self.base_img = None
+        self.base_alpha = self.orig_alpha = None
+        self.geometry = geometry
+        side = int(PROXY_MAX_SIDE * max(large.shape[:2]) / max(geometry.shape))
+        preview = large.preview(side)
+        self.orig_img = geometry.scaled(preview.shape).apply(preview)
+        self.view_scale = self.orig_img.shape[1] / geometry.shape[1]
+
+    def work_shape(self):
+        # Full-resolution shape of the image being edited
+        if self.large is not None:
+            return self.geometry.shape + self.large.shape[2:]
+        return self.orig_img.shape
+
+    def image_to_full(self, ix, iy):
+        return int(ix / self.view_scale), int(iy / self.view_scale)
+
     # --- Watermark ---
     def prompt_watermark(self):
         txt = simpledialog.askstring("Watermark", "Enter watermark text:", initialvalue=self.wm_text)
@@ -396,6 +915,16 @@ class ImageToolkitExtended(tk.Tk):
             self.wm_color = tuple(map(int, c[::-1]))
             self.wm_color_preview.config(bg=colorchooser.askcolor()[1])
 
+    def prompt_wm_logo(self):
+        p = filedialog.askopenfilename(filetypes=[("PNG", "*.png"), ("Images", "*.png;*.jpg;*.jpeg;*.bmp;*.webp")])
+        if p:
+            self.wm_logo = p
+            self.status_bar.config(text=f"Watermark logo: {os.path.basename(p)}")
+
+    def clear_wm_logo(self):
+        self.wm_logo = None
+        self.status_bar.config(text="Watermark logo cleared")
+
     def update_wm_size(self, val):
         self.wm_font_size = int(float(val))
 
@@ -403,34 +932,17 @@ class ImageToolkitExtended(tk.Tk):
         self.wm_opacity = float(val)
 
     def apply_watermark(self):
-        if not self.current_img or not self.wm_text: return
-        
-        # Convert to PIL for better text handling
-        img_pil = Image.fromarray(cv2.cvtColor(self.current_img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
+        if self.current_img is None or not (self.wm_text or self.wm_logo): return
         
+        # Recorded as an overlay on top of the pipeline output
+        a = {'type': 'watermark', 'text': self.wm_text, 'logo': self.wm_logo,
+             'size': self.wm_font_size, 'color': list(self.wm_color), 'opacity': self.wm_opacity,
+             'pos': self.wm_pos_var.get(), 'tiled': self.wm_tile_var.get()}
         try:
-            font = ImageFont.truetype("arial.ttf", self.wm_font_size)
-        except:
-            font = ImageFont.load_default()
-        
-        # Calculate text size and position
-        text_width, text_height = draw.textsize(self.wm_text, font=font)
-        img_width, img_height = img_pil.size
-        x = img_width - text_width - 20  # 20px from right
-        y = img_height - text_height - 20  # 20px from bottom
-        
-        # Draw text with opacity
-        overlay = Image.new('RGBA', img_pil.size, (0, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
-        overlay_draw.text((x, y), self.wm_text, font=font, 
-                         fill=(*self.wm_color, int(self.wm_opacity * 255)))
-        img_pil = Image.alpha_composite(img_pil.convert('RGBA'), overlay)
-        
-        # Convert back to OpenCV format
-        img = cv2.cvtColor(np.array(img_pil.convert('RGB')), cv2.COLOR_RGB2BGR)
-        self.orig_img = img
-        self.push_history(img)
+            draw_annotation(self.current_img.copy(), a)
+        except (ValueError, OSError) as e:
+            return messagebox.showerror("Error", f"Failed to apply watermark: {str(e)}")
+        self.recipe.annotate(a)
         self.apply_pipeline()
 
     # --- Annotation & Crop ---
@@ -469,18 +981,25 @@ class ImageToolkitExtended(tk.Tk):
 
     def on_mouse_down(self, ev):
         if self.current_img is None: return
+        if self.compare_var.get():
+            # Tools are paused while comparing; the mouse moves the split line
+            return self.move_split(ev.x)
         
         if self.mode in ('pen', 'eraser'):
             self.last_pt = (ev.x, ev.y)
+            self.stroke = [list(self.image_to_full(*self.canvas_to_image(ev.x, ev.y)))]
             self.on_mouse_drag(ev)  # Draw initial point
             
         elif self.mode == 'text':
             txt = simpledialog.askstring("Text", "Enter text:")
             if txt:
-                ix, iy = self.canvas_to_image(ev.x, ev.y)
-                cv2.putText(self.current_img, txt, (ix, iy), cv2.FONT_HERSHEY_SIMPLEX,
-                            self.brush_size / 20, self.brush_color, 2)
-                self.push_history(self.current_img)
+                ix, iy = self.image_to_full(*self.canvas_to_image(ev.x, ev.y))
+                a = {'type': 'text', 'text': txt, 'org': [ix, iy],
+                     'scale': self.brush_size / 20 / self.view_scale, 'color': list(self.brush_color)}
+                self.recipe.annotate(a)
+                draw_annotation(self.current_img, a, self.view_scale)
+                self.push_history()
+                self.disp_cache = None
                 self.display(self.current_img)
                 
         elif self.mode == 'crop':
@@ -493,6 +1012,8 @@ class ImageToolkitExtended(tk.Tk):
 
     def on_mouse_drag(self, ev):
         if self.current_img is None: return
+        if self.compare_var.get():
+            return self.move_split(ev.x)
         
         if self.mode in ('pen', 'eraser') and hasattr(self, 'last_pt'):
             x0, y0 = self.last_pt
@@ -500,8 +1021,10 @@ class ImageToolkitExtended(tk.Tk):
             ix0, iy0 = self.canvas_to_image(x0, y0)
             ix1, iy1 = self.canvas_to_image(x1, y1)
             col = (255, 255, 255) if self.mode == 'eraser' else self.brush_color
-            cv2.line(self.current_img, (ix0, iy0), (ix1, iy1), col, self.brush_size)
+            cv2.line(self.current_img, (ix0, iy0), (ix1, iy1), depth.scale_color(col, self.current_img.dtype), self.brush_size)
+            self.stroke.append(list(self.image_to_full(ix1, iy1)))
             self.last_pt = (x1, y1)
+            self.disp_cache = None
             self.display(self.current_img)
             
         elif self.mode == 'crop' and self.crop_start:
@@ -522,8 +1045,13 @@ class ImageToolkitExtended(tk.Tk):
             self.canvas.yview_scroll(-dy, "units")
 
     def on_mouse_up(self, ev):
-        if self.mode in ('pen', 'eraser'):
-            self.push_history(self.current_img)
+        if self.compare_var.get(): return
+        if self.mode in ('pen', 'eraser') and self.stroke:
+            col = (255, 255, 255) if self.mode == 'eraser' else self.brush_color
+            self.recipe.annotate({'type': 'stroke', 'points': self.stroke, 'color': list(col),
+                                  'size': max(1, round(self.brush_size / self.view_scale))})
+            self.stroke = None
+            self.push_history()
         elif self.mode == 'crop' and self.crop_start:
             x0, y0 = self.crop_start
             x1, y1 = ev.x, ev.y
@@ -560,108 +1088,435 @@ class ImageToolkitExtended(tk.Tk):
         if ix1 <= ix0 or iy1 <= iy0:
             return messagebox.showerror("Error", "Invalid crop area")
             
-        cropped = self.orig_img[iy0:iy1, ix0:ix1]
-        self.orig_img = cropped
-        self.push_history(cropped)
-        self.apply_pipeline()
+        self.commit({'op': 'crop', 'box': [*self.image_to_full(ix0, iy0), *self.image_to_full(ix1, iy1)]})
         
         if self.crop_box_id: 
             self.canvas.delete(self.crop_box_id)
             self.crop_box_id = None
             self.crop_rect = None
 
+    def auto_crop(self):
+        # Crop to the selected aspect ratio around the most salient region.
+        # Saliency comes from the unfiltered working image and is cached, so
+        # trying several ratios analyses it once.
+        if self.orig_img is None: return
+        aspect = self.aspect_var.get()
+        sal = self.profiler.run("smart_crop", smart_crop.analyze, self.orig_img)
+        box = sal.box(aspect, shape=self.work_shape())
+        self.commit({'op': 'crop', 'box': box})
+        self.status_bar.config(text=f"Auto crop {aspect}: {box[2] - box[0]}x{box[3] - box[1]} (Ctrl+Z to undo)")
+
     def canvas_resize(self):
         if self.orig_img is None: return
         
-        ih, iw = self.orig_img.shape[:2]
+        ih, iw = self.work_shape()[:2]
         new_w = simpledialog.askinteger("Resize", "New width:", minvalue=1, initialvalue=iw)
         if not new_w: return
         
         new_h = simpledialog.askinteger("Resize", "New height:", minvalue=1, initialvalue=ih)
         if not new_h: return
         
-        # Create new canvas with specified dimensions
-        canvas = np.zeros((new_h, new_w, 3), dtype=np.uint8)
-        
-        # Calculate position to paste original image (centered)
-        ox = (new_w - iw) // 2
-        oy = (new_h - ih) // 2
-        
-        # Paste original image onto canvas
-        canvas[oy:oy + ih, ox:ox + iw] = self.orig_img
-        
-        self.orig_img = canvas
-        self.push_history(canvas)
-        self.apply_pipeline()
+        # Center the original on a new black canvas
+        self.commit({'op': 'canvas', 'size': [new_w, new_h]})
+
+    def prompt_resize(self):
+        # Scale the image; recorded as a geometric commit like crop and rotate
+        if self.orig_img is None: return
+        ih, iw = self.work_shape()[:2]
+        dlg = tk.Toplevel(self)
+        dlg.title("Resize")
+        dlg.transient(self)
+        
+        w_var, h_var = tk.IntVar(value=iw), tk.IntVar(value=ih)
+        keep = tk.BooleanVar(value=True)
+        method = tk.StringVar(value=resample.DEFAULT_METHOD)
+        linear = tk.BooleanVar()
+        
+        def sync(changed):
+            # Keep the aspect ratio while one side is edited
+            if not keep.get(): return
+            try:
+                if changed == 'w':
+                    h_var.set(resample.target_size((ih, iw), width=w_var.get())[1])
+                else:
+                    w_var.set(resample.target_size((ih, iw), height=h_var.get())[0])
+            except (tk.TclError, ZeroDivisionError):
+                pass
+        
+        for row, (lbl, var, side) in enumerate([("Width", w_var, 'w'), ("Height", h_var, 'h')]):
+            ttk.Label(dlg, text=lbl).grid(row=row, column=0, sticky="w", padx=5, pady=2)
+            sb = ttk.Spinbox(dlg, from_=1, to=100000, textvariable=var, width=8, command=lambda s=side: sync(s))
+            sb.grid(row=row, column=1, padx=5, pady=2)
+            sb.bind("<KeyRelease>", lambda e, s=side: sync(s))
+        ttk.Checkbutton(dlg, text="Keep aspect ratio", variable=keep).grid(row=2, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Label(dlg, text="Method").grid(row=3, column=0, sticky="w", padx=5, pady=2)
+        ttk.OptionMenu(dlg, method, method.get(), *resample.METHODS).grid(row=3, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Checkbutton(dlg, text="Linear light (gamma-aware)", variable=linear).grid(row=4, column=0, columnspan=2, sticky="w", padx=5)
+        
+        def ok():
+            try:
+                size = [max(1, w_var.get()), max(1, h_var.get())]
+            except tk.TclError:
+                return messagebox.showerror("Error", "Width and height must be integers", parent=dlg)
+            dlg.destroy()
+            if size != [iw, ih]:
+                self.commit({'op': 'resize', 'size': size, 'method': method.get(), 'linear': linear.get()})
+        
+        ttk.Button(dlg, text="OK", command=ok).grid(row=5, column=0, padx=5, pady=5)
+        ttk.Button(dlg, text="Cancel", command=dlg.destroy).grid(row=5, column=1, padx=5, pady=5)
+
+    # --- Straighten / perspective ---
+    def warp_proxy(self):
+        # Canvas-sized copy of the current image and its scale relative to
+        # full resolution; previews warp only this
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        ih, iw = self.work_shape()[:2]
+        scale = min(cw / iw, ch / ih)
+        proxy = cv2.resize(self.current_img, (max(1, int(iw * scale)), max(1, int(ih * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return depth.to_u8(proxy), scale
+
+    def preview_warp(self, proxy, scale, c, grid=False):
+        # Show commit c applied to the proxy, fitted to the canvas
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        m, size = warp.matrix(c, self.work_shape())
+        out_scale = min(cw / size[0], ch / size[1])
+        img = self.profiler.run("warp.preview", warp.preview, proxy, m, size, scale, out_scale)
+        self.photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+        self.canvas.delete("all")
+        self.canvas.create_image(cw // 2, ch // 2, image=self.photo, anchor='center')
+        if grid:
+            h, w = img.shape[:2]
+            x0, y0 = cw // 2 - w // 2, ch // 2 - h // 2
+            for i in range(1, 8):
+                self.canvas.create_line(x0 + w * i // 8, y0, x0 + w * i // 8, y0 + h, fill="#ffffff", stipple="gray50")
+                self.canvas.create_line(x0, y0 + h * i // 8, x0 + w, y0 + h * i // 8, fill="#ffffff", stipple="gray50")
+
+    def prompt_straighten(self):
+        # Free-angle rotation; the slider previews on the canvas proxy and
+        # OK commits one full-resolution warp
+        if self.current_img is None: return
+        proxy, scale = self.warp_proxy()
+        dlg = tk.Toplevel(self)
+        dlg.title("Straighten")
+        dlg.transient(self)
+        angle = tk.DoubleVar(value=0.0)
+        crop = tk.BooleanVar(value=True)
+        
+        def commit_params():
+            return {'op': 'straighten', 'angle': round(angle.get(), 2), 'crop': crop.get()}
+        
+        def update(*_):
+            label.config(text=f"{angle.get():+.2f}°")
+            self.preview_warp(proxy, scale, commit_params(), grid=True)
+        
+        ttk.Label(dlg, text="Angle (counterclockwise)").pack(padx=5, pady=(5, 0))
+        ttk.Scale(dlg, from_=-45, to=45, orient="horizontal", length=300, variable=angle,
+                  command=update).pack(padx=5)
+        label = ttk.Label(dlg, text="+0.00°")
+        label.pack()
+        ttk.Checkbutton(dlg, text="Crop to fill (no empty corners)", variable=crop,
+                        command=update).pack(padx=5, anchor="w")
+        
+        def ok():
+            c = commit_params()
+            dlg.destroy()
+            if c['angle']:
+                self.commit(c)
+            else:
+                self.redisplay()
+        
+        def cancel():
+            dlg.destroy()
+            self.redisplay()
+        
+        btns = ttk.Frame(dlg)
+        btns.pack(pady=5)
+        ttk.Button(btns, text="OK", command=ok).pack(side="left", padx=5)
+        ttk.Button(btns, text="Cancel", command=cancel).pack(side="left", padx=5)
+        dlg.protocol("WM_DELETE_WINDOW", cancel)
+        update()
+
+    def prompt_perspective(self):
+        # Drag the four corners onto the edges of the plane to flatten; the
+        # main canvas previews the corrected proxy while dragging
+        if self.current_img is None: return
+        proxy, scale = self.warp_proxy()
+        ih, iw = self.work_shape()[:2]
+        dlg = tk.Toplevel(self)
+        dlg.title("Perspective")
+        dlg.transient(self)
+        
+        # Source picker: a small copy of the image with the quad on top
+        pick = min(480 / iw, 480 / ih)
+        small = cv2.cvtColor(cv2.resize(proxy, (max(1, int(iw * pick)), max(1, int(ih * pick)))), cv2.COLOR_BGR2RGB)
+        photo = ImageTk.PhotoImage(Image.fromarray(small))
+        cv = tk.Canvas(dlg, width=small.shape[1], height=small.shape[0], highlightthickness=0)
+        cv.pack(padx=5, pady=5)
+        cv.create_image(0, 0, image=photo, anchor='nw')
+        cv.photo = photo
+        inset = 0.1
+        quad = [[iw * inset, ih * inset], [iw * (1 - inset), ih * inset],
+                [iw * (1 - inset), ih * (1 - inset)], [iw * inset, ih * (1 - inset)]]
+        drag = {'i': None}
+        
+        def commit_params():
+            q = [[round(x, 1), round(y, 1)] for x, y in quad]
+            return {'op': 'perspective', 'quad': q, 'size': list(warp.quad_size(q))}
+        
+        def redraw():
+            cv.delete("quad")
+            pts = [v * pick for p in quad for v in p]
+            cv.create_polygon(*pts, outline="#ffff66", fill="", width=2, tags="quad")
+            for x, y in quad:
+                x, y = x * pick, y * pick
+                cv.create_oval(x - 5, y - 5, x + 5, y + 5, outline="#ffff66", fill="#000000", tags="quad")
+        
+        def press(ev):
+            d = [(ev.x - x * pick) ** 2 + (ev.y - y * pick) ** 2 for x, y in quad]
+            drag['i'] = int(np.argmin(d))
+        
+        def move(ev):
+            if drag['i'] is None: return
+            quad[drag['i']] = [max(0, min(iw, ev.x / pick)), max(0, min(ih, ev.y / pick))]
+            redraw()
+            self.preview_warp(proxy, scale, commit_params())
+        
+        def release(ev):
+            drag['i'] = None
+        
+        cv.bind("<ButtonPress-1>", press)
+        cv.bind("<B1-Motion>", move)
+        cv.bind("<ButtonRelease-1>", release)
+        
+        def ok():
+            c = commit_params()
+            if not cv2.isContourConvex(np.float32(c['quad'])):
+                return messagebox.showerror("Error", "The corners must form a convex shape", parent=dlg)
+            dlg.destroy()
+            self.commit(c)
+        
+        def cancel():
+            dlg.destroy()
+            self.redisplay()
+        
+        btns = ttk.Frame(dlg)
+        btns.pack(pady=5)
+        ttk.Button(btns, text="Apply", command=ok).pack(side="left", padx=5)
+        ttk.Button(btns, text="Cancel", command=cancel).pack(side="left", padx=5)
+        dlg.protocol("WM_DELETE_WINDOW", cancel)
+        redraw()
+        self.preview_warp(proxy, scale, commit_params())
 
     def reset_image(self):
         if self.orig_img is None: return
         
         # Reset all filters and adjustments
-        self.gray_var.set(False)
-        self.sepia_var.set(False)
-        self.inv_var.set(False)
-        self.emboss_var.set(False)
+        self.set_params(self.default_params())
         
-        for var_name in ['blur', 'sharpen', 'brightness', 'contrast', 'cartoon_bs', 'cartoon_c']:
-            default = 0 if var_name in ['blur', 'sharpen'] else 1 if var_name in ['brightness', 'contrast'] else 7 if var_name == 'cartoon_bs' else 9
-            getattr(self, f"{var_name}_var").set(default)
-            getattr(self, f"{var_name}_label").config(text=str(default))
-        
-        # Reset to original image
+        # Reset to original image (geometric commits are kept)
+        self.recipe.params = self.get_params()
+        self.recipe.annotations = []
         self.current_img = self.orig_img.copy()
-        self.push_history(self.orig_img)
-        self.display(self.orig_img)
+        self.push_history()
+        self.display(self.current_img)
 
     # --- History ---
-    def push_history(self, img):
-        self.history = self.history[:self.history_index + 1]
-        self.history.append(img.copy())
-        self.history_index = len(self.history) - 1
-        
-        # Limit history size
-        if len(self.history) > 20:
-            self.history.pop(0)
-            self.history_index -= 1
+    def push_history(self):
+        # Entries pair the working original with a recipe snapshot; arrays are
+        # replaced rather than modified in place, so nothing is copied here
+        self.history_index = history.push(self.history, self.history_index, (
+            self.orig_img, self.recipe.snapshot(), self.large, self.base_img, self.geometry,
+            self.base_alpha, self.orig_alpha))
+
+    def restore_history(self, entry):
+        img, recipe, large, base, geometry, base_alpha, alpha = entry
+        self.orig_img = img
+        self.large = large
+        self.base_img = base
+        self.geometry = geometry
+        self.base_alpha = base_alpha
+        self.orig_alpha = alpha
+        self.view_scale = img.shape[1] / geometry.shape[1] if large is not None else 1.0
+        self.recipe = recipe.snapshot()
+        self.set_params(recipe.params)
+        self.apply_pipeline(push=False)
 
     def undo(self):
         if self.history_index > 0:
             self.history_index -= 1
-            self.orig_img = self.history[self.history_index].copy()
-            self.apply_pipeline()
+            self.restore_history(self.history[self.history_index])
 
     def redo(self):
         if self.history_index < len(self.history) - 1:
             self.history_index += 1
-            self.orig_img = self.history[self.history_index].copy()
-            self.apply_pipeline()
+            self.restore_history(self.history[self.history_index])
 
     # --- Display & Save ---
     def on_canvas_resize(self, event):
-        if hasattr(self, 'current_img') and self.current_img is not None:
-            self.display(self.current_img)
+        self.redisplay()
 
     def display(self, img):
         if img is None: return
         
-        ih, iw = img.shape[:2]
         cw = self.canvas.winfo_width()
         ch = self.canvas.winfo_height()
         
-        # Calculate scale to fit image in canvas while maintaining aspect ratio
-        scale = min(cw / iw, ch / ih)
-        new_w, new_h = int(iw * scale), int(ih * scale)
-        
-        # Resize image
-        disp = cv2.resize(img, (new_w, new_h))
-        disp = cv2.cvtColor(disp, cv2.COLOR_BGR2RGB)
+        # Fit image in canvas while maintaining aspect ratio; side-by-side
+        # compare fits each image into half the canvas
+        compare = self.compare_var.get()
+        side = compare and self.compare_mode_var.get() == "side-by-side"
+        new_w, new_h = view.fit_size(img.shape, cw // 2 if side else cw, ch)
+        
+        # Resize, then quantise 16-bit images to 8 bits; only the display-size
+        # buffer is converted, and reused while the image and size are unchanged
+        prof = self.profiler
+        cached = self.disp_cache
+        if cached is not None and cached[0] is img and cached[1] == (new_w, new_h):
+            disp, layers = cached[2], cached[3]
+        else:
+            alpha = None
+            if self.orig_alpha is not None and self.orig_alpha.shape[:2] == img.shape[:2]:
+                alpha = self.export_alpha()
+            disp, *layers = view.render_layers(img, (new_w, new_h), alpha, prof.run)
+            self.disp_cache = (img, (new_w, new_h), disp, layers)
         
         # Convert to PhotoImage
-        self.photo = ImageTk.PhotoImage(Image.fromarray(disp))
+        self.photo = prof.run("display.photo", lambda: ImageTk.PhotoImage(Image.fromarray(disp)))
         
         # Clear canvas and display image centered
         self.canvas.delete("all")
-        self.canvas.create_image(cw // 2, ch // 2, image=self.photo, anchor='center')
+        if compare:
+            self.draw_compare(cw, ch, side)
+        else:
+            self.canvas.create_image(cw // 2, ch // 2, image=self.photo, anchor='center')
+        if prof.enabled:
+            self.draw_profile_overlay()
+        if img is not self.hist_img:
+            # Canvas resizes redisplay the same image; only new renders need a histogram
+            self.hist_img = img
+            # Measured before the checkerboard, on the opaque pixels only
+            self.schedule_histogram(layers)
+
+    def redisplay(self):
+        if self.current_img is not None:
+            self.display(self.current_img)
+
+    # --- Compare ---
+    def before_photo(self, size):
+        # Display-size original, drawn like the "after" side (transparent
+        # areas over the checkerboard); rebuilt only when the source image or
+        # the display size changes, so slider moves reuse it
+        base = self.compare_base
+        alpha = self.orig_alpha
+        if alpha is not None and alpha.shape[:2] != self.orig_img.shape[:2]:
+            alpha = None
+        if base is None or base[0] is not self.orig_img or base[1] != size or base[2] is not alpha:
+            disp = view.render(self.orig_img, size, alpha)
+            base = self.compare_base = (self.orig_img, size, alpha, ImageTk.PhotoImage(Image.fromarray(disp)))
+        return base[3]
+
+    def blit(self, dst, src, x0, x1):
+        # Copy columns x0..x1 between Tk photos without touching Python-side pixels
+        if x1 > x0:
+            dst.tk.call(str(dst), 'copy', str(src), '-from', x0, 0, x1, dst.height(), '-to', x0, 0)
+
+    def draw_compare(self, cw, ch, side):
+        w, h = self.photo.width(), self.photo.height()
+        before = self.before_photo((w, h))
+        label = dict(fill="#ffff66", font=("Helvetica", 10, "bold"))
+        if side:
+            self.canvas.create_image(cw // 4, ch // 2, image=before, anchor='center')
+            self.canvas.create_image(3 * cw // 4, ch // 2, image=self.photo, anchor='center')
+            self.canvas.create_text(cw // 4, ch // 2 - h // 2 + 12, text="Before", **label)
+            self.canvas.create_text(3 * cw // 4, ch // 2 - h // 2 + 12, text="After", **label)
+            return
+        # Split: before left of the line, after right of it
+        self.split_photo = tk.PhotoImage(master=self.canvas, width=w, height=h)
+        self.split_x = int(w * self.split_frac)
+        self.blit(self.split_photo, self.photo, self.split_x, w)
+        self.blit(self.split_photo, before, 0, self.split_x)
+        self.split_left = cw // 2 - w // 2
+        top = ch // 2 - h // 2
+        self.canvas.create_image(self.split_left, top, image=self.split_photo, anchor='nw')
+        x = self.split_left + self.split_x
+        self.canvas.create_line(x, top, x, top + h, fill="white", width=2, tags="split")
+        self.canvas.create_text(self.split_left + 30, top + 12, text="Before", **label)
+        self.canvas.create_text(self.split_left + w - 30, top + 12, text="After", **label)
+
+    def move_split(self, x):
+        # Dragging only re-copies the strip between the old and new positions
+        if self.split_photo is None or self.compare_mode_var.get() != "split": return
+        w = self.split_photo.width()
+        new = max(0, min(w, x - self.split_left))
+        old = self.split_x
+        if new > old:
+            self.blit(self.split_photo, self.before_photo((w, self.split_photo.height())), old, new)
+        else:
+            self.blit(self.split_photo, self.photo, new, old)
+        self.split_x = new
+        self.split_frac = new / max(1, w)
+        line = self.canvas.find_withtag("split")
+        if line:
+            _, y0, _, y1 = self.canvas.coords(line[0])
+            self.canvas.coords(line[0], self.split_left + new, y0, self.split_left + new, y1)
+
+    # --- Histogram ---
+    def schedule_histogram(self, layers):
+        # Coalesce slider ticks: the latest display buffer ([rgb, alpha]) is
+        # measured at most once per HIST_INTERVAL_MS
+        self.hist_src = layers
+        if self.hist_job is None and self.hist_var.get():
+            self.hist_job = self.after(HIST_INTERVAL_MS, self.update_histogram)
+
+    def update_histogram(self):
+        self.hist_job = None
+        layers, self.hist_src = self.hist_src, None
+        if layers is None or not self.hist_var.get(): return
+        hists, stats = self.profiler.run("histogram", tone.live_histogram, *layers)
+        # Scale to the tallest inner bin so clipped 0/255 spikes do not flatten the plot
+        peak = max(1.0, float(hists[:, 1:255].max()))
+        xs = np.arange(256) * (HIST_W - 1) / 255.0
+        for line, h in zip(self.hist_lines, hists):
+            ys = HIST_H - np.minimum(h / peak, 1.0) * (HIST_H - 2)
+            self.hist_canvas.coords(line, *np.column_stack([xs, ys]).ravel().tolist())
+        self.hist_stats.config(text=f"mean {stats['mean']:6.1f}  std {stats['std']:5.1f}\n"
+                                    f"black {stats['shadows']:5.1f}%  white {stats['highlights']:5.1f}%")
+
+    def toggle_histogram(self):
+        if self.hist_var.get():
+            self.hist_img = None
+            if self.current_img is not None:
+                self.display(self.current_img)
+        else:
+            for line in self.hist_lines:
+                self.hist_canvas.coords(line, 0, HIST_H, HIST_W, HIST_H)
+            self.hist_stats.config(text="")
+
+    # --- Profiler ---
+    def toggle_profiler(self):
+        self.profiler.enabled = self.profile_var.get()
+        if self.current_img is not None:
+            # Re-render so the overlay shows a full frame straight away
+            self.apply_pipeline(push=False)
+
+    def draw_profile_overlay(self):
+        # Timings of the latest frame in the top-left corner of the canvas
+        item = self.canvas.create_text(8, 8, anchor="nw", text=self.profiler.summary(),
+                                       fill="#ffff66", font=("Courier", 9))
+        bg = self.canvas.create_rectangle(self.canvas.bbox(item), fill="black", outline="")
+        self.canvas.tag_lower(bg, item)
+
+    def export_profile(self):
+        if not self.profiler.log:
+            return messagebox.showinfo("Timings", "No timings recorded yet. Enable 'Show Timings' and edit the image first.")
+        p = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not p: return
+        try:
+            n = self.profiler.export_csv(p)
+            self.status_bar.config(text=f"Exported {n} timing rows to {os.path.basename(p)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export timings: {str(e)}")
 
     def update_status_bar(self, event=None):
         if self.current_img is None: 
@@ -671,30 +1526,38 @@ class ImageToolkitExtended(tk.Tk):
         if event:
             # Show mouse position and image coordinates
             x, y = event.x, event.y
-            ix, iy = self.canvas_to_image(x, y)
-            ih, iw = self.current_img.shape[:2]
+            ix, iy = self.image_to_full(*self.canvas_to_image(x, y))
+            ih, iw = self.work_shape()[:2]
             self.status_bar.config(text=f"Canvas: ({x},{y}) | Image: ({ix},{iy}) | Size: {iw}x{ih}")
         else:
             # Show basic image info
-            ih, iw = self.current_img.shape[:2]
-            self.status_bar.config(text=f"Image: {self.filename or 'Untitled'} | Size: {iw}x{ih}")
+            ih, iw = self.work_shape()[:2]
+            tiled = f" | Tiled buffer: {self.large.nbytes / 2**30:.1f} GiB on disk" if self.large is not None else ""
+            self.status_bar.config(text=f"Image: {self.filename or 'Untitled'} | Size: {iw}x{ih}{tiled} | {self.memory_report()}")
+
+    def memory_report(self):
+        # RAM held by working buffers and undo history; 16-bit doubles it
+        arrays = [self.orig_img, self.base_img, self.current_img, self.base_alpha, self.orig_alpha]
+        for entry in self.history:
+            arrays += [entry[0], entry[3], entry[5], entry[6]]
+        bits = 16 if depth.is_high(self.orig_img) else 8
+        return f"Buffers: {depth.nbytes(*arrays) / 2**20:.0f} MB ({bits}-bit)"
 
     def save_image(self):
         if self.orig_img is None: return
         
-        if self.filename:
-            # Save to original filename with timestamp
-            base, ext = os.path.splitext(self.filename)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_filename = f"{base}_{timestamp}{ext}"
-            path = os.path.join(self.folder, new_filename)
-            cv2.imwrite(path, self.orig_img)
-            messagebox.showinfo("Saved", f"Image saved as {new_filename}")
+        if self.source_path:
+            # Only the edit recipe is written; pixels are rendered on Export
+            try:
+                path = self.recipe.save(self.source_path)
+            except OSError as e:
+                return messagebox.showerror("Error", f"Failed to save edits: {str(e)}")
+            self.status_bar.config(text=f"Edits saved to {os.path.basename(path)}")
         else:
             self.save_image_as()
 
     def save_image_as(self):
-        if self.orig_img is None: return
+        if self.current_img is None: return
         
         default_ext = self.settings.get('default_save_format', 'png')
         filetypes = [
@@ -714,16 +1577,84 @@ class ImageToolkitExtended(tk.Tk):
         
         if not p: return
         
-        try:
-            cv2.imwrite(p, self.orig_img)
-            messagebox.showinfo("Saved", f"Image saved to {p}")
-            
-            # Update filename and folder if saving to a new location
-            self.filename = os.path.basename(p)
-            self.folder = os.path.dirname(p)
-            self.add_recent_folder(self.folder)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save image: {str(e)}")
+        # Export the rendered result (pipeline + annotations)
+        if self.large is not None:
+            large, geometry, recipe = self.large, self.geometry, self.recipe.snapshot()
+            self.save_queue.submit(p, lambda: self.render_large(large, geometry, recipe), self.settings['encoder'])
+        elif self.orig_alpha is not None:
+            # Colour and alpha are recombined once, on the save worker, from
+            # snapshots taken here (pen and text draw into current_img in place)
+            img, alpha, ext = self.current_img.copy(), self.export_alpha().copy(), os.path.splitext(p)[1]
+            self.save_queue.submit(p, lambda: merge_alpha(img, alpha, ext), self.settings['encoder'])
+        else:
+            # Snapshot: pen and text draw into current_img in place
+            self.save_queue.submit(p, self.current_img.copy(), self.settings['encoder'])
+        self.status_bar.config(text=f"Exporting {os.path.basename(p)}…")
+        self.add_recent_folder(os.path.dirname(p))
+
+    def export_alpha(self):
+        # Alpha of the rendered result: strokes and text are made opaque
+        if not self.recipe.annotations:
+            return self.orig_alpha
+        return self.recipe.draw_alpha(self.orig_alpha.copy(), self.view_scale)
+
+    def render_large(self, large, geometry, recipe):
+        # Runs on the save worker: apply the pending geometry in one streamed
+        # pass, then filter the full-resolution buffer tile by tile
+        params = recipe.params
+        large = geometry.apply(large)
+        out = large.map(lambda tile: pipeline.render(tile, params), pipeline.halo(params))
+        recipe.draw(out.data)
+        return out.data
+
+    def on_save_done(self, path, secs, nbytes, error):
+        if error:
+            return messagebox.showerror("Error", f"Failed to save image: {str(error)}")
+        self.status_bar.config(text=f"Saved {os.path.basename(path)} ({nbytes / 1024:.0f} KB) in {secs * 1000:.0f} ms")
+
+    def prompt_save_options(self):
+        opts = dict(DEFAULT_ENCODER_OPTIONS, **self.settings.get('encoder', {}))
+        dlg = tk.Toplevel(self)
+        dlg.title("Save Options")
+        dlg.transient(self)
+        
+        jpeg_q = tk.IntVar(value=opts['jpeg_quality'])
+        jpeg_prog = tk.BooleanVar(value=opts['jpeg_progressive'])
+        png_c = tk.IntVar(value=opts['png_compression'])
+        webp_q = tk.IntVar(value=opts['webp_quality'])
+        
+        for row, (lbl, var, mn, mx) in enumerate([
+            ("JPEG quality", jpeg_q, 1, 100),
+            ("PNG compression", png_c, 0, 9),
+            ("WebP quality", webp_q, 1, 100),
+        ]):
+            ttk.Label(dlg, text=lbl).grid(row=row, column=0, sticky="w", padx=5, pady=2)
+            ttk.Spinbox(dlg, from_=mn, to=mx, textvariable=var, width=5).grid(row=row, column=1, padx=5, pady=2)
+        ttk.Checkbutton(dlg, text="Progressive JPEG", variable=jpeg_prog).grid(row=3, column=0, columnspan=2, sticky="w", padx=5)
+        
+        def ok():
+            try:
+                self.settings['encoder'] = {
+                    'jpeg_quality': max(1, min(100, jpeg_q.get())),
+                    'jpeg_progressive': jpeg_prog.get(),
+                    'png_compression': max(0, min(9, png_c.get())),
+                    'webp_quality': max(1, min(100, webp_q.get())),
+                }
+            except tk.TclError:
+                return messagebox.showerror("Error", "Encoder options must be integers", parent=dlg)
+            self.save_settings()
+            dlg.destroy()
+        
+        ttk.Button(dlg, text="OK", command=ok).grid(row=4, column=0, columnspan=2, pady=5)
+
+    def on_close(self):
+        if self.save_queue.pending:
+            self.status_bar.config(text="Finishing pending saves…")
+            self.update_idletasks()
+        self.save_queue.close()
+        if self.hist_job is not None:
+            self.after_cancel(self.hist_job)
+        self.destroy()
 
 if __name__ == "__main__":
     app = ImageToolkitExtended()
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+from PIL import Image
+import depth
+from transform_stack import TransformStack
+
+# Image loading with EXIF orientation and reduced-resolution decode.
+#
+# Pixels are decoded as stored (IMREAD_IGNORE_ORIENTATION) and the EXIF
+# orientation, read from the file header, is returned as a TransformStack:
+# stack.view(raw) is a zero-copy oriented view, and the editors fold the
+# stack into their composed geometry so rotation costs nothing until the
+# first materialize. When only a preview or thumbnail is needed, JPEGs are
+# decoded at 1/2, 1/4 or 1/8 scale by libjpeg (IMREAD_REDUCED_*), which skips
+# most of the inverse DCT work.
+
+EXIF_ORIENTATION = 0x0112
+JPEG_EXTS = ('.jpg', '.jpeg', '.jpe', '.jfif')
+ALPHA_EXTS = ('.png', '.webp', '.tif', '.tiff')     # Formats that can carry transparency
+
+# EXIF orientation -> (transpose, flip_x, flip_y) that displays it upright
+ORIENTATIONS = {
+    1: (False, False, False),
+    2: (False, True, False),    # mirrored
+    3: (False, True, True),     # rotated 180
+    4: (False, False, True),    # mirrored vertically
+    5: (True, False, False),    # transposed
+    6: (True, True, False),     # rotated 90 clockwise to display
+    7: (True, True, True),      # transversed
+    8: (True, False, True),     # rotated 90 counterclockwise to display
+}
+
+_REDUCED = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def header(path):
+    # (stored width, stored height, EXIF orientation) without decoding pixels
+    with Image.open(path) as im:
+        try:
+            orient = im.getexif().get(EXIF_ORIENTATION, 1)
+        except Exception:
+            orient = 1
+        return im.size[0], im.size[1], orient if orient in ORIENTATIONS else 1
+
+
+def orientation(path):
+    try:
+        return header(path)[2]
+    except Exception:
+        return 1
+
+
+def oriented_size(w, h, orient):
+    # (width, height) as displayed
+    return (h, w) if ORIENTATIONS.get(orient, ORIENTATIONS[1])[0] else (w, h)
+
+
+def orient_stack(shape, orient):
+    return TransformStack(shape, None, *ORIENTATIONS.get(orient, ORIENTATIONS[1]))
+
+
+def reduction(size, target):
+    # Largest decode factor (1, 2, 4 or 8) that keeps every side of size at
+    # least as large as the matching side of target
+    for f in (8, 4, 2):
+        if all(s // f >= t for s, t in zip(size, target)):
+            return f
+    return 1
+
+
+def can_reduce(path):
+    # Only JPEG decoders scale during decode; other formats would be decoded
+    # in full and resized
+    return path.lower().endswith(JPEG_EXTS)
+
+
+def read(path, reduce=1, high_bit=False):
+    # (raw pixels as stored, TransformStack that orients them); reduce is a
+    # decode factor of 1, 2, 4 or 8 and is ignored for non-JPEG files.
+    # high_bit keeps 16-bit and float files at full precision (see depth.py).
+    flags = _REDUCED.get(reduce if can_reduce(path) else 1, cv2.IMREAD_COLOR)
+    if high_bit and reduce == 1:
+        flags |= cv2.IMREAD_ANYDEPTH
+    raw = cv2.imread(path, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if raw is None:
+        return None, None
+    if high_bit:
+        raw = depth.to_work(raw)
+    return raw, orient_stack(raw.shape, orientation(path))
+
+
+def read_alpha(path, reduce=1, high_bit=False):
+    # (BGR, alpha plane or None, TransformStack). Transparent images are read
+    # with IMREAD_UNCHANGED and split once; the alpha plane is carried beside
+    # the colour image, so filters never see it and geometry applies to both.
+    if not path.lower().endswith(ALPHA_EXTS):
+        raw, stack = read(path, reduce, high_bit)
+        return raw, None, stack
+    raw = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if raw is None:
+        return None, None, None
+    raw = depth.to_work(raw) if high_bit else depth.to_u8(depth.to_work(raw))
+    alpha = None
+    if raw.ndim == 2:
+        raw = cv2.cvtColor(raw, cv2.COLOR_GRAY2BGR)
+    elif raw.shape[2] == 4:
+        alpha = np.ascontiguousarray(raw[..., 3])
+        raw = cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR)
+    if alpha is not None and alpha.min() == depth.peak(alpha.dtype):
+        alpha = None    # Fully opaque: nothing to carry
+    return raw, alpha, orient_stack(raw.shape, orientation(path))
+
+
+def load(path, max_side=None):
+    # Upright image. With max_side, a JPEG is decoded at the smallest scale
+    # whose longest side is still at least max_side (callers resize the rest).
+    reduce = 1
+    if max_side and can_reduce(path):
+        try:
+            w, h, _ = header(path)
+            reduce = reduction((max(w, h),), (max_side,))
+        except Exception:
+            pass
+    raw, stack = read(path, reduce)
+    if raw is None:
+        return None
+    return stack.apply(raw)
@@ -0,0 +1,29 @@
+import threading
+from collections import OrderedDict
+
+
+class LRU:
+    # Small thread-safe LRU shared by the module caches (edge means, tone
+    # histograms, palettes, warp maps, saliency maps, renders); tiled renders
+    # and batch workers call in from worker threads
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, make):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                return value
+        value = make()
+        with self.lock:
+            self.entries[key] = value
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
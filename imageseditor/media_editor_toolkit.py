@@ -3,6 +3,10 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import cv2, numpy as np, os
 from enum import Enum
+from video_io import keep_segments, export_segments
+import tone
+from catalog_view import CatalogBar
+import history
 
 class MediaEditorToolkit(tk.Tk):
     def __init__(self):
@@ -59,6 +63,8 @@ class MediaEditorToolkit(tk.Tk):
         self.video_list = tk.Listbox(left, height=15)
         self.video_list.pack(fill="both", expand=True, pady=5)
         self.video_list.bind("<<ListboxSelect>>", self.load_video)
+        self.video_catalog = CatalogBar(left, self.video_list, 'video', details=True)
+        self.video_catalog.pack(fill="x", before=self.video_list)
 
         self.video_info = ttk.Label(left, text="No video loaded")
         self.video_info.pack(fill="x", pady=5)
@@ -101,6 +107,8 @@ class MediaEditorToolkit(tk.Tk):
         self.img_list = tk.Listbox(left, height=10)
         self.img_list.pack(fill="both", expand=True, pady=5)
         self.img_list.bind("<<ListboxSelect>>", lambda e: self.load_image())
+        self.img_catalog = CatalogBar(left, self.img_list, 'image')
+        self.img_catalog.pack(fill="x", before=self.img_list)
 
         self.img_info = ttk.Label(left, text="No image loaded")
         self.img_info.pack(fill="x", pady=5)
@@ -142,15 +150,12 @@ class MediaEditorToolkit(tk.Tk):
         fld = filedialog.askdirectory()
         if not fld: return
         self.folder = fld
-        self.video_list.delete(0, tk.END)
-        for f in sorted(os.listdir(fld)):
-            if f.lower().endswith((".mp4",".avi",".mov",".mkv")):
-                self.video_list.insert(tk.END, f)
+        self.video_catalog.set_folder(fld)
 
     def load_video(self, _):
         sel = self.video_list.curselection()
         if not sel: return
-        fn = self.video_list.get(sel[0])
+        fn = self.video_catalog.name(sel[0])
         path = os.path.join(self.folder, fn)
         self.stop_playback()
         cap = cv2.VideoCapture(path)
@@ -237,17 +242,7 @@ class MediaEditorToolkit(tk.Tk):
             filetypes=[("MP4","*.mp4"),("AVI","*.avi")]
         )
         if not out: return
-        w = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        h = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.video_fps
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(out, fourcc, fps, (w,h))
-        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, self.trim_start)
-        for fn in range(self.trim_start, self.trim_end+1):
-            ret, frm = self.video_cap.read()
-            if ret:
-                writer.write(frm)
-        writer.release()
+        export_segments(self.video_cap, out, [(self.trim_start, self.trim_end)])
         messagebox.showinfo("Done","Trim saved")
 
     def mark_cut_start(self):
@@ -270,25 +265,7 @@ class MediaEditorToolkit(tk.Tk):
             filetypes=[("MP4","*.mp4"),("AVI","*.avi")]
         )
         if not out: return
-        w = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        h = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.video_fps
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(out, fourcc, fps, (w,h))
-        segs, prev = [], 0
-        for c in sorted(self.cut_ranges, key=lambda x:x["start"]):
-            if c["start"]>prev:
-                segs.append((prev, c["start"]-1))
-            prev = c["end"]+1
-        if prev<self.video_frame_count-1:
-            segs.append((prev,self.video_frame_count-1))
-        for st, ed in segs:
-            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, st)
-            for fn in range(st,ed+1):
-                ret,frm = self.video_cap.read()
-                if ret:
-                    writer.write(frm)
-        writer.release()
+        export_segments(self.video_cap, out, keep_segments(self.video_frame_count, self.cut_ranges))
         messagebox.showinfo("Done","Cuts applied")
 
     # --- Image Methods ---
@@ -296,10 +273,7 @@ class MediaEditorToolkit(tk.Tk):
         fld = filedialog.askdirectory()
         if not fld: return
         self.folder = fld
-        self.img_list.delete(0,tk.END)
-        for f in sorted(os.listdir(fld)):
-            if f.lower().endswith((".png",".jpg",".jpeg",".bmp")):
-                self.img_list.insert(tk.END, f)
+        self.img_catalog.set_folder(fld)
 
     def load_image(self):
         sel = self.img_list.curselection()
@@ -330,8 +304,9 @@ class MediaEditorToolkit(tk.Tk):
             img = cv2.transform(img,K)
         if self.inv.get():
             img = cv2.bitwise_not(img)
+        # brightness/contrast through a 256-entry table instead of a float copy of the image
         c,b = self.contrast.get(), self.bright.get()
-        img = np.clip(img*c + (b-1)*128,0,255).astype(np.uint8)
+        img = cv2.LUT(img, np.clip(tone.RAMP*c + (b-1)*128,0,255).astype(np.uint8))
         pil = Image.fromarray(cv2.cvtColor(img,cv2.COLOR_BGR2RGB))
         if self.zoom_level!=1.0:
             w,h = pil.size
@@ -362,11 +337,7 @@ class MediaEditorToolkit(tk.Tk):
 
     def add_to_history(self):
         if self.proc is None: return
-        self.history = self.history[:self.history_index+1]
-        self.history.append(self.proc.copy())
-        self.history_index = len(self.history)-1
-        if len(self.history)>20:
-            self.history.pop(0); self.history_index-=1
+        self.history_index = history.push(self.history, self.history_index, self.proc.copy())
 
     def undo(self):
         if self.history_index>0:
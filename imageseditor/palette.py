@@ -0,0 +1,104 @@
+import hashlib
+from functools import lru_cache
+import cv2
+import numpy as np
+import lru
+
+# Colour quantisation for the cartoon look. The palette comes from
+# mini-batch k-means on a random pixel subsample and is cached per image (or
+# per video, so every frame shares one palette). Mapping the full image goes
+# through a 32x32x32 lookup table, so a render costs one table read per pixel.
+
+LUT_BITS = 5            # Bits per channel indexing the lookup table
+SAMPLE = 20000          # Pixels drawn from the image for k-means
+BATCH = 1024            # Mini-batch size
+ITERATIONS = 100        # Mini-batch steps
+CACHE_SIZE = 32         # Palettes kept by the module cache
+
+
+def fingerprint(img):
+    # Cheap identity for an image: shape plus a strided pixel sample
+    h, w = img.shape[:2]
+    sample = img[::max(1, h // 64), ::max(1, w // 64)]
+    digest = hashlib.blake2b(sample.tobytes(), digest_size=16)
+    digest.update(repr(img.shape).encode())
+    return digest.hexdigest()
+
+
+def _init_centers(x, k, rng):
+    # k-means++ seeding
+    centers = [x[rng.integers(len(x))]]
+    d2 = ((x - centers[0]) ** 2).sum(1)
+    for _ in range(1, k):
+        total = d2.sum()
+        i = rng.choice(len(x), p=d2 / total) if total > 0 else rng.integers(len(x))
+        centers.append(x[i])
+        d2 = np.minimum(d2, ((x - x[i]) ** 2).sum(1))
+    return np.array(centers, np.float32)
+
+
+def _assign(x, centers):
+    d2 = (x * x).sum(1)[:, None] - 2 * x @ centers.T + (centers * centers).sum(1)[None]
+    return d2.argmin(1)
+
+
+def kmeans_palette(img, k, sample=SAMPLE, batch=BATCH, iterations=ITERATIONS, seed=0):
+    # (k, 3) uint8 palette in the image's channel order, darkest first
+    rng = np.random.default_rng(seed)
+    px = img.reshape(-1, img.shape[-1])[:, :3]
+    x = px[rng.integers(0, len(px), min(sample, len(px)))].astype(np.float32)
+    k = max(1, min(k, len(np.unique(x, axis=0))))
+    centers = _init_centers(x, k, rng)
+    counts = np.zeros(k, np.float32)
+    for _ in range(iterations):
+        b = x[rng.integers(0, len(x), batch)]
+        labels = _assign(b, centers)
+        n = np.bincount(labels, minlength=k).astype(np.float32)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, b)
+        counts += n
+        # Per-centre learning rate n/count, as in Sculley's mini-batch update
+        hit = n > 0
+        centers[hit] += (sums[hit] - n[hit, None] * centers[hit]) / counts[hit, None]
+    # One full Lloyd step over the sample settles the centres
+    labels = _assign(x, centers)
+    for j in range(k):
+        members = x[labels == j]
+        if len(members):
+            centers[j] = members.mean(0)
+    pal = np.clip(np.rint(centers), 0, 255).astype(np.uint8)
+    return pal[np.argsort(pal.astype(np.int32).sum(1), kind='stable')]
+
+
+# Palettes keyed by (key, k)
+_cache = lru.LRU(CACHE_SIZE)
+
+
+def palette_for(img, k, key=None):
+    # key defaults to the image fingerprint; pass a file path to share a
+    # palette across video frames
+    return _cache.get((key or fingerprint(img), k), lambda: kmeans_palette(img, k))
+
+
+@lru_cache(maxsize=16)
+def _lut(palette):
+    # Nearest palette colour for the centre of every LUT cell, flattened so a
+    # pixel's cell index is (c0 << 2*LUT_BITS) | (c1 << LUT_BITS) | c2
+    n = 1 << LUT_BITS
+    step = 256 // n
+    levels = np.arange(n, dtype=np.float32) * step + step / 2
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), -1).reshape(-1, 3)
+    pal = np.array(palette, np.float32)
+    # Entries are packed as 4-byte words so the lookup is a single gather
+    packed = np.zeros((len(grid), 4), np.uint8)
+    packed[:, :3] = np.array(palette, np.uint8)[_assign(grid, pal)]
+    return packed.view(np.uint32).ravel()
+
+
+def quantize(img, palette):
+    # Map every pixel to its palette colour through the lookup table
+    lut = _lut(tuple(tuple(int(v) for v in c) for c in palette))
+    q = np.right_shift(img, 8 - LUT_BITS).astype(np.uint16)
+    idx = (q[..., 0] << (2 * LUT_BITS)) | (q[..., 1] << LUT_BITS) | q[..., 2]
+    h, w = idx.shape
+    return cv2.cvtColor(lut[idx].view(np.uint8).reshape(h, w, 4), cv2.COLOR_BGRA2BGR)
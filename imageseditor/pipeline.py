@@ -0,0 +1,244 @@
+import cv2
+import numpy as np
+import convolution
+import depth
+import edge_preserving
+import edges
+import lru
+import palette
+import tone
+
+# Filter pipeline shared by the editor and the tiled large-image path.
+# params uses the phase3 variable names:
+#   gray, sepia, inv, emboss (bool), blur, sharpen, brightness, contrast,
+#   cartoon_bs, cartoon_c, cartoon_quality, quant_colors, unsharp_amount,
+#   unsharp_radius (float), cartoon_engine (str),
+#   cartoon_block (int, the scaled block size set by scale_params for proxies),
+#   quant_palette (list of [b, g, r], filled in by the editor from the source image),
+#   kernel (optional list of rows, a user convolution kernel),
+#   auto_levels, auto_contrast (bool), gamma (float), tone_curve (list of [x, y]),
+#   tone_levels (per-channel [black, white]; measured on the tone stage input
+#     when missing, see render_levels)
+# Images may be uint8 or uint16 (see depth.py); values above are in 8-bit units.
+
+SEPIA_KERNEL = np.array([[0.272, 0.534, 0.131], [0.349, 0.686, 0.168], [0.393, 0.769, 0.189]])
+EMBOSS_KERNEL = convolution.EMBOSS_KERNEL
+
+# Cartoon is skipped while both sliders sit at these defaults
+CARTOON_DEFAULTS = (7, 9)
+
+# Smoothed cartoon layers by (frame, engine, d, sigmas, quality); they do not
+# depend on C, so scrubbing "Cartoon C" skips the expensive filter
+_smoothed = lru.LRU(2)
+
+
+def cartoon_block(bs):
+    # Ensure odd blockSize >= 3
+    bs = int(bs)
+    return bs if bs % 2 == 1 and bs > 1 else bs + 1 if (bs + 1) % 2 == 1 else 3
+
+
+def cartoon_active(params):
+    return (int(params['cartoon_bs']), int(params['cartoon_c'])) != CARTOON_DEFAULTS
+
+
+# --- Stages ---
+def stage_color(img, params):
+    # grayscale / sepia / invert
+    if params['gray']:
+        g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        img = cv2.cvtColor(g, cv2.COLOR_GRAY2BGR)
+    if params['sepia']:
+        img = cv2.transform(img, SEPIA_KERNEL)
+    if params['inv']:
+        img = cv2.bitwise_not(img)
+    return img
+
+
+def stage_blur(img, params):
+    b = params['blur']
+    if b > 0:
+        img = cv2.GaussianBlur(img, (0, 0), b)
+    return img
+
+
+def stage_sharpen(img, params):
+    s = params['sharpen']
+    if s > 0:
+        img = convolution.convolve(img, convolution.sharpen_kernel(float(s)))
+    return img
+
+
+def stage_unsharp(img, params):
+    amount = params.get('unsharp_amount', 0)
+    if amount > 0:
+        img = convolution.unsharp_mask(img, amount, params.get('unsharp_radius', 3))
+    return img
+
+
+def stage_kernel(img, params):
+    # User kernel from the Custom Kernel dialog
+    k = params.get('kernel')
+    if k:
+        img = convolution.convolve(img, user_kernel(k))
+    return img
+
+
+def user_kernel(rows):
+    return np.array(rows, np.float32)
+
+
+def clear_caches():
+    _smoothed.clear()
+    edges.clear_cache()
+    tone.clear_cache()
+
+
+def smoothed(img, key, engine, d, sigma_color, sigma_space, quality):
+    return _smoothed.get((key, engine, d, sigma_color, sigma_space, quality),
+                         lambda: edge_preserving.smooth(img, engine, d, sigma_color, sigma_space, quality))
+
+
+def stage_cartoon(img, params):
+    if cartoon_active(params):
+        # Adaptive threshold and the smoothing engines are 8-bit only
+        img = depth.via_u8(_cartoon, img, params)
+    return img
+
+
+def _cartoon(img, params):
+    block = params.get('cartoon_block') or cartoon_block(params['cartoon_bs'])
+    key = edges.frame_key(img)
+    mask = edges.edge_mask(img, block, int(params['cartoon_c']), key)
+    color = smoothed(img, key, cartoon_engine(params), block, 200, 200,
+                     params.get('cartoon_quality', edge_preserving.DEFAULT_QUALITY))
+    return cv2.bitwise_and(color, color, mask=mask)
+
+
+def cartoon_engine(params):
+    # Recipes saved before engines existed use the bilateral reference
+    return params.get('cartoon_engine', edge_preserving.DEFAULT_ENGINE)
+
+
+def cartoonify(img, block, c, ksize, sigma_color, sigma_space,
+               engine=edge_preserving.DEFAULT_ENGINE, quality=edge_preserving.DEFAULT_QUALITY):
+    # phase2's cartoon: separate bilateral diameter and sigmas
+    key = edges.frame_key(img)
+    mask = edges.edge_mask(img, block | 1, c, key)
+    color = smoothed(img, key, engine, ksize | 1, sigma_color, sigma_space, quality)
+    return cv2.bitwise_and(color, color, mask=mask)
+
+
+def stage_quantize(img, params):
+    # Flatten colours to a k-colour palette. The editors pass the palette of
+    # the source image so it stays fixed while other sliders move; without
+    # one, the palette of the stage input is built (and cached) here.
+    k = int(params.get('quant_colors', 0))
+    if k >= 2:
+        pal = params.get('quant_palette')
+        if pal is None:
+            pal = palette.palette_for(depth.to_u8(img), k)
+        img = depth.via_u8(palette.quantize, img, pal)
+    return img
+
+
+def stage_emboss(img, params):
+    if params['emboss']:
+        img = convolution.convolve(img, EMBOSS_KERNEL)
+    return img
+
+
+def stage_tone(img, params):
+    # levels / curve / gamma / brightness / contrast as one lookup table
+    return tone.apply(img, tone_lut(img, params))
+
+
+def tone_levels(img, params):
+    # Auto levels / auto contrast of the tone stage input (histogram cached
+    # per image); None when neither is on
+    if params.get('auto_levels'):
+        return tone.auto_levels(img)
+    if params.get('auto_contrast'):
+        return tone.auto_contrast(img)
+    return None
+
+
+def tone_lut(img, params):
+    # Tiled renders pass the levels measured on the whole proxy in
+    # tone_levels, so every tile is stretched alike
+    levels = params.get('tone_levels')
+    if levels is None:
+        levels = tone_levels(img, params)
+    return tone.build_lut(levels, params.get('tone_curve'), params.get('gamma', 1.0),
+                          params['contrast'], int((params['brightness'] - 1) * 255),
+                          8 if img.dtype == np.uint8 else 16)
+
+
+STAGES = [
+    ("color", stage_color),
+    ("blur", stage_blur),
+    ("sharpen", stage_sharpen),
+    ("unsharp", stage_unsharp),
+    ("kernel", stage_kernel),
+    ("cartoon", stage_cartoon),
+    ("quantize", stage_quantize),
+    ("emboss", stage_emboss),
+    ("tone", stage_tone),
+]
+
+
+def render_levels(img, params, profiler=None):
+    # (render, levels): also returns the tone levels used, measured on the
+    # tone stage input unless params has tone_levels. The editors store them
+    # in the recipe for the full-resolution tiled render.
+    src = img
+    levels = params.get('tone_levels')
+    for name, stage in STAGES:
+        if name == 'tone' and levels is None:
+            levels = tone_levels(img, params)
+            params = dict(params, tone_levels=levels)
+        if profiler is not None:
+            img = profiler.run(name, stage, img, params)
+        else:
+            img = stage(img, params)
+    return (img.copy() if img is src else img), levels
+
+
+def render(img, params, profiler=None):
+    # Stages never modify their input. The result is always a new array,
+    # since the editors draw annotations on it in place.
+    return render_levels(img, params, profiler)[0]
+
+
+def halo(params):
+    # Pixels of context a tile needs so its interior matches a full render
+    r = 0
+    if params['blur'] > 0:
+        r += int(params['blur'] * 3 + 1)
+    if params['sharpen'] > 0:
+        r += 1
+    if params.get('unsharp_amount', 0) > 0:
+        r += convolution.radius(convolution.gaussian_kernel(float(params.get('unsharp_radius', 3))))
+    if params.get('kernel'):
+        r += convolution.radius(user_kernel(params['kernel']))
+    if cartoon_active(params):
+        r += edge_preserving.radius(cartoon_engine(params), cartoon_block(params['cartoon_bs']))
+    if params['emboss']:
+        r += 1
+    return r
+
+
+def scale_params(params, scale):
+    # Adapt spatial parameters when rendering a downscaled proxy: the blur
+    # and unsharp sigmas and the cartoon block (threshold window and
+    # smoothing diameter, passed as cartoon_block so cartoon_bs still
+    # decides whether the stage runs). Not scaled: sharpen, emboss and the
+    # custom kernel are fixed 3x3 / user-sized kernels with no smaller
+    # equivalent, so on the proxy they act on a proportionally wider area.
+    if scale == 1.0:
+        return params
+    scaled = dict(params, blur=params['blur'] * scale)
+    scaled['unsharp_radius'] = params.get('unsharp_radius', 3) * scale
+    if cartoon_active(params):
+        scaled['cartoon_block'] = cartoon_block(max(3, round(cartoon_block(params['cartoon_bs']) * scale)))
+    return scaled
@@ -0,0 +1,72 @@
+import csv
+import time
+from collections import deque
+import numpy as np
+
+CSV_FIELDS = ('time', 'frame', 'stage', 'ms', 'bytes')
+
+
+def output_bytes(out, args=()):
+    # Size of the buffer a stage handed back. Results that are one of the
+    # inputs (no-op stages, in-place drawing) allocated nothing new.
+    if any(out is a for a in args):
+        return 0
+    if isinstance(out, np.ndarray):
+        return out.nbytes
+    if hasattr(out, 'getbands'):
+        # PIL image
+        return out.size[0] * out.size[1] * len(out.getbands())
+    if callable(getattr(out, 'width', None)):
+        # Tk PhotoImage keeps 32-bit pixels
+        return out.width() * out.height() * 4
+    return 0
+
+
+class StageProfiler:
+    # Records wall time and output size of named stages. While disabled, run()
+    # just calls through, so the editors can leave the hooks in place.
+    def __init__(self, maxlen=5000):
+        self.enabled = False
+        self.log = deque(maxlen=maxlen)   # Rolling (time, frame, stage, ms, bytes)
+        self.frame = 0
+        self.last = {}                    # stage -> (ms, bytes) for the latest frame
+
+    def begin(self):
+        # Start a new frame (one slider move, transform, ...)
+        self.frame += 1
+        self.last = {}
+
+    def record(self, stage, ms, nbytes=0):
+        self.last[stage] = (ms, nbytes)
+        self.log.append((time.time(), self.frame, stage, ms, nbytes))
+
+    def run(self, stage, fn, *args, **kwargs):
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        self.record(stage, (time.perf_counter() - t0) * 1000, output_bytes(out, args))
+        return out
+
+    def summary(self):
+        # One line per stage of the latest frame plus the total
+        lines = []
+        total_ms = total_bytes = 0
+        for stage, (ms, nbytes) in self.last.items():
+            lines.append(f"{stage:<16}{ms:8.1f} ms{nbytes / 2**20:8.1f} MB")
+            total_ms += ms
+            total_bytes += nbytes
+        lines.append(f"{'total':<16}{total_ms:8.1f} ms{total_bytes / 2**20:8.1f} MB")
+        return "\n".join(lines)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for t, frame, stage, ms, nbytes in self.log:
+                writer.writerow((f"{t:.3f}", frame, stage, f"{ms:.3f}", nbytes))
+        return len(self.log)
+
+    def clear(self):
+        self.log.clear()
+        self.last = {}
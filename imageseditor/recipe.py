@@ -0,0 +1,193 @@
+import json
+import cv2
+import numpy as np
+import watermark
+import depth
+import transform_stack
+import resample
+import warp
+from save_queue import replace_atomic
+
+# Sidecar recipes live next to the original: photo.jpg -> photo.jpg.edit.json
+SIDECAR_SUFFIX = '.edit.json'
+RECIPE_VERSION = 1
+
+
+def sidecar_path(image_path):
+    return image_path + SIDECAR_SUFFIX
+
+
+# --- Geometric commits ---
+# A commit is a small dict applied to the decoded original, in order:
+#   {'op': 'rotate', 'code': cv2.ROTATE_*}    {'op': 'flip', 'axis': 'h'|'v'}
+#   {'op': 'crop', 'box': [x0, y0, x1, y1]}   {'op': 'canvas', 'size': [w, h]}
+#   {'op': 'resize', 'size': [w, h], 'method': resample.METHODS, 'linear': bool}
+#   {'op': 'straighten', ...}  {'op': 'perspective', ...}   see warp.py
+
+def canvas_pad(img, new_w, new_h):
+    # Center img on a black canvas; a smaller canvas crops around the center
+    ih, iw = img.shape[:2]
+    canvas = np.zeros((new_h, new_w) + img.shape[2:], dtype=img.dtype)
+    ox, oy = (new_w - iw) // 2, (new_h - ih) // 2
+    sx, sy = max(0, -ox), max(0, -oy)
+    dx, dy = max(0, ox), max(0, oy)
+    w, h = min(iw - sx, new_w - dx), min(ih - sy, new_h - dy)
+    canvas[dy:dy + h, dx:dx + w] = img[sy:sy + h, sx:sx + w]
+    return canvas
+
+
+def apply_commit(img, c):
+    op = c['op']
+    if op == 'rotate':
+        return cv2.rotate(img, c['code'])
+    if op == 'flip':
+        return cv2.flip(img, 1 if c['axis'] == 'h' else 0)
+    if op == 'crop':
+        x0, y0, x1, y1 = c['box']
+        return img[y0:y1, x0:x1]
+    if op == 'canvas':
+        return canvas_pad(img, *c['size'])
+    if op == 'resize':
+        return resample.resize(img, c['size'], c.get('method', resample.DEFAULT_METHOD), c.get('linear', False))
+    if op in ('straighten', 'perspective'):
+        return warp.apply(img, c)
+    raise ValueError(f"Unknown commit: {op}")
+
+
+def apply_commit_alpha(alpha, c):
+    # Same commit for an alpha plane. Alpha is coverage, not sRGB, so it is
+    # never resampled in linear light; padding and warp borders come out
+    # transparent.
+    if c['op'] == 'resize' and c.get('linear'):
+        c = dict(c, linear=False)
+    return apply_commit(alpha, c)
+
+
+def map_point(pt, c, shape):
+    # Where a pixel at pt (x, y) in an image of shape ends up after commit c
+    x, y = pt
+    h, w = shape[:2]
+    op = c['op']
+    if op == 'rotate':
+        if c['code'] == cv2.ROTATE_90_CLOCKWISE:
+            return h - 1 - y, x
+        if c['code'] == cv2.ROTATE_90_COUNTERCLOCKWISE:
+            return y, w - 1 - x
+        return w - 1 - x, h - 1 - y
+    if op == 'flip':
+        return (w - 1 - x, y) if c['axis'] == 'h' else (x, h - 1 - y)
+    if op == 'crop':
+        return x - c['box'][0], y - c['box'][1]
+    if op == 'canvas':
+        return x + (c['size'][0] - w) // 2, y + (c['size'][1] - h) // 2
+    if op == 'resize':
+        return int(x * c['size'][0] / w), int(y * c['size'][1] / h)
+    if op in ('straighten', 'perspective'):
+        px, py = warp.map_point(warp.matrix(c, shape)[0], (x, y))
+        return int(round(px)), int(round(py))
+    return x, y
+
+
+# --- Annotations (drawn after the filter pipeline) ---
+#   {'type': 'stroke', 'points': [[x, y], ...], 'color': [b, g, r], 'size': n}
+#   {'type': 'text', 'text': s, 'org': [x, y], 'scale': f, 'color': [b, g, r]}
+#   {'type': 'watermark', 'text': s, 'logo': path|None, 'size': n, 'color': [b, g, r],
+#    'opacity': f, 'pos': preset, 'tiled': bool}
+
+def draw_annotation(img, a, scale=1.0):
+    # Coordinates are stored at full resolution; scale < 1 draws on a proxy
+    kind = a['type']
+    if kind == 'stroke':
+        pts = [(int(x * scale), int(y * scale)) for x, y in a['points']]
+        col = depth.scale_color(a['color'], img.dtype)
+        size = max(1, round(a['size'] * scale))
+        for p0, p1 in zip(pts, pts[1:] or pts):
+            cv2.line(img, p0, p1, col, size)
+    elif kind == 'text':
+        org = (int(a['org'][0] * scale), int(a['org'][1] * scale))
+        cv2.putText(img, a['text'], org, cv2.FONT_HERSHEY_SIMPLEX,
+                    a['scale'] * scale, depth.scale_color(a['color'], img.dtype), max(1, round(2 * scale)))
+    elif kind == 'watermark':
+        if a.get('logo'):
+            # Logo width follows the font size slider (10..100 -> 5%..50% of the image)
+            watermark.apply_logo(img, a['logo'], a['opacity'], width=img.shape[1] * a['size'] // 200,
+                                 pos=a['pos'], tiled=a['tiled'])
+        else:
+            watermark.apply_text(img, a['text'], max(1, round(a['size'] * scale)), a['color'],
+                                 a['opacity'], pos=a['pos'], tiled=a['tiled'])
+    return img
+
+
+class Recipe:
+    # Non-destructive edit state: pipeline parameters, geometric commits and
+    # annotations. Entries are never mutated after being appended, so a
+    # snapshot only has to copy the containers.
+    def __init__(self, params=None, commits=None, annotations=None):
+        self.params = dict(params or {})
+        self.commits = list(commits or [])
+        self.annotations = list(annotations or [])
+
+    def snapshot(self):
+        return Recipe(self.params, self.commits, self.annotations)
+
+    def commit(self, c, shape):
+        # Record a geometric commit and move existing annotations with it
+        self.commits.append(c)
+        moved = []
+        for a in self.annotations:
+            if a['type'] == 'stroke':
+                a = dict(a, points=[list(map_point(p, c, shape)) for p in a['points']])
+            elif a['type'] == 'text':
+                a = dict(a, org=list(map_point(a['org'], c, shape)))
+            moved.append(a)
+        self.annotations = moved
+
+    def annotate(self, a):
+        self.annotations.append(a)
+
+    def replay(self, img):
+        # Runs of rotate/flip/crop are composed and cost one pass
+        base, stack = transform_stack.replay(img, self.commits, apply_commit)
+        return stack.apply(base)
+
+    def draw(self, img, scale=1.0):
+        for a in self.annotations:
+            draw_annotation(img, a, scale)
+        return img
+
+    def draw_alpha(self, alpha, scale=1.0):
+        # Strokes and text are opaque wherever they are drawn; watermarks
+        # only tint pixels that are already visible
+        white = (255, 255, 255)
+        for a in self.annotations:
+            if a['type'] in ('stroke', 'text'):
+                draw_annotation(alpha, dict(a, color=white), scale)
+        return alpha
+
+    def to_dict(self):
+        return {
+            'version': RECIPE_VERSION,
+            'params': self.params,
+            'commits': self.commits,
+            'annotations': self.annotations,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get('version', RECIPE_VERSION) > RECIPE_VERSION:
+            raise ValueError("Recipe was written by a newer version")
+        return cls(d.get('params'), d.get('commits'), d.get('annotations'))
+
+    def save(self, image_path):
+        path = sidecar_path(image_path)
+        replace_atomic(path, json.dumps(self.to_dict(), indent=1).encode('utf-8'))
+        return path
+
+    @classmethod
+    def load(cls, image_path):
+        # Returns None when the image has no sidecar
+        try:
+            with open(sidecar_path(image_path), 'r') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
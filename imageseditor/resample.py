@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+
+# Image scaling. Methods:
+#   area      cv2.INTER_AREA: exact pixel-area average when reducing
+#   cubic     bicubic; reductions first halve with area averaging
+#   lanczos   Lanczos-4; reductions first halve with area averaging
+#   box       fast 2x box halvings plus one bilinear step; lowest quality
+# Cubic and Lanczos only look at a 4x4 / 8x8 neighbourhood, so a direct large
+# reduction aliases. Large reductions first halve with area averaging, but
+# stop while the image is still at least twice the target: the final step
+# (2x to 4x) always runs the chosen kernel, including at exact 2^n ratios.
+#
+# linear=True resamples in linear light instead of on sRGB codes, so fine
+# light/dark detail averages to the right brightness. Pixels go through a
+# 16-bit linear table and back; no float image is allocated.
+
+METHODS = ("area", "cubic", "lanczos", "box")
+DEFAULT_METHOD = "area"
+
+_INTERP = {
+    "area": cv2.INTER_AREA,
+    "cubic": cv2.INTER_CUBIC,
+    "lanczos": cv2.INTER_LANCZOS4,
+    "box": cv2.INTER_LINEAR,
+}
+
+
+def _srgb_to_linear(v):
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(v):
+    return np.where(v <= 0.0031308, v * 12.92, 1.055 * v ** (1 / 2.4) - 0.055)
+
+
+# sRGB code -> 16-bit linear, and 16-bit linear -> sRGB code
+TO_LINEAR = np.round(_srgb_to_linear(np.arange(256) / 255.0) * 65535).astype(np.uint16)
+FROM_LINEAR = np.round(_linear_to_srgb(np.arange(65536) / 65535.0) * 255).astype(np.uint8)
+
+
+def to_linear(img):
+    # cv2.LUT takes a 16-bit table for 8-bit input and is ~4x faster than indexing
+    return cv2.LUT(img, TO_LINEAR)
+
+
+def from_linear(img):
+    return FROM_LINEAR[img]
+
+
+def target_size(shape, width=None, height=None, scale=None):
+    # (w, h) keeping the aspect ratio when only one of width/height is given
+    h, w = shape[:2]
+    if scale:
+        return max(1, round(w * scale)), max(1, round(h * scale))
+    if width and height:
+        return int(width), int(height)
+    if width:
+        return int(width), max(1, round(h * width / w))
+    if height:
+        return max(1, round(w * height / h)), int(height)
+    return w, h
+
+
+def fit_size(shape, max_side):
+    # (w, h) with the longer side at most max_side; never enlarges
+    h, w = shape[:2]
+    s = min(1.0, max_side / max(h, w))
+    return max(1, round(w * s)), max(1, round(h * s))
+
+
+def halve(img):
+    # Exact 2x2 area average to ((w + 1) // 2, (h + 1) // 2). A trailing odd
+    # row or column is repeated rather than dropped, so edge pixels survive;
+    # the streamed TiledImage.halve pads the same way and gives the same pixels.
+    h, w = img.shape[:2]
+    if h % 2 or w % 2:
+        img = cv2.copyMakeBorder(img, 0, h % 2, 0, w % 2, cv2.BORDER_REPLICATE)
+    return cv2.resize(img, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA)
+
+
+def halvings(shape, size):
+    # Number of 2x halvings before the final step: keep halving while the
+    # halved image is still at least twice the target on both sides
+    h, w = shape[:2]
+    tw, th = size
+    n = 0
+    while (w + 1) // 2 >= 2 * tw and (h + 1) // 2 >= 2 * th:
+        w, h, n = (w + 1) // 2, (h + 1) // 2, n + 1
+    return n
+
+
+def _resize(img, size, method):
+    tw, th = size
+    if method != "area":
+        for _ in range(halvings(img.shape, size)):
+            img = halve(img)
+    if (img.shape[1], img.shape[0]) == (tw, th):
+        return img
+    return cv2.resize(img, (tw, th), interpolation=_INTERP[method])
+
+
+def resize(img, size, method=DEFAULT_METHOD, linear=False):
+    if method not in _INTERP:
+        raise ValueError(f"Unknown resample method: {method}")
+    size = (max(1, int(size[0])), max(1, int(size[1])))
+    if (img.shape[1], img.shape[0]) == size:
+        return img
+    if linear and img.dtype == np.uint8:
+        return from_linear(_resize(to_linear(img), size, method))
+    return _resize(img, size, method)
+
+
+def parse_size(text):
+    # "1920x1080" -> (1920, 1080); "1600" -> longest side; "50%" -> scale
+    text = text.strip().lower()
+    if text.endswith('%'):
+        return {'scale': float(text[:-1]) / 100}
+    if 'x' in text:
+        w, h = text.split('x', 1)
+        return {'width': int(w) if w else None, 'height': int(h) if h else None}
+    return {'max_side': int(text)}
+
+
+def size_for(shape, spec):
+    # Target (w, h) for a parse_size() spec
+    if 'max_side' in spec:
+        return fit_size(shape, spec['max_side'])
+    return target_size(shape, spec.get('width'), spec.get('height'), spec.get('scale'))
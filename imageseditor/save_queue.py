@@ -0,0 +1,146 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+import cv2
+import depth
+from loader import ALPHA_EXTS
+
+# Encoder defaults; the editors keep user overrides under settings['encoder']
+DEFAULT_ENCODER_OPTIONS = {
+    'jpeg_quality': 95,
+    'jpeg_progressive': False,
+    'png_compression': 3,
+    'webp_quality': 90,
+}
+
+
+def encoder_params(ext, options=None):
+    # Translate encoder options into cv2.imwrite/imencode flags for ext
+    opts = dict(DEFAULT_ENCODER_OPTIONS, **(options or {}))
+    ext = ext.lower()
+    if ext in ('.jpg', '.jpeg'):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(opts['jpeg_quality']),
+                cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(opts['jpeg_progressive']))]
+    if ext == '.png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(opts['png_compression'])]
+    if ext == '.webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, int(opts['webp_quality'])]
+    return []
+
+
+def _read_umask():
+    # os.umask can only be read by setting it; done once at import, since
+    # changing it while save threads create files would race
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _read_umask()
+
+
+def _file_mode(path):
+    # Mode the target gets: the existing file's, else what open() would give
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def replace_atomic(path, data):
+    # Write to a temp file in the target folder and rename, so a crash or a
+    # concurrent reader never sees a half-written file.
+    suffix = os.path.splitext(path)[1] + '.tmp'
+    fd, tmp = tempfile.mkstemp(prefix='.', suffix=suffix, dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file owner-only (0600)
+        os.chmod(tmp, _file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def merge_alpha(img, alpha, ext):
+    # BGRA for formats that store transparency, built once at save time;
+    # other formats get the colour image unchanged
+    if alpha is None or ext.lower() not in ALPHA_EXTS:
+        return img
+    out = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    out[..., 3] = alpha
+    return out
+
+
+def write_atomic(path, img, options=None):
+    # Encode in memory, then replace the target in one rename
+    ext = os.path.splitext(path)[1] or '.png'
+    ok, buf = cv2.imencode(ext, depth.for_format(img, ext), encoder_params(ext, options))
+    if not ok:
+        raise ValueError(f"Cannot encode image as {ext}")
+    replace_atomic(path, buf.tobytes())
+    return len(buf)
+
+
+class SaveQueue:
+    # Encodes and writes images on a background thread. Results are handed
+    # back to the Tk thread by polling with widget.after, never from the worker.
+    def __init__(self, widget, on_done, poll_ms=100):
+        self.widget = widget
+        self.on_done = on_done      # on_done(path, seconds, nbytes, error)
+        self.poll_ms = poll_ms
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = 0
+        self._poll_id = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, path, img, options=None):
+        # img must not be modified in place until the job completes, so
+        # callers pass a snapshot of live buffers (pen and text draw into
+        # them). img may also be a callable that renders the image on the worker.
+        self.pending += 1
+        self.jobs.put((path, img, dict(options or {})))
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            path, img, options = job
+            t0 = time.perf_counter()
+            try:
+                if callable(img):
+                    img = img()
+                nbytes, error = write_atomic(path, img, options), None
+            except Exception as e:
+                nbytes, error = 0, e
+            self.results.put((path, time.perf_counter() - t0, nbytes, error))
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                path, secs, nbytes, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            self.on_done(path, secs, nbytes, error)
+        if self.pending:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def close(self):
+        # Finish outstanding writes before the window goes away
+        self.jobs.put(None)
+        self._thread.join()
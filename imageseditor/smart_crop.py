@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+import depth
+import lru
+import palette
+
+# Content-aware crop to an aspect ratio. A saliency map is computed once on a
+# small copy of the image: edge energy (Sobel magnitude) plus colour
+# distinctness (distance of each blurred Lab pixel from the image's mean
+# colour). Its integral image gives the total saliency of any window in four
+# lookups, so every window position is scored at once with array slicing and
+# one map serves any number of aspect ratios.
+#
+#   sal = smart_crop.analyze(img)
+#   box = sal.box("16:9")          # [x0, y0, x1, y1] in img pixels
+
+ANALYSIS_SIDE = 256     # Longest side of the copy saliency is computed on
+EDGE_WEIGHT = 0.5       # Share of edge energy vs colour distinctness
+CENTER_BIAS = 0.1       # Score penalty at the far edge, so flat images crop centrally
+CACHE_SIZE = 4          # Saliency maps kept
+
+ASPECTS = ("1:1", "4:3", "3:2", "16:9", "4:5", "9:16")
+
+_maps = lru.LRU(CACHE_SIZE)
+
+
+def parse_aspect(text):
+    # "16:9" / "16x9" -> 1.777...; "1.5" -> 1.5 (width over height)
+    text = str(text).strip().lower().replace('x', ':')
+    if ':' in text:
+        w, h = text.split(':', 1)
+        aspect = float(w) / float(h) if float(h) else 0
+    else:
+        aspect = float(text)
+    if aspect <= 0:
+        raise ValueError(f"Invalid aspect ratio: {text}")
+    return aspect
+
+
+def saliency(img):
+    # Float32 map of a copy of img with its longest side at most ANALYSIS_SIDE
+    # A strided subsample (still 4x the analysis size) keeps the area
+    # reduction from reading every pixel of large images
+    step = max(1, max(img.shape[:2]) // (ANALYSIS_SIDE * 4))
+    img = img[::step, ::step]
+    h, w = img.shape[:2]
+    s = min(1.0, ANALYSIS_SIDE / max(h, w))
+    small = cv2.resize(img, (max(1, round(w * s)), max(1, round(h * s))), interpolation=cv2.INTER_AREA)
+    small = depth.to_u8(small)
+    if small.ndim == 2:
+        small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    energy = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+    lab = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2LAB).astype(np.float32), (5, 5), 0)
+    distinct = np.linalg.norm(lab - lab.reshape(-1, 3).mean(0), axis=2)
+    sal = EDGE_WEIGHT * energy / max(float(energy.max()), 1e-6) \
+        + (1 - EDGE_WEIGHT) * distinct / max(float(distinct.max()), 1e-6)
+    return sal.astype(np.float32)
+
+
+def window_size(shape, aspect, zoom=1.0):
+    # (w, h) of the largest window with the aspect ratio that fits in shape,
+    # times zoom; never larger than shape
+    aspect = parse_aspect(aspect) if isinstance(aspect, str) else float(aspect)
+    h, w = shape[:2]
+    cw = min(w, h * aspect) * min(zoom, 1.0)
+    return max(1, min(w, int(round(cw)))), max(1, min(h, int(round(cw / aspect))))
+
+
+class SaliencyMap:
+    # Integral image of a saliency map plus the shape of the image it describes
+    def __init__(self, sal, shape):
+        self.shape = tuple(shape[:2])
+        self.size = sal.shape[:2]
+        self.integral = cv2.integral(sal, sdepth=cv2.CV_64F)
+
+    def window_sums(self, ww, wh):
+        # Saliency of every ww x wh window, indexed by top-left corner
+        s = self.integral
+        return s[wh:, ww:] - s[:-wh, ww:] - s[wh:, :-ww] + s[:-wh, :-ww]
+
+    def box(self, aspect, zoom=1.0, shape=None):
+        # [x0, y0, x1, y1] of the most salient window with the given aspect
+        # ratio, in pixels of shape (default: the analysed image). zoom < 1
+        # shrinks the window below the largest one that fits.
+        h, w = shape[:2] if shape is not None else self.shape
+        cw, ch = window_size((h, w), aspect, zoom)
+        # Same window on the analysis grid
+        ah, aw = self.size
+        sx, sy = aw / w, ah / h
+        ww = min(aw, max(1, int(round(cw * sx))))
+        wh = min(ah, max(1, int(round(ch * sy))))
+        sums = self.window_sums(ww, wh)
+        if CENTER_BIAS:
+            ny, nx = sums.shape
+            dy = np.abs(np.linspace(-1, 1, ny)) if ny > 1 else np.zeros(1)
+            dx = np.abs(np.linspace(-1, 1, nx)) if nx > 1 else np.zeros(1)
+            d = np.maximum(dy[:, None], dx[None, :])
+            sums = sums - CENTER_BIAS * d * max(float(sums.max()), 1e-9)
+        ay, ax = np.unravel_index(int(np.argmax(sums)), sums.shape)
+        # Centre of the chosen analysis window, mapped back and clamped
+        x0 = int(round((ax + ww / 2) / sx - cw / 2))
+        y0 = int(round((ay + wh / 2) / sy - ch / 2))
+        x0 = max(0, min(w - cw, x0))
+        y0 = max(0, min(h - ch, y0))
+        return [x0, y0, x0 + cw, y0 + ch]
+
+
+def analyze(img, key=None):
+    # Cached SaliencyMap; key defaults to the image fingerprint
+    return _maps.get(key or palette.fingerprint(img), lambda: SaliencyMap(saliency(img), img.shape))
+
+
+def clear_cache():
+    _maps.clear()
+
+
+def crop(img, aspect, zoom=1.0):
+    x0, y0, x1, y1 = analyze(img).box(aspect, zoom)
+    return img[y0:y1, x0:x1]
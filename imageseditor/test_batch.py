@@ -0,0 +1,45 @@
+import argparse
+import os
+import cv2
+import numpy as np
+import pytest
+import batch
+import smart_crop
+
+
+def _jpeg(tmp_path, w=1600, h=1200):
+    path = str(tmp_path / 'photo.jpg')
+    rng = np.random.default_rng(0)
+    cv2.imwrite(path, rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+    return path
+
+
+def _run(path, out, *args):
+    assert batch.main([path, '--out', out, *args]) == 0
+    return {f: cv2.imread(os.path.join(out, f)).shape[:2] for f in os.listdir(out)}
+
+
+def test_percentage_resize_with_reduced_decode(tmp_path):
+    path = _jpeg(tmp_path)
+    args = argparse.Namespace(resize='25%', full_decode=False, zoom=1.0)
+    assert batch.decode_reduction(path, [('', None)], args) > 1
+    reduced = _run(path, str(tmp_path / 'reduced'), '--resize', '25%')
+    full = _run(path, str(tmp_path / 'full'), '--resize', '25%', '--full-decode')
+    assert reduced == full == {'photo.jpg': (300, 400)}
+
+
+def test_percentage_resize_with_smart_crop(tmp_path):
+    path = _jpeg(tmp_path)
+    shapes = _run(path, str(tmp_path / 'out'), '--resize', '10%', '--smart-crop', '1:1,16:9')
+    assert shapes == {'photo_1x1.jpg': (120, 120), 'photo_16x9.jpg': (90, 160)}
+
+
+def test_zoom_outside_unit_interval_is_rejected(tmp_path):
+    path = _jpeg(tmp_path, 800, 600)
+    for zoom in ('1.5', '0'):
+        with pytest.raises(SystemExit):
+            batch.main([path, '--out', str(tmp_path / 'out'), '--smart-crop', '16:9', '--zoom', zoom])
+
+
+def test_window_size_stays_inside_the_image():
+    assert smart_crop.window_size((600, 800), '16:9', 1.5) == (800, 450)
@@ -0,0 +1,42 @@
+import numpy as np
+import pipeline
+
+# Every stage off except the ones a test switches on
+PARAMS = {
+    'gray': False, 'sepia': False, 'inv': False, 'emboss': False,
+    'blur': 0.0, 'sharpen': 0.0, 'brightness': 1.0, 'contrast': 1.0,
+    'cartoon_bs': 7, 'cartoon_c': 9, 'quant_colors': 0,
+    'auto_levels': False, 'auto_contrast': False,
+}
+
+
+def _ramp():
+    # Values 50..100 in every channel
+    row = np.linspace(50, 100, 256).astype(np.uint8)
+    return np.repeat(np.tile(row, (64, 1))[..., None], 3, axis=2)
+
+
+def test_auto_levels_after_invert():
+    params = dict(PARAMS, inv=True, auto_levels=True)
+    out, levels = pipeline.render_levels(_ramp(), params)
+    # Measured on the inverted values, 155..205, not on the source
+    assert all(150 <= black < white <= 205 for black, white in levels)
+    assert out.min() == 0 and out.max() == 255
+
+
+def test_stored_levels_reproduce_the_render():
+    # Tiles of a large image reuse the levels measured on the proxy
+    img = _ramp()
+    params = dict(PARAMS, inv=True, auto_contrast=True)
+    out, levels = pipeline.render_levels(img, params)
+    tile = pipeline.render(img[:, :64], dict(params, tone_levels=levels))
+    assert np.array_equal(tile, out[:, :64])
+
+
+def test_scale_params_scales_spatial_sizes():
+    params = dict(PARAMS, blur=6.0, unsharp_amount=1.0, unsharp_radius=9.0, cartoon_bs=21)
+    scaled = pipeline.scale_params(params, 1 / 3)
+    assert scaled['blur'] == 2.0 and scaled['unsharp_radius'] == 3.0
+    # The block shrinks to the default size, but the stage still runs
+    assert scaled['cartoon_block'] == 7 and pipeline.cartoon_active(scaled)
+    assert pipeline.scale_params(params, 1.0) is params
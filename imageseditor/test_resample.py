@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import pytest
+import resample
+from tiled_buffer import TiledImage
+
+
+def _edge_column(h=100, w=1001):
+    img = np.zeros((h, w, 3), np.uint8)
+    img[:, -1] = 255
+    return img
+
+
+@pytest.mark.parametrize('method', resample.METHODS)
+def test_odd_size_keeps_the_last_column(method):
+    out = resample.resize(_edge_column(), (500, 50), method)
+    assert out.shape == (50, 500, 3)
+    assert out[:, -1].max() > 0
+
+
+def test_halve_rounds_up_and_repeats_the_edge():
+    out = resample.halve(_edge_column(5, 7))
+    assert out.shape == (3, 4, 3)
+    assert (out[:, -1] == 255).all() and (out[:, :-1] == 0).all()
+
+
+def test_tiled_halve_matches_in_ram(tmp_path):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (2051, 1501, 3), dtype=np.uint8)
+    tiled = TiledImage.from_array(img, str(tmp_path)).halve()
+    assert np.array_equal(np.asarray(tiled.data), resample.halve(img))
+
+
+@pytest.mark.parametrize('scale', [2, 4, 8])
+@pytest.mark.parametrize('method', ['cubic', 'lanczos'])
+def test_exact_power_of_two_runs_the_chosen_kernel(method, scale):
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (256, 384, 3), dtype=np.uint8)
+    size = (384 // scale, 256 // scale)
+    area = resample.resize(img, size, 'area')
+    assert not np.array_equal(resample.resize(img, size, method), area)
+
+
+def test_half_size_is_one_direct_step():
+    rng = np.random.default_rng(2)
+    img = rng.integers(0, 256, (200, 300, 3), dtype=np.uint8)
+    direct = cv2.resize(img, (150, 100), interpolation=cv2.INTER_CUBIC)
+    assert np.array_equal(resample.resize(img, (150, 100), 'cubic'), direct)
@@ -0,0 +1,27 @@
+import os
+import stat
+import numpy as np
+from save_queue import replace_atomic, write_atomic
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file_gets_the_umask_mode(tmp_path):
+    path = str(tmp_path / 'out.png')
+    write_atomic(path, np.zeros((4, 4, 3), np.uint8))
+    umask = os.umask(0)
+    os.umask(umask)
+    assert _mode(path) == 0o666 & ~umask
+
+
+def test_replacing_keeps_the_existing_mode(tmp_path):
+    path = str(tmp_path / 'photo.jpg.edit.json')
+    with open(path, 'w') as f:
+        f.write('{}')
+    os.chmod(path, 0o640)
+    replace_atomic(path, b'{"params": {}}')
+    assert _mode(path) == 0o640
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"params": {}}'
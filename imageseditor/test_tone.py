@@ -0,0 +1,15 @@
+import numpy as np
+import tone
+import view
+
+
+def test_live_histogram_ignores_transparent_pixels():
+    img = np.full((100, 200, 3), 40, np.uint8)
+    alpha = np.zeros((100, 200), np.uint8)
+    alpha[:, :100] = 255
+    shown, rgb, a = view.render_layers(img, (100, 50), alpha)
+    hists, stats = tone.live_histogram(rgb, a)
+    assert stats['mean'] == 40 and stats['std'] == 0
+    assert hists[3].sum() == 50 * 50
+    # The checkerboard itself would count as grey pixels
+    assert tone.live_histogram(shown)[1]['mean'] > 40
@@ -0,0 +1,31 @@
+import numpy as np
+import warp
+
+COMMIT = {'op': 'straighten', 'angle': 3.5, 'crop': True}
+
+
+def _image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (700, 1100, 3), dtype=np.uint8)
+
+
+def test_uncached_warp_matches_cached():
+    img = _image()
+    m, size = warp.matrix(COMMIT, img.shape)
+    warp.clear_cache()
+    cached = warp.warp(img, m, size)
+    assert len(warp._maps.entries) == 1
+    out = np.empty_like(cached)
+    warp.clear_cache()
+    warp.warp_into(img, out, m, cache=False)
+    assert np.array_equal(out, cached)
+    assert not warp._maps.entries
+
+
+def test_large_outputs_are_not_cached(monkeypatch):
+    img = _image()
+    m, size = warp.matrix(COMMIT, img.shape)
+    monkeypatch.setattr(warp, 'MAP_CACHE_BYTES', size[0] * size[1])
+    warp.clear_cache()
+    warp.warp(img, m, size)
+    assert not warp._maps.entries
@@ -0,0 +1,310 @@
+import os
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+import resample
+import warp
+
+try:
+    import tifffile  # optional: decodes compressed/tiled TIFFs straight into the memmap
+except ImportError:
+    tifffile = None
+
+# Gigapixel scans trip PIL's decompression-bomb guard; sizes are checked by the
+# caller, which switches to this backend instead of decoding into RAM.
+Image.MAX_IMAGE_PIXELS = None
+
+TILE = 1024          # Tile edge for streamed operations
+PYRAMID_BASE = 4096  # Longest side of the first in-RAM pyramid level
+WORKERS = min(8, os.cpu_count() or 1)
+
+
+def image_size(path):
+    # (width, height) from the file header only
+    with Image.open(path) as im:
+        return im.size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class TiledImage:
+    # Full-resolution working buffer kept in a disk-backed np.memmap. Every
+    # operation streams tile by tile into a new buffer, so RAM use is bounded
+    # by a few tiles regardless of image size. Buffers are never modified
+    # after they are built; the temp file goes away with the last reference.
+    def __init__(self, shape, dtype=np.uint8, workdir=None):
+        fd, self.path = tempfile.mkstemp(prefix='imgbuf_', suffix='.raw', dir=workdir)
+        os.close(fd)
+        self.data = np.memmap(self.path, dtype=dtype, mode='w+', shape=tuple(shape))
+        self.shape = self.data.shape
+        self.workdir = workdir
+        self._levels = None
+        weakref.finalize(self, _remove, self.path)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def _new(self, shape):
+        return TiledImage(shape, self.data.dtype, self.workdir)
+
+    # --- Construction ---
+    @classmethod
+    def from_array(cls, arr, workdir=None):
+        buf = cls(arr.shape, arr.dtype, workdir)
+        for y in range(0, arr.shape[0], TILE):
+            buf.data[y:y + TILE] = arr[y:y + TILE]
+        return buf
+
+    @classmethod
+    def open(cls, path, workdir=None):
+        if tifffile is not None and path.lower().endswith(('.tif', '.tiff')):
+            buf = cls._open_tifffile(path, workdir)
+            if buf is not None:
+                return buf
+        buf = cls._open_strips(path, workdir)
+        if buf is not None:
+            return buf
+        # Last resort: formats PIL cannot decode piecewise need one full decode.
+        # Pixels stay as stored, like the PIL paths; EXIF orientation is
+        # applied by the caller's geometry (see loader.py).
+        img = cv2.imread(path, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if img is None:
+            raise ValueError(f"Cannot load image: {path}")
+        return cls.from_array(img, workdir)
+
+    @classmethod
+    def _open_tifffile(cls, path, workdir):
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            if page.dtype != np.uint8 or page.shape[-1] not in (3, 4) or len(page.shape) != 3:
+                return None
+            buf = cls(page.shape[:2] + (3,), np.uint8, workdir)
+            # Decode into a temporary RGB(A) memmap, then swap channels per band
+            fd, tmp = tempfile.mkstemp(prefix='imgbuf_', suffix='.raw', dir=workdir)
+            os.close(fd)
+            try:
+                rgb = page.asarray(out=tmp)
+                for y in range(0, rgb.shape[0], TILE):
+                    buf.data[y:y + TILE] = rgb[y:y + TILE, :, 2::-1]
+                del rgb
+            finally:
+                _remove(tmp)
+            return buf
+
+    @classmethod
+    def _open_strips(cls, path, workdir):
+        # Uncompressed strip images (raw TIFF, PPM, BMP) can be decoded one
+        # strip at a time by handing PIL a single tile descriptor per pass.
+        with Image.open(path) as im:
+            w, h = im.size
+            tiles = list(im.tile)
+            if im.mode not in ('RGB', 'L') or not tiles or any(t[0] != 'raw' for t in tiles):
+                return None
+            if any(t[1][0] != 0 or t[1][2] != w for t in tiles):
+                return None
+            mode = im.mode
+        buf = cls((h, w, 3), np.uint8, workdir)
+        for t in tiles:
+            x0, y0, x1, y1 = t[1]
+            with Image.open(path) as part:
+                part._size = (w, y1 - y0)
+                part.tile = [t._replace(extents=(0, 0, w, y1 - y0)) if hasattr(t, '_replace')
+                             else (t[0], (0, 0, w, y1 - y0)) + tuple(t[2:])]
+                part.load()
+                strip = np.asarray(part)
+            buf.data[y0:y1] = strip[..., None] if mode == 'L' else strip[..., ::-1]
+        return buf
+
+    # --- Tiling ---
+    def tiles(self, shape=None):
+        h, w = (shape or self.shape)[:2]
+        for y in range(0, h, TILE):
+            for x in range(0, w, TILE):
+                yield y, min(h, y + TILE), x, min(w, x + TILE)
+
+    def _run(self, jobs):
+        with ThreadPoolExecutor(WORKERS) as pool:
+            for _ in pool.map(lambda job: job(), jobs):
+                pass
+
+    def map(self, fn, halo=0):
+        # Apply fn to each tile plus `halo` pixels of context and keep the
+        # interior; with enough halo the result matches fn on the full image.
+        out = self._new(self.shape)
+        h, w = self.shape[:2]
+
+        def job(y0, y1, x0, x1):
+            ya, yb = max(0, y0 - halo), min(h, y1 + halo)
+            xa, xb = max(0, x0 - halo), min(w, x1 + halo)
+            res = fn(np.ascontiguousarray(self.data[ya:yb, xa:xb]))
+            out.data[y0:y1, x0:x1] = res[y0 - ya:y1 - ya, x0 - xa:x1 - xa]
+
+        self._run([lambda t=t: job(*t) for t in self.tiles()])
+        return out
+
+    # --- Geometry ---
+    def rotate(self, code):
+        h, w = self.shape[:2]
+        out = self._new(self.shape if code == cv2.ROTATE_180 else (w, h) + self.shape[2:])
+
+        def job(oy0, oy1, ox0, ox1):
+            # Source rectangle of this output tile
+            if code == cv2.ROTATE_90_CLOCKWISE:
+                src = self.data[h - ox1:h - ox0, oy0:oy1]
+            elif code == cv2.ROTATE_90_COUNTERCLOCKWISE:
+                src = self.data[ox0:ox1, w - oy1:w - oy0]
+            else:
+                src = self.data[h - oy1:h - oy0, w - ox1:w - ox0]
+            out.data[oy0:oy1, ox0:ox1] = cv2.rotate(np.ascontiguousarray(src), code)
+
+        self._run([lambda t=t: job(*t) for t in self.tiles(out.shape)])
+        return out
+
+    def flip(self, axis):
+        h, w = self.shape[:2]
+        out = self._new(self.shape)
+
+        def job(y0, y1, x0, x1):
+            if axis == 'h':
+                src = self.data[y0:y1, w - x1:w - x0]
+            else:
+                src = self.data[h - y1:h - y0, x0:x1]
+            out.data[y0:y1, x0:x1] = cv2.flip(np.ascontiguousarray(src), 1 if axis == 'h' else 0)
+
+        self._run([lambda t=t: job(*t) for t in self.tiles()])
+        return out
+
+    def crop(self, x0, y0, x1, y1):
+        out = self._new((y1 - y0, x1 - x0) + self.shape[2:])
+        for y in range(y0, y1, TILE):
+            out.data[y - y0:min(y1, y + TILE) - y0] = self.data[y:min(y1, y + TILE), x0:x1]
+        return out
+
+    def canvas(self, new_w, new_h):
+        # Same placement as recipe.canvas_pad; the new memmap starts zeroed
+        out = self._new((new_h, new_w) + self.shape[2:])
+        ih, iw = self.shape[:2]
+        ox, oy = (new_w - iw) // 2, (new_h - ih) // 2
+        sx, sy = max(0, -ox), max(0, -oy)
+        dx, dy = max(0, ox), max(0, oy)
+        cw, ch = min(iw - sx, new_w - dx), min(ih - sy, new_h - dy)
+        for y in range(0, ch, TILE):
+            yb = min(ch, y + TILE)
+            out.data[dy + y:dy + yb, dx:dx + cw] = self.data[sy + y:sy + yb, sx:sx + cw]
+        return out
+
+    def transform(self, stack):
+        # A composed transform_stack.TransformStack in one streamed pass: each
+        # output tile reads only its source rectangle inside the crop box
+        out = self._new(stack.shape + self.shape[2:])
+
+        def job(oy0, oy1, ox0, ox1):
+            sx0, sy0, sx1, sy1 = stack.source_rect(ox0, oy0, ox1, oy1)
+            out.data[oy0:oy1, ox0:ox1] = stack.orient(np.ascontiguousarray(self.data[sy0:sy1, sx0:sx1]))
+
+        self._run([lambda t=t: job(*t) for t in self.tiles(out.shape)])
+        return out
+
+    def halve(self, linear=False):
+        # resample.halve streamed in row bands: every band maps to whole
+        # output rows, and a trailing odd row or column is repeated
+        h, w = self.shape[:2]
+        oh, ow = (h + 1) // 2, (w + 1) // 2
+        out = self._new((oh, ow) + self.shape[2:])
+        band = TILE // 2
+
+        def job(y0):
+            y1 = min(oh, y0 + band)
+            rows = np.ascontiguousarray(self.data[2 * y0:min(h, 2 * y1)])
+            if linear:
+                rows = resample.to_linear(rows)
+            res = resample.halve(rows)
+            out.data[y0:y1] = resample.from_linear(res) if linear else res
+
+        self._run([lambda y=y: job(y) for y in range(0, oh, band)])
+        return out
+
+    def resize(self, size, method=resample.DEFAULT_METHOD, linear=False):
+        # Streamed halvings as in resample.resize, then the final step in RAM
+        # on at most 16x the output pixels
+        buf = self
+        if method != "area":
+            for _ in range(resample.halvings(self.shape, size)):
+                buf = buf.halve(linear)
+        return TiledImage.from_array(resample.resize(np.asarray(buf.data), size, method, linear), self.workdir)
+
+    def warp(self, c):
+        # Straighten / perspective: output tiles are remapped in parallel,
+        # each reading only the source rectangle it needs from the memmap
+        m, size = warp.matrix(c, self.shape)
+        out = self._new((size[1], size[0]) + self.shape[2:])
+        # Tile maps are built per job and dropped; maps cached by earlier
+        # in-RAM warps are released too, the RAM is the tiled buffer's to use
+        warp.warp_into(self.data, out.data, m, cache=False)
+        warp.clear_cache()
+        return out
+
+    def apply_commit(self, c):
+        # Streamed counterpart of recipe.apply_commit
+        op = c['op']
+        if op == 'rotate':
+            return self.rotate(c['code'])
+        if op == 'flip':
+            return self.flip(c['axis'])
+        if op == 'crop':
+            return self.crop(*c['box'])
+        if op == 'canvas':
+            return self.canvas(*c['size'])
+        if op == 'resize':
+            return self.resize(c['size'], c.get('method', resample.DEFAULT_METHOD), c.get('linear', False))
+        if op in ('straighten', 'perspective'):
+            return self.warp(c)
+        raise ValueError(f"Unknown commit: {op}")
+
+    # --- Display pyramid ---
+    def _build_pyramid(self):
+        # First level is streamed from the memmap in row bands; smaller
+        # levels are halved in RAM.
+        h, w = self.shape[:2]
+        f = 1
+        while max(h, w) // f > PYRAMID_BASE:
+            f *= 2
+        if f == 1:
+            base = np.array(self.data)
+        else:
+            base = np.empty(((h + f - 1) // f, (w + f - 1) // f) + self.shape[2:], self.data.dtype)
+            band = TILE // f * f or f
+            for y in range(0, h, band):
+                rows = self.data[y:min(h, y + band)]
+                oh = (rows.shape[0] + f - 1) // f
+                base[y // f:y // f + oh] = cv2.resize(np.ascontiguousarray(rows), (base.shape[1], oh),
+                                                      interpolation=cv2.INTER_AREA)
+        levels = [base]
+        while max(levels[-1].shape[:2]) > 256:
+            lh, lw = levels[-1].shape[:2]
+            levels.append(cv2.resize(levels[-1], ((lw + 1) // 2, (lh + 1) // 2), interpolation=cv2.INTER_AREA))
+        self._levels = levels
+
+    def preview(self, max_side):
+        # Smallest pyramid level that still covers max_side, resized to fit
+        if self._levels is None:
+            self._build_pyramid()
+        h, w = self.shape[:2]
+        scale = min(1.0, max_side / max(h, w))
+        tw, th = max(1, int(w * scale)), max(1, int(h * scale))
+        level = self._levels[0]
+        for lv in self._levels:
+            if lv.shape[1] >= tw and lv.shape[0] >= th:
+                level = lv
+        if level.shape[1] == tw and level.shape[0] == th:
+            return level
+        return cv2.resize(level, (tw, th), interpolation=cv2.INTER_AREA)
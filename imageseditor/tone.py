@@ -0,0 +1,176 @@
+import cv2
+import numpy as np
+import lru
+import palette
+
+# Tonal adjustments as lookup tables. Auto levels, auto contrast, curves,
+# gamma and brightness/contrast are composed into one 256-entry table per
+# channel and applied with a single cv2.LUT, so any combination costs one
+# table read per pixel and no float image is ever allocated. The histograms
+# auto levels and auto contrast need are taken from a strided subsample and
+# cached per image. uint16 images (high bit depth mode) get a 65536-entry
+# table built from the same curves, applied with one gather per channel.
+
+CLIP_PERCENT = 0.5      # Share of pixels clipped at each end when stretching
+SAMPLE_SIDE = 512       # Longest side of the subsample histograms are taken from
+CACHE_SIZE = 8          # Histograms kept
+
+RAMP = np.arange(256, dtype=np.float64)
+_RAMP_U8 = np.arange(256, dtype=np.uint8).reshape(1, -1)
+# Every 16-bit code in 8-bit units, so levels and curves keep their meaning
+RAMP16 = np.arange(65536, dtype=np.float64) / 257.0
+_RAMP_U16 = np.arange(65536, dtype=np.uint16)
+
+_histograms = lru.LRU(CACHE_SIZE)
+
+
+def _histogram(img):
+    step = max(1, max(img.shape[:2]) // SAMPLE_SIDE)
+    sample = np.ascontiguousarray(img[::step, ::step])
+    channels = sample.shape[2] if sample.ndim == 3 else 1
+    # 256 bins in 8-bit units for any depth
+    top = 256 if sample.dtype == np.uint8 else 65536
+    return np.stack([cv2.calcHist([sample], [c], None, [256], [0, top]).ravel()
+                     for c in range(min(channels, 3))])
+
+
+def histogram(img, key=None):
+    # (channels, 256) counts of a subsample of img; key defaults to the image fingerprint
+    return _histograms.get(key or palette.fingerprint(img), lambda: _histogram(img))
+
+
+def live_histogram(rgb, alpha=None):
+    # (4, 256) R, G, B and luma counts of a small RGB buffer (the display
+    # image) plus summary statistics of the luma channel. With an 8-bit
+    # alpha of the same size only pixels at least half opaque are counted.
+    luma = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    mask = None if alpha is None else (alpha >= 128).view(np.uint8)
+    hists = np.stack([cv2.calcHist([rgb], [c], mask, [256], [0, 256]).ravel() for c in range(3)]
+                     + [cv2.calcHist([luma], [0], mask, [256], [0, 256]).ravel()])
+    mean, std = cv2.meanStdDev(luma, mask=mask)
+    total = max(1.0, float(hists[3].sum()))
+    stats = {
+        'mean': float(mean[0, 0]),
+        'std': float(std[0, 0]),
+        'shadows': float(hists[3, 0] / total * 100),     # % of pixels clipped to black
+        'highlights': float(hists[3, 255] / total * 100),  # % clipped to white
+    }
+    return hists, stats
+
+
+def clear_cache():
+    _histograms.clear()
+
+
+def _percentiles(hist, clip):
+    # Lowest and highest levels left after clipping clip percent at each end
+    cdf = np.cumsum(hist)
+    cut = cdf[-1] * clip / 100.0
+    lo = int(np.searchsorted(cdf, cut, side='right'))
+    hi = int(np.searchsorted(cdf, cdf[-1] - cut, side='left'))
+    return min(lo, 255), max(min(hi, 255), min(lo, 255))
+
+
+def auto_levels(img, clip=CLIP_PERCENT, key=None):
+    # Per-channel [black, white] points: stretches each channel separately,
+    # which also removes colour casts
+    return [list(_percentiles(h, clip)) for h in histogram(img, key)]
+
+
+def auto_contrast(img, clip=CLIP_PERCENT, key=None):
+    # One [black, white] pair for all channels, so hues are kept
+    hist = histogram(img, key)
+    return [list(_percentiles(hist.sum(0), clip))] * len(hist)
+
+
+def stretch(v, black, white):
+    if white <= black:
+        return v
+    return np.clip((v - black) * (255.0 / (white - black)), 0, 255)
+
+
+def curve(v, points):
+    # Monotone cubic (Fritsch-Carlson) through the [x, y] control points, so
+    # the curve never overshoots between them
+    pts = sorted((float(x), float(y)) for x, y in points)
+    xs = np.array([p[0] for p in pts])
+    ys = np.array([p[1] for p in pts])
+    xs, idx = np.unique(xs, return_index=True)
+    ys = ys[idx]
+    if len(xs) < 2:
+        return v
+    h = np.diff(xs)
+    delta = np.diff(ys) / h
+    m = np.empty(len(xs))
+    m[0], m[-1] = delta[0], delta[-1]
+    m[1:-1] = (delta[:-1] + delta[1:]) / 2
+    m[1:-1][delta[:-1] * delta[1:] <= 0] = 0
+    for i, d in enumerate(delta):
+        if d == 0:
+            m[i] = m[i + 1] = 0
+        else:
+            a, b = m[i] / d, m[i + 1] / d
+            s = a * a + b * b
+            if s > 9:
+                t = 3 / s ** 0.5
+                m[i], m[i + 1] = t * a * d, t * b * d
+    x = np.clip(v, xs[0], xs[-1])
+    i = np.clip(np.searchsorted(xs, x, side='right') - 1, 0, len(xs) - 2)
+    t = (x - xs[i]) / h[i]
+    t2, t3 = t * t, t * t * t
+    y = ((2 * t3 - 3 * t2 + 1) * ys[i] + (t3 - 2 * t2 + t) * h[i] * m[i]
+         + (-2 * t3 + 3 * t2) * ys[i + 1] + (t3 - t2) * h[i] * m[i + 1])
+    return np.clip(y, 0, 255)
+
+
+def gamma(v, g):
+    # g > 1 brightens the midtones, as in the Levels dialog of most editors
+    return 255.0 * (v / 255.0) ** (1.0 / g)
+
+
+def scale_lut(alpha, beta):
+    # saturate(|v * alpha + beta|), computed by convertScaleAbs itself so the
+    # table matches the old per-pixel call exactly
+    return cv2.convertScaleAbs(_RAMP_U8, alpha=alpha, beta=beta).ravel()
+
+
+def build_lut(levels=None, points=None, g=1.0, alpha=1.0, beta=0, bits=8):
+    # (N,) table, or (1, N, 3) when levels differ per channel, N = 2**bits;
+    # None when every step is the identity. Order: levels, curve, gamma,
+    # brightness/contrast. Levels, points and beta are in 8-bit units.
+    luts = []
+    ramp, identity = (RAMP, _RAMP_U8[0]) if bits == 8 else (RAMP16, _RAMP_U16)
+    for black, white in levels or [(0, 255)]:
+        v = stretch(ramp, black, white)
+        if points:
+            v = curve(v, points)
+        if g != 1.0:
+            v = gamma(v, g)
+        if bits == 8:
+            lut = np.clip(np.rint(v), 0, 255).astype(np.uint8)
+            if alpha != 1.0 or beta != 0:
+                lut = scale_lut(alpha, beta)[lut]
+        else:
+            # Same saturate(|v * alpha + beta|) as convertScaleAbs, at 16 bits
+            lut = np.clip(np.rint(np.abs(v * alpha + beta) * 257.0), 0, 65535).astype(np.uint16)
+        luts.append(lut)
+    if all((lut == luts[0]).all() for lut in luts[1:]):
+        lut = luts[0]
+        return None if (lut == identity).all() else lut
+    return np.stack(luts, -1).reshape(1, len(ramp), len(luts))
+
+
+def apply(img, lut):
+    if lut is None:
+        return img
+    if lut.ndim == 3 and (img.ndim == 2 or img.shape[2] != lut.shape[2]):
+        lut = lut[0, :, 0]
+    if img.dtype == np.uint8:
+        return cv2.LUT(img, lut)
+    # cv2.LUT only indexes 8-bit input; 16-bit images gather per channel
+    if lut.ndim == 1:
+        return lut[img]
+    out = np.empty_like(img)
+    for c in range(lut.shape[2]):
+        out[..., c] = lut[0, :, c][img[..., c]]
+    return out
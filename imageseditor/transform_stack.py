@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+
+# Geometric commits (rotate, flip, crop) composed into one mapping. 90 degree
+# rotations and flips form the dihedral group D4, so any sequence of them and
+# crops reduces to: crop a box of the source, optionally transpose, then
+# optionally mirror x and/or y. view() expresses that as a NumPy view with no
+# pixels copied; materialize() copies the cropped region once, with a single
+# cv2 call for every orientation but one. Canvas resizes add pixels and are
+# not composable; replay() materializes the stack before them.
+
+# (transpose, flip_x, flip_y) -> one cv2 call that orients a region
+_ORIENT = {
+    (False, True, False): lambda a: cv2.flip(a, 1),
+    (False, False, True): lambda a: cv2.flip(a, 0),
+    (False, True, True): lambda a: cv2.rotate(a, cv2.ROTATE_180),
+    (True, False, False): cv2.transpose,
+    (True, True, False): lambda a: cv2.rotate(a, cv2.ROTATE_90_CLOCKWISE),
+    (True, False, True): lambda a: cv2.rotate(a, cv2.ROTATE_90_COUNTERCLOCKWISE),
+    (True, True, True): lambda a: cv2.flip(cv2.transpose(a), -1),
+}
+
+
+class TransformStack:
+    # Immutable; push() returns a new stack. source is the (h, w) of the image
+    # the stack applies to, box the crop [x0, y0, x1, y1] in source pixels.
+    def __init__(self, source, box=None, transpose=False, flip_x=False, flip_y=False):
+        self.source = tuple(source[:2])
+        h, w = self.source
+        self.box = tuple(box) if box is not None else (0, 0, w, h)
+        self.transpose = transpose
+        self.flip_x = flip_x
+        self.flip_y = flip_y
+
+    def _with(self, **kw):
+        state = dict(box=self.box, transpose=self.transpose, flip_x=self.flip_x, flip_y=self.flip_y)
+        state.update(kw)
+        return TransformStack(self.source, **state)
+
+    @property
+    def shape(self):
+        # (h, w) of the output
+        x0, y0, x1, y1 = self.box
+        return (x1 - x0, y1 - y0) if self.transpose else (y1 - y0, x1 - x0)
+
+    @property
+    def identity(self):
+        return self.box == (0, 0, self.source[1], self.source[0]) and not (
+            self.transpose or self.flip_x or self.flip_y)
+
+    @property
+    def orientation(self):
+        return self.transpose, self.flip_x, self.flip_y
+
+    def push(self, c):
+        # Stack with commit c appended, or None when c cannot be composed
+        op = c['op']
+        if op == 'flip':
+            if c['axis'] == 'h':
+                return self._with(flip_x=not self.flip_x)
+            return self._with(flip_y=not self.flip_y)
+        if op == 'rotate':
+            if c['code'] == cv2.ROTATE_180:
+                return self._with(flip_x=not self.flip_x, flip_y=not self.flip_y)
+            # A quarter turn is a transpose plus one mirror; mirrors applied
+            # before the transpose swap axes when moved after it
+            fx, fy = self.flip_y, self.flip_x
+            if c['code'] == cv2.ROTATE_90_CLOCKWISE:
+                fx = not fx
+            else:
+                fy = not fy
+            return self._with(transpose=not self.transpose, flip_x=fx, flip_y=fy)
+        if op == 'crop':
+            h, w = self.shape
+            x0, y0, x1, y1 = c['box']
+            x0, x1 = max(0, min(w, x0)), max(0, min(w, x1))
+            y0, y1 = max(0, min(h, y0)), max(0, min(h, y1))
+            if x1 <= x0 or y1 <= y0:
+                raise ValueError("Crop box is empty")
+            return self._with(box=self.source_rect(x0, y0, x1, y1))
+        return None
+
+    def source_rect(self, x0, y0, x1, y1):
+        # Source box [x0, y0, x1, y1] holding the output rectangle
+        h, w = self.shape
+        if self.flip_x:
+            x0, x1 = w - x1, w - x0
+        if self.flip_y:
+            y0, y1 = h - y1, h - y0
+        if self.transpose:
+            x0, y0, x1, y1 = y0, x0, y1, x1
+        bx, by = self.box[:2]
+        return bx + x0, by + y0, bx + x1, by + y1
+
+    def scaled(self, source):
+        # Same edit for a resized copy of the source (e.g. a display proxy)
+        sy, sx = source[0] / self.source[0], source[1] / self.source[1]
+        x0, y0, x1, y1 = self.box
+        box = (int(x0 * sx), int(y0 * sy),
+               max(int(x0 * sx) + 1, min(source[1], int(round(x1 * sx)))),
+               max(int(y0 * sy) + 1, min(source[0], int(round(y1 * sy)))))
+        return TransformStack(source, box, self.transpose, self.flip_x, self.flip_y)
+
+    def orient(self, region):
+        # Transpose/mirror an already-cropped region
+        fn = _ORIENT.get(self.orientation)
+        return fn(region) if fn is not None else region
+
+    def view(self, img):
+        # Zero-copy view of the output (strides may be negative)
+        x0, y0, x1, y1 = self.box
+        v = img[y0:y1, x0:x1]
+        if self.transpose:
+            v = v.swapaxes(0, 1)
+        if self.flip_x:
+            v = v[:, ::-1]
+        if self.flip_y:
+            v = v[::-1]
+        return v
+
+    def materialize(self, img):
+        # Output as an array cv2 can filter: only the cropped region is read,
+        # and crop-only stacks stay a view of img
+        x0, y0, x1, y1 = self.box
+        return self.orient(img[y0:y1, x0:x1])
+
+    def apply(self, base):
+        # Output for an in-RAM array or a TiledImage
+        if self.identity:
+            return base
+        if isinstance(base, np.ndarray):
+            return self.materialize(base)
+        return base.transform(self)
+
+
+def replay(base, commits, apply_commit, stack=None):
+    # (base, stack) after commits: composable commits only update the stack;
+    # anything else is applied with apply_commit(materialized, c) and starts
+    # a fresh stack on the result. stack is an initial orientation of base
+    # (e.g. from EXIF).
+    stack = stack or TransformStack(base.shape)
+    for c in commits:
+        nxt = stack.push(c)
+        if nxt is None:
+            base = apply_commit(stack.apply(base), c)
+            nxt = TransformStack(base.shape)
+        stack = nxt
+    return base, stack
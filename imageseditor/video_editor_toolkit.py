@@ -6,6 +6,8 @@ import numpy as np
 import os
 from enum import Enum
 import imageio
+from video_io import keep_segments, export_segments
+from catalog_view import CatalogBar
 
 class MediaType(Enum):
     IMAGE = 1
@@ -41,6 +43,8 @@ class VideoEditorToolkit(tk.Tk):
         self.video_list = tk.Listbox(left_panel, height=15)
         self.video_list.pack(fill="both", expand=True, pady=5)
         self.video_list.bind("<<ListboxSelect>>", self.load_video)
+        self.video_catalog = CatalogBar(left_panel, self.video_list, 'video', details=True)
+        self.video_catalog.pack(fill="x", before=self.video_list)
         
         # Video info display
         self.video_info = ttk.Label(left_panel, text="No video loaded")
@@ -92,12 +96,8 @@ class VideoEditorToolkit(tk.Tk):
         folder = filedialog.askdirectory()
         if not folder: return
         
-        self.video_list.delete(0, tk.END)
-        for f in sorted(os.listdir(folder)):
-            if f.lower().endswith((".mp4", ".avi", ".mov", ".mkv")):
-                self.video_list.insert(tk.END, f)
-        
         self.video_folder = folder
+        self.video_catalog.set_folder(folder)
     
     def load_video(self, event):
         selection = self.video_list.curselection()
@@ -105,7 +105,7 @@ class VideoEditorToolkit(tk.Tk):
         
         self.stop_playback()
         
-        video_file = self.video_list.get(selection[0])
+        video_file = self.video_catalog.name(selection[0])
         video_path = os.path.join(self.video_folder, video_file)
         
         try:
@@ -234,11 +234,6 @@ class VideoEditorToolkit(tk.Tk):
         
         if not output_path: return
         
-        # Get video properties
-        width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.video_cap.get(cv2.CAP_PROP_FPS)
-        
         # Create progress window
         progress_win = tk.Toplevel(self)
         progress_win.title("Trimming Video")
@@ -248,21 +243,12 @@ class VideoEditorToolkit(tk.Tk):
         progress_win.grab_set()
         self.update()
         
+        def on_progress(done):
+            progress['value'] = done - 1
+            progress_win.update()
+        
         try:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            
-            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, self.trim_start)
-            
-            for frame_num in range(self.trim_start, self.trim_end + 1):
-                ret, frame = self.video_cap.read()
-                if not ret: break
-                
-                out.write(frame)
-                progress['value'] = frame_num - self.trim_start
-                progress_win.update()
-            
-            out.release()
+            export_segments(self.video_cap, output_path, [(self.trim_start, self.trim_end)], on_progress)
             messagebox.showinfo("Success", f"Trimmed video saved to {output_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to trim video:\n{str(e)}")
@@ -304,11 +290,6 @@ class VideoEditorToolkit(tk.Tk):
         
         if not output_path: return
         
-        # Get video properties
-        width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.video_cap.get(cv2.CAP_PROP_FPS)
-        
         # Create progress window
         progress_win = tk.Toplevel(self)
         progress_win.title("Applying Cuts")
@@ -318,44 +299,18 @@ class VideoEditorToolkit(tk.Tk):
         progress_win.grab_set()
         self.update()
         
+        def on_progress(done):
+            progress['value'] = done
+            progress_win.update()
+        
         try:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            
-            # Sort cuts by start frame
-            sorted_cuts = sorted(self.cut_ranges, key=lambda x: x["start"])
-            
             # Determine segments to keep (between cuts)
-            keep_segments = []
-            prev_end = 0
-            
-            for cut in sorted_cuts:
-                if cut["start"] > prev_end:
-                    keep_segments.append({"start": prev_end, "end": cut["start"]-1})
-                prev_end = cut["end"] + 1
-            
-            if prev_end < self.video_frame_count - 1:
-                keep_segments.append({"start": prev_end, "end": self.video_frame_count-1})
+            keep = keep_segments(self.video_frame_count, self.cut_ranges)
             
             # Calculate total frames to process for progress bar
-            total_frames = sum(seg["end"] - seg["start"] + 1 for seg in keep_segments)
-            progress.config(maximum=total_frames)
-            
-            # Process each segment
-            processed_frames = 0
-            for seg in keep_segments:
-                self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, seg["start"])
-                
-                for frame_num in range(seg["start"], seg["end"] + 1):
-                    ret, frame = self.video_cap.read()
-                    if not ret: break
-                    
-                    out.write(frame)
-                    processed_frames += 1
-                    progress['value'] = processed_frames
-                    progress_win.update()
+            progress.config(maximum=sum(ed - st + 1 for st, ed in keep))
             
-            out.release()
+            export_segments(self.video_cap, output_path, keep, on_progress)
             messagebox.showinfo("Success", f"Video with cuts applied saved to {output_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to apply cuts:\n{str(e)}")
@@ -0,0 +1,37 @@
+import cv2
+
+
+def keep_segments(frame_count, cut_ranges):
+    # Frame ranges (inclusive) left over after removing the marked cuts
+    segs, prev = [], 0
+    for c in sorted(cut_ranges, key=lambda x: x["start"]):
+        if c["start"] > prev:
+            segs.append((prev, c["start"] - 1))
+        prev = c["end"] + 1
+    if prev < frame_count - 1:
+        segs.append((prev, frame_count - 1))
+    return segs
+
+
+def export_segments(cap, out_path, segments, progress=None, fourcc='mp4v'):
+    # Copy the given inclusive frame ranges from cap into a new video file.
+    # progress(frames_written) is called after every frame.
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+    written = 0
+    try:
+        for st, ed in segments:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, st)
+            for _ in range(st, ed + 1):
+                ret, frm = cap.read()
+                if not ret:
+                    break
+                writer.write(frm)
+                written += 1
+                if progress:
+                    progress(written)
+    finally:
+        writer.release()
+    return written
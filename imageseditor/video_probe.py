@@ -0,0 +1,241 @@
+import os
+import struct
+import cv2
+
+# Video metadata (size, fps, frame count, duration, codec) from container
+# headers, without starting a decoder. MP4/MOV files are read box by box,
+# seeking over mdat, and only the moov box is loaded; AVI files only need
+# their hdrl list at the start of the file. Anything else (MKV, WebM,
+# fragmented MP4, damaged headers) falls back to cv2.VideoCapture.
+#
+#   video_probe.probe(path)
+#   -> {'width': 1920, 'height': 1080, 'fps': 29.97, 'frames': 1798,
+#       'duration': 60.0, 'codec': 'avc1'}
+
+MP4_EXTS = ('.mp4', '.mov', '.m4v', '.3gp')
+AVI_EXTS = ('.avi',)
+MAX_MOOV = 64 << 20     # Larger moov boxes are left to OpenCV
+HDRL_READ = 64 << 10    # Bytes read from the start of an AVI
+
+# Boxes holding further boxes on the path to the video sample description
+_CONTAINERS = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+
+
+def _fourcc(raw):
+    return raw.decode('latin-1').strip('\x00 ').lower() or None
+
+
+def _result(width, height, fps, frames, duration, codec):
+    if not fps and frames and duration:
+        fps = frames / duration
+    if not duration and frames and fps:
+        duration = frames / fps
+    if not frames and fps and duration:
+        frames = int(round(fps * duration))
+    return {'width': int(width or 0), 'height': int(height or 0), 'fps': fps or None,
+            'frames': int(frames or 0), 'duration': duration or None, 'codec': codec}
+
+
+# --- MP4 / MOV ---
+def _boxes(data, start=0, end=None):
+    # (type, payload start, payload end) of the boxes in data[start:end]
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        head = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            head = 16
+        elif size == 0:
+            size = end - pos
+        if size < head or pos + size > end:
+            return
+        yield kind, pos + head, pos + size
+        pos += size
+
+
+def _read_moov(f):
+    # Payload of the top-level moov box, seeking over everything else
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        size, kind = struct.unpack_from('>I4s', head)
+        hlen = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', head, 8)[0]
+            hlen = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < hlen:
+            return None
+        if kind == b'moov':
+            if size > MAX_MOOV:
+                return None
+            f.seek(pos + hlen)
+            return f.read(size - hlen)
+        pos += size
+    return None
+
+
+def _times(data, start):
+    # (timescale, duration) of an mvhd or mdhd payload
+    if data[start] == 1:
+        return struct.unpack_from('>IQ', data, start + 20)
+    return struct.unpack_from('>II', data, start + 12)
+
+
+def _video_track(data, start, end):
+    # {timescale, duration, width, height, codec, frames} of a trak whose
+    # handler is 'vide', else None
+    info, is_video = {}, False
+    stack = [(start, end)]
+    while stack:
+        s, e = stack.pop()
+        for kind, ps, pe in _boxes(data, s, e):
+            if kind in _CONTAINERS:
+                stack.append((ps, pe))
+            elif kind == b'hdlr' and pe - ps >= 12:
+                # QuickTime adds a data handler hdlr under minf; only the
+                # media handler says what the track holds
+                is_video = is_video or data[ps + 8:ps + 12] == b'vide'
+            elif kind == b'mdhd' and pe - ps >= 24:
+                info['timescale'], info['duration'] = _times(data, ps)
+            elif kind == b'tkhd':
+                off = ps + (88 if data[ps] == 1 else 76)
+                if off + 8 <= pe:
+                    w, h = struct.unpack_from('>II', data, off)
+                    info.setdefault('width', w >> 16)
+                    info.setdefault('height', h >> 16)
+            elif kind == b'stsd' and pe - ps >= 8 + 36:
+                # First sample entry: size, format, then the visual sample
+                # entry's coded width/height 24 bytes into its payload
+                entry = ps + 8
+                info['codec'] = _fourcc(data[entry + 4:entry + 8])
+                w, h = struct.unpack_from('>HH', data, entry + 32)
+                if w and h:
+                    info['width'], info['height'] = w, h
+            elif kind == b'stts' and pe - ps >= 8:
+                n = struct.unpack_from('>I', data, ps + 4)[0]
+                n = min(n, (pe - ps - 8) // 8)
+                counts = struct.unpack_from(f'>{2 * n}I', data, ps + 8)[::2]
+                info['frames'] = sum(counts)
+    return info if is_video else None
+
+
+def probe_mp4(path):
+    with open(path, 'rb') as f:
+        moov = _read_moov(f)
+    if moov is None:
+        return None
+    movie_scale = movie_duration = 0
+    track = None
+    for kind, ps, pe in _boxes(moov):
+        if kind == b'mvhd' and pe - ps >= 24:
+            movie_scale, movie_duration = _times(moov, ps)
+        elif kind == b'trak' and track is None:
+            track = _video_track(moov, ps, pe)
+    if not track or not track.get('frames'):
+        return None     # No video track, or fragmented (samples live in moof boxes)
+    scale, dur = track.get('timescale'), track.get('duration')
+    duration = dur / scale if scale and dur else (movie_duration / movie_scale if movie_scale else None)
+    fps = track['frames'] * scale / dur if scale and dur else None
+    return _result(track.get('width'), track.get('height'), fps, track['frames'], duration, track.get('codec'))
+
+
+# --- AVI ---
+def _chunks(data, start, end):
+    # (id, payload start, payload end) of RIFF chunks; LIST ids are the list type
+    pos = start
+    while pos + 8 <= end:
+        cid, size = struct.unpack_from('<4sI', data, pos)
+        ps, pe = pos + 8, min(end, pos + 8 + size)
+        if cid == b'LIST' and pe - ps >= 4:
+            yield b'LIST', data[ps:ps + 4], ps + 4, pe
+        else:
+            yield cid, None, ps, pe
+        pos += 8 + size + (size & 1)
+
+
+def probe_avi(path):
+    with open(path, 'rb') as f:
+        data = f.read(HDRL_READ)
+    if len(data) < 12 or data[:4] != b'RIFF' or data[8:12] != b'AVI ':
+        return None
+    avih = strh = strf = None
+    total = None
+    for cid, ltype, ps, pe in _chunks(data, 12, len(data)):
+        if ltype != b'hdrl':
+            continue
+        for cid2, ltype2, ps2, pe2 in _chunks(data, ps, pe):
+            if cid2 == b'avih' and pe2 - ps2 >= 40:
+                avih = struct.unpack_from('<10I', data, ps2)
+            elif ltype2 == b'strl' and strh is None:
+                for cid3, _, ps3, pe3 in _chunks(data, ps2, pe2):
+                    if cid3 == b'strh' and pe3 - ps3 >= 36 and data[ps3:ps3 + 4] == b'vids':
+                        strh = (data[ps3 + 4:ps3 + 8],) + struct.unpack_from('<III', data, ps3 + 20) \
+                            + struct.unpack_from('<I', data, ps3 + 32)
+                    elif cid3 == b'strf' and pe3 - ps3 >= 20:
+                        strf = struct.unpack_from('<iiHH4s', data, ps3 + 4)
+                if strh is None:
+                    strf = None
+            elif ltype2 == b'odml':
+                # OpenDML (>1 GB) files count all frames here; avih only
+                # counts the first RIFF segment
+                for cid3, _, ps3, pe3 in _chunks(data, ps2, pe2):
+                    if cid3 == b'dmlh' and pe3 - ps3 >= 4:
+                        total = struct.unpack_from('<I', data, ps3)[0]
+        break
+    if avih is None:
+        return None
+    us_per_frame, width, height = avih[0], avih[8], avih[9]
+    frames = total or avih[4]
+    fps = 1e6 / us_per_frame if us_per_frame else None
+    codec = None
+    if strh is not None:
+        handler, scale, rate, _, length = strh
+        if scale and rate:
+            fps = rate / scale
+        frames = total or length or frames
+        codec = _fourcc(handler)
+    if strf is not None:
+        width, height = strf[0], abs(strf[1])
+        codec = _fourcc(strf[4]) or codec
+    return _result(width, height, fps, frames, None, codec)
+
+
+# --- Fallback ---
+def probe_cv2(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return {}
+        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = _fourcc(struct.pack('<I', code & 0xFFFFFFFF)) if code else None
+        return _result(cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                       cap.get(cv2.CAP_PROP_FPS), cap.get(cv2.CAP_PROP_FRAME_COUNT), None, codec)
+    finally:
+        cap.release()
+
+
+def header(path):
+    # Metadata from the container header, or None when it cannot be parsed
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in MP4_EXTS:
+            return probe_mp4(path)
+        if ext in AVI_EXTS:
+            return probe_avi(path)
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+
+def probe(path):
+    # Metadata dict; {} when the file is not a readable video
+    return header(path) or probe_cv2(path)
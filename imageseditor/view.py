@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import depth
+
+# Display-size buffers for the editors' canvases: fit the image into the
+# canvas, resize, quantise 16-bit images to 8 bits, BGR -> RGB and, with an
+# alpha channel, blend over a grey checkerboard. The benchmark's display case
+# calls the same functions.
+#
+#   size = view.fit_size(img.shape, cw, ch)
+#   disp = view.render(img, size, alpha)
+#   disp, rgb, a = view.render_layers(img, size, alpha)   # rgb, a: before the checkerboard
+
+
+def fit_size(shape, cw, ch):
+    # (w, h) of an image of shape scaled to fit a cw x ch canvas, aspect kept
+    ih, iw = shape[:2]
+    scale = min(cw / iw, ch / ih)
+    return int(iw * scale), int(ih * scale)
+
+
+def display_alpha(alpha, size):
+    # 8-bit alpha at display size (w, h)
+    return depth.to_u8(cv2.resize(alpha, size, interpolation=cv2.INTER_AREA))
+
+
+def over_checker(disp, a):
+    # Transparent areas drawn over a grey checkerboard; a is display_alpha()
+    h, w = disp.shape[:2]
+    yy, xx = np.indices((h, w))
+    board = np.where(((yy // 8 + xx // 8) % 2)[..., None] == 0, 204, 153).astype(np.uint8)
+    return cv2.blendLinear(disp, np.broadcast_to(board, disp.shape).copy(),
+                           a.astype(np.float32) / 255, 1 - a.astype(np.float32) / 255)
+
+
+def _call(name, fn, *args):
+    return fn(*args)
+
+
+def render_layers(img, size, alpha=None, run=_call):
+    # (shown, rgb, a): the 8-bit RGB buffer of img at size (w, h) to draw,
+    # the same before the checkerboard, and the display-size alpha (None
+    # without one). run(name, fn, *args) wraps each stage, e.g.
+    # StageProfiler.run to time them under "display.*".
+    rgb = run("display.resize", cv2.resize, img, size)
+    rgb = run("display.quantise", depth.to_u8, rgb)
+    rgb = run("display.rgb", cv2.cvtColor, rgb, cv2.COLOR_BGR2RGB)
+    if alpha is None:
+        return rgb, rgb, None
+    a = display_alpha(alpha, size)
+    return run("display.alpha", over_checker, rgb, a), rgb, a
+
+
+def render(img, size, alpha=None, run=_call):
+    return render_layers(img, size, alpha, run)[0]
@@ -0,0 +1,171 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import lru
+
+# Free-angle straighten and 4-point perspective correction. Both commits are
+# a 3x3 homography from source to output pixels:
+#   {'op': 'straighten', 'angle': degrees (counterclockwise), 'crop': bool}
+#   {'op': 'perspective', 'quad': [[x, y] TL, TR, BR, BL], 'size': [w, h]}
+# Interactive previews warp a canvas-sized proxy with warpPerspective and
+# INTER_LINEAR. The full-resolution warp splits the output into tiles and
+# remaps them on a thread pool, each job building its tile's fixed-point remap
+# table, reading only the source rectangle it needs and dropping the table
+# afterwards, so the same code serves in-RAM arrays and the tiled buffer.
+# Tables cost 6 bytes per output pixel; for in-RAM images up to MAP_CACHE_BYTES
+# of them the whole set is built once and cached for repeated exports.
+
+TILE = 512
+WORKERS = 4
+MAP_CACHE = 2                   # Sets of tile maps kept
+MAP_CACHE_BYTES = 48 << 20      # Largest set of tile maps worth caching
+MAP_BYTES_PER_PIXEL = 6         # CV_16SC2 coordinates + CV_16U fractions
+
+
+def straighten_matrix(shape, angle, crop=True):
+    # (3x3 source->output, (w, h)). crop=True zooms in so the output keeps the
+    # source size with no empty corners; crop=False grows the canvas instead.
+    h, w = shape[:2]
+    a = math.radians(abs(angle))
+    cos, sin = math.cos(a), math.sin(a)
+    if crop:
+        size = (w, h)
+        scale = cos + sin * max(w / h, h / w)
+    else:
+        size = (int(math.ceil(w * cos + h * sin)), int(math.ceil(w * sin + h * cos)))
+        scale = 1.0
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, scale)
+    m[0, 2] += size[0] / 2 - w / 2
+    m[1, 2] += size[1] / 2 - h / 2
+    return np.vstack([m, [0, 0, 1]]), size
+
+
+def quad_size(quad):
+    # Output (w, h) from the longer of each pair of opposite edges
+    tl, tr, br, bl = np.asarray(quad, np.float64)
+    w = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    h = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    return max(1, int(round(w))), max(1, int(round(h)))
+
+
+def perspective_matrix(quad, size):
+    w, h = size
+    dst = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    return cv2.getPerspectiveTransform(np.float32(quad), dst).astype(np.float64), (int(w), int(h))
+
+
+def matrix(c, shape):
+    if c['op'] == 'straighten':
+        return straighten_matrix(shape, c['angle'], c.get('crop', True))
+    if c['op'] == 'perspective':
+        return perspective_matrix(c['quad'], c['size'])
+    raise ValueError(f"Not a warp commit: {c['op']}")
+
+
+def scaled_matrix(m, scale, out_scale=None):
+    # The same warp for a copy of the source resized by scale, drawn at
+    # out_scale times the full output size (default: scale)
+    out_scale = scale if out_scale is None else out_scale
+    return np.diag([out_scale, out_scale, 1.0]) @ m @ np.diag([1 / scale, 1 / scale, 1.0])
+
+
+def map_point(m, pt):
+    x, y, z = m @ (pt[0], pt[1], 1.0)
+    return x / z, y / z
+
+
+# --- Preview ---
+def preview(img, m, size, scale=1.0, out_scale=None):
+    # Fast warp of a proxy that is `scale` times the full-resolution source
+    out_scale = scale if out_scale is None else out_scale
+    size = (max(1, int(size[0] * out_scale)), max(1, int(size[1] * out_scale)))
+    return cv2.warpPerspective(img, scaled_matrix(m, scale, out_scale), size, flags=cv2.INTER_LINEAR)
+
+
+# --- Full resolution ---
+def _tile_map(inv, src_shape, ox0, oy0, ox1, oy1):
+    # Fixed-point remap table for one output tile, relative to the source box
+    # it reads; None when the tile maps entirely outside the source. Row and
+    # column terms broadcast, so each map costs a few passes over the tile.
+    xs = np.arange(ox0, ox1, dtype=np.float64)[None, :]
+    ys = np.arange(oy0, oy1, dtype=np.float64)[:, None]
+    z = (inv[2, 0] * xs) + (inv[2, 1] * ys + inv[2, 2])
+    mx = ((inv[0, 0] * xs) + (inv[0, 1] * ys + inv[0, 2])) / z
+    my = ((inv[1, 0] * xs) + (inv[1, 1] * ys + inv[1, 2])) / z
+    h, w = src_shape[:2]
+    # Cubic interpolation reads two pixels either side
+    sx0 = max(0, int(math.floor(mx.min())) - 2)
+    sy0 = max(0, int(math.floor(my.min())) - 2)
+    sx1 = min(w, int(math.ceil(mx.max())) + 3)
+    sy1 = min(h, int(math.ceil(my.max())) + 3)
+    if sx1 <= sx0 or sy1 <= sy0:
+        return None
+    m1, m2 = cv2.convertMaps((mx - sx0).astype(np.float32), (my - sy0).astype(np.float32), cv2.CV_16SC2)
+    return (sx0, sy0, sx1, sy1), m1, m2
+
+
+def _rects(size):
+    w, h = size
+    return [(x, y, min(w, x + TILE), min(h, y + TILE)) for y in range(0, h, TILE) for x in range(0, w, TILE)]
+
+
+def _build_maps(m, size, src_shape):
+    inv = np.linalg.inv(m)
+    rects = _rects(size)
+    with ThreadPoolExecutor(WORKERS) as pool:
+        maps = list(pool.map(lambda r: _tile_map(inv, src_shape, *r), rects))
+    return list(zip(rects, maps))
+
+
+_maps = lru.LRU(MAP_CACHE)
+
+
+def clear_cache():
+    _maps.clear()
+
+
+def tile_maps(m, size, src_shape):
+    key = (np.asarray(m, np.float64).tobytes(), tuple(size), tuple(src_shape[:2]))
+    return _maps.get(key, lambda: _build_maps(m, size, src_shape))
+
+
+def cacheable(size):
+    return size[0] * size[1] * MAP_BYTES_PER_PIXEL <= MAP_CACHE_BYTES
+
+
+def warp_into(src, out, m, interpolation=cv2.INTER_CUBIC, cache=True):
+    # Warp src (array or memmap) into the preallocated out, tile by tile.
+    # cache=False (tiled buffers) never keeps more than the in-flight tiles' maps.
+    h, w = out.shape[:2]
+    inv = None
+    if cache and cacheable((w, h)):
+        tiles = tile_maps(m, (w, h), src.shape)
+    else:
+        inv = np.linalg.inv(m)
+        tiles = [(r, None) for r in _rects((w, h))]
+
+    def job(item):
+        (ox0, oy0, ox1, oy1), tm = item
+        if tm is None and inv is not None:
+            tm = _tile_map(inv, src.shape, ox0, oy0, ox1, oy1)
+        if tm is None:
+            out[oy0:oy1, ox0:ox1] = 0
+            return
+        (sx0, sy0, sx1, sy1), m1, m2 = tm
+        region = np.ascontiguousarray(src[sy0:sy1, sx0:sx1])
+        out[oy0:oy1, ox0:ox1] = cv2.remap(region, m1, m2, interpolation, borderMode=cv2.BORDER_CONSTANT)
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(job, tiles))
+    return out
+
+
+def warp(img, m, size, interpolation=cv2.INTER_CUBIC):
+    out = np.empty((size[1], size[0]) + img.shape[2:], img.dtype)
+    return warp_into(img, out, m, interpolation)
+
+
+def apply(img, c):
+    m, size = matrix(c, img.shape)
+    return warp(img, m, size)
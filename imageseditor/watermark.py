@@ -0,0 +1,169 @@
+import os
+from functools import lru_cache
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Fonts tried in order before falling back to PIL's built-in bitmap font
+FONT_CANDIDATES = ("arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+
+# Placement presets (same choices as phase1's wm_pos menu)
+POSITIONS = ("top-left", "top-right", "bottom-left", "bottom-right", "center")
+
+
+class Sprite:
+    # Pre-rendered watermark: BGR premultiplied by alpha and the inverse alpha,
+    # both scaled to 0..255*255 so blending stays in uint16 integer math.
+    __slots__ = ("premul", "inv_alpha", "w", "h")
+
+    def __init__(self, bgr, alpha):
+        a = alpha.astype(np.uint16)
+        self.premul = bgr.astype(np.uint16) * a[..., None]
+        self.inv_alpha = (255 - a)[..., None]
+        self.premul.flags.writeable = False
+        self.inv_alpha.flags.writeable = False
+        self.h, self.w = alpha.shape[:2]
+
+
+@lru_cache(maxsize=32)
+def load_font(size, name=None):
+    for cand in ((name,) if name else ()) + FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(cand, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _rotate_layers(bgr, alpha, angle):
+    # Rotate with an expanded canvas, then trim fully transparent borders
+    if not angle:
+        return bgr, alpha
+    h, w = alpha.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    cos, sin = abs(M[0, 0]), abs(M[0, 1])
+    nw, nh = int(h * sin + w * cos + 0.5), int(h * cos + w * sin + 0.5)
+    M[0, 2] += nw / 2 - w / 2
+    M[1, 2] += nh / 2 - h / 2
+    alpha = cv2.warpAffine(alpha, M, (nw, nh), flags=cv2.INTER_LINEAR)
+    bgr = cv2.warpAffine(bgr, M, (nw, nh), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    x, y, w, h = cv2.boundingRect(alpha)
+    if w == 0 or h == 0:
+        return bgr[:1, :1], alpha[:1, :1]
+    return bgr[y:y + h, x:x + w], alpha[y:y + h, x:x + w]
+
+
+@lru_cache(maxsize=64)
+def text_sprite(text, size, color, opacity, font_name=None, angle=0):
+    # color is BGR, opacity 0..1; the sprite only covers the text's bounding box
+    font = load_font(size, font_name)
+    l, t, r, b = font.getbbox(text)
+    w, h = max(1, r - l), max(1, b - t)
+    mask = Image.new("L", (w, h), 0)
+    ImageDraw.Draw(mask).text((-l, -t), text, fill=255, font=font)
+    alpha = (np.asarray(mask, dtype=np.float32) * opacity + 0.5).astype(np.uint8)
+    bgr = np.empty((h, w, 3), np.uint8)
+    bgr[:] = color
+    return Sprite(*_rotate_layers(bgr, alpha, angle))
+
+
+@lru_cache(maxsize=16)
+def _logo_sprite(path, mtime, width, opacity, angle):
+    logo = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if logo is None:
+        raise ValueError(f"Cannot load logo: {path}")
+    if logo.dtype != np.uint8:
+        logo = cv2.convertScaleAbs(logo, alpha=255.0 / np.iinfo(logo.dtype).max)
+    if logo.ndim == 2:
+        logo = cv2.cvtColor(logo, cv2.COLOR_GRAY2BGR)
+    h, w = logo.shape[:2]
+    if width and width != w:
+        size = (int(width), max(1, round(h * width / w)))
+        logo = cv2.resize(logo, size, interpolation=cv2.INTER_AREA if width < w else cv2.INTER_LINEAR)
+    bgr = np.ascontiguousarray(logo[..., :3])
+    if logo.shape[2] == 4:
+        alpha = logo[..., 3]
+    else:
+        alpha = np.full(logo.shape[:2], 255, np.uint8)
+    if opacity < 1.0:
+        alpha = (alpha * np.float32(opacity) + 0.5).astype(np.uint8)
+    return Sprite(*_rotate_layers(bgr, alpha, angle))
+
+
+def logo_sprite(path, width=None, opacity=1.0, angle=0):
+    # PNG alpha is honoured; width=None keeps the logo's own size. Keyed on
+    # mtime so an edited logo is reloaded.
+    return _logo_sprite(path, os.path.getmtime(path), int(width) if width else None,
+                        round(float(opacity), 3), angle)
+
+
+def place(pos, iw, ih, w, h, margin=10):
+    if pos == "top-left":
+        return margin, margin
+    if pos == "top-right":
+        return iw - w - margin, margin
+    if pos == "bottom-left":
+        return margin, ih - h - margin
+    if pos == "bottom-right":
+        return iw - w - margin, ih - h - margin
+    return (iw - w) // 2, (ih - h) // 2
+
+
+def blend_sprite(img, sprite, x, y):
+    # Blend in place, touching only the part of the sprite that lands on img
+    ih, iw = img.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(iw, x + sprite.w), min(ih, y + sprite.h)
+    if x1 <= x0 or y1 <= y0:
+        return img
+    sx, sy = x0 - x, y0 - y
+    roi = img[y0:y1, x0:x1]
+    premul = sprite.premul[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+    inv = sprite.inv_alpha[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+    if roi.dtype == np.uint16:
+        # High bit depth: the same blend with the sprite scaled to 0..65535*255
+        acc = roi.astype(np.uint32) * inv + premul.astype(np.uint32) * 257
+    else:
+        acc = roi * inv + premul
+    acc += 127
+    roi[:] = acc // 255
+    return img
+
+
+def apply_sprite(img, sprite, pos="bottom-right", margin=20):
+    x, y = place(pos, img.shape[1], img.shape[0], sprite.w, sprite.h, margin)
+    return blend_sprite(img, sprite, x, y)
+
+
+def apply_tiled(img, sprite, gap=None):
+    # Repeat the sprite across the image on staggered rows; every blend is
+    # limited to one tile's rectangle, so cost scales with covered area.
+    ih, iw = img.shape[:2]
+    gap = max(sprite.w, sprite.h) if gap is None else gap
+    step_x, step_y = sprite.w + gap, sprite.h + gap
+    for row, y in enumerate(range(-sprite.h // 2, ih, step_y)):
+        shift = (row % 2) * (step_x // 2)
+        for x in range(-sprite.w // 2 - shift, iw, step_x):
+            blend_sprite(img, sprite, x, y)
+    return img
+
+
+def apply_text(img, text, size, color, opacity, pos="bottom-right", margin=20,
+               font_name=None, tiled=False, angle=30):
+    # Text watermark blended into img in place
+    if not text:
+        return img
+    sprite = text_sprite(text, int(size), tuple(int(c) for c in color),
+                         round(float(opacity), 3), font_name, angle if tiled else 0)
+    if tiled:
+        return apply_tiled(img, sprite)
+    return apply_sprite(img, sprite, pos, margin)
+
+
+def apply_logo(img, path, opacity=1.0, width=None, pos="bottom-right", margin=20,
+               tiled=False, angle=30):
+    # Logo watermark blended into img in place
+    sprite = logo_sprite(path, width, opacity, angle if tiled else 0)
+    if tiled:
+        return apply_tiled(img, sprite)
+    return apply_sprite(img, sprite, pos, margin)